@@ -0,0 +1,454 @@
+"""
+In-process stand-in for the python-vlc module
+Only the part of the API used by the player is implemented. Media parsing
+completes on a timer thread after a configurable latency, durations are
+derived from the media path so that runs are reproducible.
+"""
+
+import os
+import sys
+import zlib
+import threading
+from urllib.request import pathname2url
+
+# seconds a media parse takes
+parse_latency = 0.0
+
+# longest fake media duration(ms)
+max_duration = 3 * 60 * 60 * 1000
+
+
+class _Enum(int):
+    """
+    Enum value, hashable and exposing .value like the python-vlc enums
+    """
+
+    def __new__(cls, value, name=""):
+        enum = super(_Enum, cls).__new__(cls, value)
+        enum.name = name
+        return enum
+
+    @property
+    def value(self):
+        return int(self)
+
+    def __repr__(self):
+        return f"vlc.{self.name}"
+
+
+class _EnumType:
+    """
+    Namespace of enum values, unknown names get the next free value
+    """
+
+    def __init__(self, name, **values):
+        self._name = name
+        for key, value in values.items():
+            setattr(self, key, _Enum(value, f"{name}.{key}"))
+        self._next = max(values.values(), default=-1) + 1
+
+    def __getattr__(self, key):
+        if key.startswith("_"):
+            raise AttributeError(key)
+        value = _Enum(self._next, f"{self._name}.{key}")
+        self._next += 1
+        setattr(self, key, value)
+        return value
+
+
+EventType = _EnumType(
+    "EventType",
+    MediaParsedChanged=3,
+    MediaPlayerMediaChanged=0x100,
+    MediaPlayerPlaying=0x104,
+    MediaPlayerPaused=0x105,
+    MediaPlayerStopped=0x106,
+    MediaPlayerEndReached=0x109,
+    MediaPlayerEncounteredError=0x10A,
+    MediaPlayerTimeChanged=0x10B,
+    MediaPlayerPositionChanged=0x10C,
+)
+Meta = _EnumType("Meta", Title=0, Artist=1, Genre=2)
+MediaParseFlag = _EnumType("MediaParseFlag", local=0, network=1)
+MediaParsedStatus = _EnumType(
+    "MediaParsedStatus", skipped=1, failed=2, timeout=3, done=4
+)
+PlaybackMode = _EnumType("PlaybackMode", default=0, loop=1, repeat=2)
+State = _EnumType(
+    "State",
+    NothingSpecial=0,
+    Opening=1,
+    Buffering=2,
+    Playing=3,
+    Paused=4,
+    Stopped=5,
+    Ended=6,
+    Error=7,
+)
+TrackType = _EnumType("TrackType", unknown=-1, audio=0, video=1, ext=2)
+VideoMarqueeOption = _EnumType(
+    "VideoMarqueeOption",
+    Enable=0,
+    Text=1,
+    Color=2,
+    Opacity=3,
+    Position=4,
+    Refresh=5,
+    Size=6,
+    Timeout=7,
+    X=8,
+    Y=9,
+)
+
+
+class CallbackDecorators:
+    """
+    ctypes callback prototypes, plain functions are enough in process
+    """
+
+    @staticmethod
+    def _identity(function):
+        return function
+
+    MediaOpenCb = MediaReadCb = MediaSeekCb = MediaCloseCb = _identity
+
+
+class Event:
+    def __init__(self, event_type):
+        self.type = event_type
+        self.u = None
+
+
+class EventManager:
+    def __init__(self):
+        self._callbacks = {}
+
+    def event_attach(self, event_type, callback, *args, **kwargs):
+        # like libvlc: a single callback per event type
+        self._callbacks[int(event_type)] = (callback, args, kwargs)
+        return 0
+
+    def event_detach(self, event_type):
+        self._callbacks.pop(int(event_type), None)
+
+    def _emit(self, event_type):
+        entry = self._callbacks.get(int(event_type))
+        if entry is not None:
+            callback, args, kwargs = entry
+            callback(Event(event_type), *args, **kwargs)
+
+
+class Track:
+    def __init__(self, track_type):
+        self.type = track_type
+
+
+class Media:
+    def __init__(self, mrl):
+        self._mrl = mrl
+        self._meta = {}
+        self._status = _Enum(0, "MediaParsedStatus.none")
+        self._duration = -1
+        self._events = EventManager()
+        self._timer = None
+
+    def get_mrl(self):
+        return self._mrl
+
+    def event_manager(self):
+        return self._events
+
+    def parse_with_options(self, flags, timeout):
+        if self._status == MediaParsedStatus.done:
+            return 0
+        if parse_latency <= 0:
+            self._parsed()
+            return 0
+        self._timer = threading.Timer(parse_latency, self._parsed)
+        self._timer.daemon = True
+        self._timer.start()
+        return 0
+
+    def _parsed(self):
+        self._duration = zlib.crc32(self._mrl.encode()) % max_duration
+        self._status = MediaParsedStatus.done
+        self._events._emit(EventType.MediaParsedChanged)
+
+    def parse_stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def get_parsed_status(self):
+        return self._status
+
+    def get_duration(self):
+        return self._duration
+
+    def get_meta(self, meta):
+        return self._meta.get(int(meta))
+
+    def set_meta(self, meta, value):
+        self._meta[int(meta)] = value
+
+    def tracks_get(self):
+        if self._status != MediaParsedStatus.done:
+            return None
+        return [Track(TrackType.video), Track(TrackType.audio)]
+
+    def get_stats(self, stats=None):
+        return stats
+
+    def release(self):
+        pass
+
+
+class MediaList:
+    def __init__(self, media=()):
+        self._media = list(media)
+        self._lock = threading.RLock()
+        self._events = EventManager()
+
+    def lock(self):
+        self._lock.acquire()
+
+    def unlock(self):
+        self._lock.release()
+
+    def add_media(self, media):
+        if isinstance(media, str):
+            media = get_default_instance().media_new(media)
+        self._media.append(media)
+        return 0
+
+    def insert_media(self, media, index):
+        self._media.insert(index, media)
+        return 0
+
+    def remove_index(self, index):
+        if not 0 <= index < len(self._media):
+            return -1
+        del self._media[index]
+        return 0
+
+    def count(self):
+        return len(self._media)
+
+    __len__ = count
+
+    def item_at_index(self, index):
+        if 0 <= index < len(self._media):
+            return self._media[index]
+        return None
+
+    def index_of_item(self, media):
+        for index, item in enumerate(self._media):
+            if item is media:
+                return index
+        return -1
+
+    def event_manager(self):
+        return self._events
+
+    def release(self):
+        pass
+
+
+class MediaPlayer:
+    """
+    Media player without output, playback state only
+    Methods that are not implemented do nothing and return 0.
+    """
+
+    def __init__(self, *args):
+        self._media = None
+        self._state = State.NothingSpecial
+        self._time = 0
+        self._events = EventManager()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: 0
+
+    def event_manager(self):
+        return self._events
+
+    def set_media(self, media):
+        self._media = media
+        self._time = 0
+        self._events._emit(EventType.MediaPlayerMediaChanged)
+
+    def get_media(self):
+        return self._media
+
+    def play(self):
+        if self._media is None:
+            return -1
+        self._state = State.Playing
+        self._events._emit(EventType.MediaPlayerPlaying)
+        return 0
+
+    def pause(self):
+        self._state = State.Paused
+
+    def set_pause(self, pause):
+        self._state = State.Paused if pause else State.Playing
+
+    def stop(self):
+        self._state = State.Stopped
+
+    def is_playing(self):
+        return int(self._state == State.Playing)
+
+    def get_state(self):
+        return self._state
+
+    def get_length(self):
+        if self._media is None:
+            return -1
+        if self._media.get_duration() < 0:
+            self._media._parsed()
+        return self._media.get_duration()
+
+    def get_time(self):
+        return self._time if self._media is not None else -1
+
+    def set_time(self, time_ms):
+        self._time = max(int(time_ms), 0)
+
+    def get_position(self):
+        length = self.get_length()
+        return self._time / length if length > 0 else 0.0
+
+    def set_position(self, position, fast=False):
+        length = self.get_length()
+        if length > 0:
+            self._time = int(position * length)
+
+    def has_vout(self):
+        return 0
+
+    def release(self):
+        pass
+
+
+class MediaListPlayer:
+    def __init__(self, *args):
+        self._player = MediaPlayer()
+        self._list = None
+        self._index = -1
+        self._mode = PlaybackMode.default
+        self._events = EventManager()
+
+    def get_media_player(self):
+        return self._player
+
+    def set_media_player(self, player):
+        self._player = player
+
+    def set_media_list(self, media_list):
+        self._list = media_list
+
+    def set_playback_mode(self, mode):
+        self._mode = mode
+
+    def event_manager(self):
+        return self._events
+
+    def play_item_at_index(self, index):
+        media = self._list.item_at_index(index) if self._list is not None else None
+        if media is None:
+            return -1
+        self._index = index
+        self._player.set_media(media)
+        return self._player.play()
+
+    def play(self):
+        self.play_item_at_index(max(self._index, 0))
+
+    def next(self):
+        count = self._list.count() if self._list is not None else 0
+        if not count:
+            return -1
+        index = self._index + 1
+        if index >= count:
+            if self._mode != PlaybackMode.loop:
+                return -1
+            index = 0
+        return self.play_item_at_index(index)
+
+    def previous(self):
+        if self._index <= 0:
+            return -1
+        return self.play_item_at_index(self._index - 1)
+
+    def pause(self):
+        self._player.pause()
+
+    def set_pause(self, pause):
+        self._player.set_pause(pause)
+
+    def stop(self):
+        self._player.stop()
+
+    def is_playing(self):
+        return self._player.is_playing()
+
+    def get_state(self):
+        return self._player.get_state()
+
+    def release(self):
+        pass
+
+
+class Instance:
+    def __init__(self, *args):
+        self.args = args
+
+    def media_new(self, mrl, *options):
+        if "://" not in mrl:
+            mrl = "file://" + pathname2url(os.path.abspath(mrl))
+        return Media(mrl)
+
+    media_new_path = media_new
+
+    def media_new_callbacks(self, open_cb, read_cb, seek_cb, close_cb, opaque):
+        return Media("imem://")
+
+    def media_player_new(self, uri=None):
+        player = MediaPlayer()
+        if uri:
+            player.set_media(self.media_new(uri))
+        return player
+
+    def media_list_new(self, mrls=None):
+        media_list = MediaList()
+        for mrl in mrls or ():
+            media_list.add_media(self.media_new(mrl))
+        return media_list
+
+    def media_list_player_new(self):
+        return MediaListPlayer()
+
+    def release(self):
+        pass
+
+
+_default_instance = None
+
+
+def get_default_instance():
+    global _default_instance
+    if _default_instance is None:
+        _default_instance = Instance()
+    return _default_instance
+
+
+def install(latency=0.0):
+    """
+    Register this module as the vlc module
+    @param latency: seconds a media parse takes
+    """
+    global parse_latency
+    parse_latency = latency
+    sys.modules["vlc"] = sys.modules[__name__]
@@ -0,0 +1,339 @@
+"""
+Headless benchmark suite
+
+    python -m bench.run [--only scan,playlist] [--output results.json]
+
+Media are synthetic empty files, libvlc is replaced by bench.fakevlc and Qt
+runs on the offscreen platform, so results are comparable between runs
+and releases. Results are printed as JSON.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+
+# the benchmarks never open a window
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from bench import fakevlc, trees
+
+# registered before any player module imports vlc
+fakevlc.install()
+
+from modules.helper import scan_files, convert_ms
+from modules.scanner import scan_tree
+
+BENCHMARKS = {}
+
+
+def benchmark(group, qt=False):
+    """
+    Register a benchmark
+    @param group: name used by --only
+    @param qt: the benchmark needs a QApplication
+    """
+
+    def register(function):
+        BENCHMARKS[function.__name__] = (group, qt, function)
+        return function
+
+    return register
+
+
+def percentiles(samples):
+    """
+    Summary of timing samples(s)
+    """
+    ordered = sorted(samples)
+
+    def percentile(rank):
+        index = min(int(round(rank / 100 * (len(ordered) - 1))), len(ordered) - 1)
+        return ordered[index]
+
+    return {
+        "samples": len(ordered),
+        "min": ordered[0],
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": ordered[-1],
+        "mean": sum(ordered) / len(ordered),
+    }
+
+
+def measure(run, repeat):
+    """
+    Time repeat calls of run, then one more call under tracemalloc
+    @param run: callable returning the number of items it processed
+    @return: result dict (seconds, items, items/s, peak bytes)
+    """
+    samples = []
+    items = 0
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        items = run()
+        samples.append(time.perf_counter() - start)
+
+    # allocation tracing slows the run down, it is not timed
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {"seconds": percentiles(samples), "items": items, "peak_bytes": peak}
+    if items:
+        result["items_per_second"] = items / result["seconds"]["p50"]
+    return result
+
+
+# -----------------------------------------------------------------------------
+# Folder scans
+# -----------------------------------------------------------------------------
+def _scan_benchmark(tree, scan):
+    def run(context):
+        root = context.build(tree)
+        return measure(lambda: scan(root), context.repeat)
+
+    return run
+
+
+def _scan_files(root):
+    return len(scan_files(root, (trees.MEDIA_EXTENSION,))[1])
+
+
+def _scan_tree(root):
+    return sum(len(batch) for batch in scan_tree([root], (trees.MEDIA_EXTENSION,)))
+
+
+for _tree in trees.TREES:
+    for _name, _scan in (("scan_files", _scan_files), ("scan_tree", _scan_tree)):
+        _function = _scan_benchmark(_tree, _scan)
+        _function.__name__ = f"{_name}_{_tree}"
+        benchmark("scan")(_function)
+
+
+# -----------------------------------------------------------------------------
+# Playlist
+# -----------------------------------------------------------------------------
+@benchmark("playlist", qt=True)
+def add_playlist_items(context):
+    """
+    MediaPlayer.add_playlist_items into an empty playlist model
+    """
+    from media import MediaPlayer
+    from modules.playlist_model import PlaylistModel
+
+    mrls = context.media("flat")
+    prober = SimpleNamespace(probe=lambda mrls: None)
+
+    def run():
+        window = SimpleNamespace(
+            playlist_model=PlaylistModel(convert_ms=convert_ms), prober=prober
+        )
+        MediaPlayer.add_playlist_items(window, mrls)
+        return len(window.playlist_model)
+
+    return measure(run, context.repeat)
+
+
+@benchmark("playlist", qt=True)
+def player_add_media(context):
+    """
+    Player.add_media of the media of a flat tree into the libvlc playlist
+    """
+    from player import Player
+
+    mrls = context.media("flat")
+    player = Player()
+
+    def run():
+        player.clear_playlist()
+        player.add_media(mrls)
+        return len(player.paths)
+
+    try:
+        return measure(run, context.repeat)
+    finally:
+        player.cache.close()
+        player.titles.shutdown()
+
+
+# -----------------------------------------------------------------------------
+# Metadata
+# -----------------------------------------------------------------------------
+@benchmark("metadata", qt=True)
+def get_media_meta(context):
+    """
+    Player.get_media_meta per call, cold (parsed) and warm (cached)
+    """
+    from player import Player
+
+    mrls = context.media("wide")[: context.meta_count]
+    player = Player()
+
+    def calls():
+        samples = []
+        for mrl in mrls:
+            start = time.perf_counter()
+            player.get_media_meta(mrl)
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    try:
+        player.cache.invalidate()
+        cold = calls()
+        warm = calls()
+    finally:
+        player.cache.close()
+        player.titles.shutdown()
+
+    return {
+        "parse_latency": fakevlc.parse_latency,
+        "cold": percentiles(cold),
+        "warm": percentiles(warm),
+    }
+
+
+@benchmark("format")
+def convert_ms_calls(context):
+    """
+    convert_ms per call, over durations from 0 to 10 hours
+    """
+    values = list(range(0, 10 * 60 * 60 * 1000, 3599))
+
+    def run():
+        for value in values:
+            convert_ms(value)
+        return len(values)
+
+    result = measure(run, context.repeat)
+    result["per_call"] = {
+        key: value / len(values)
+        for key, value in result["seconds"].items()
+        if key != "samples"
+    }
+    return result
+
+
+# -----------------------------------------------------------------------------
+# Runner
+# -----------------------------------------------------------------------------
+class Context:
+    """
+    Synthetic media trees shared by the benchmarks, created on first use
+    """
+
+    def __init__(self, directory, repeat, meta_count):
+        self.directory = directory
+        self.repeat = repeat
+        self.meta_count = meta_count
+        self.trees = {}
+        self._media = {}
+        self.tree_sizes = {}
+
+    def build(self, name):
+        if name not in self.trees:
+            root = os.path.join(self.directory, name)
+            start = time.perf_counter()
+            self.tree_sizes[name] = {
+                "media": trees.TREES[name](root),
+                "build_seconds": time.perf_counter() - start,
+            }
+            self.trees[name] = root
+        return self.trees[name]
+
+    def media(self, name):
+        if name not in self._media:
+            _, files = scan_files(self.build(name), (trees.MEDIA_EXTENSION,))
+            self._media[name] = sorted(files)
+        return self._media[name]
+
+
+def qt_application():
+    """
+    QApplication on the offscreen platform, None without PyQt5
+    """
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return None
+    return QApplication.instance() or QApplication([sys.argv[0]])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", help="comma separated groups or benchmark names")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="timed runs per benchmark"
+    )
+    parser.add_argument(
+        "--parse-latency", type=float, default=2.0, help="fake media parse time(ms)"
+    )
+    parser.add_argument(
+        "--meta-count", type=int, default=200, help="media parsed by get_media_meta"
+    )
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument(
+        "--keep", help="create the trees in this directory and keep them"
+    )
+    args = parser.parse_args(argv)
+
+    fakevlc.parse_latency = args.parse_latency / 1000
+
+    selected = set(args.only.split(",")) if args.only else None
+    directory = args.keep or tempfile.mkdtemp(prefix="everest-bench-")
+    os.makedirs(directory, exist_ok=True)
+
+    # caches and indexes of the benchmarked code stay in the scratch dir
+    os.environ["XDG_DATA_HOME"] = os.path.join(directory, "data")
+    os.environ["XDG_CACHE_HOME"] = os.path.join(directory, "cache")
+
+    context = Context(directory, max(args.repeat, 1), args.meta_count)
+    app = None
+    results = {}
+    try:
+        for name, (group, qt, function) in BENCHMARKS.items():
+            if selected is not None and not selected & {name, group}:
+                continue
+            if qt:
+                app = app or qt_application()
+                if app is None:
+                    results[name] = {"skipped": "PyQt5 is not installed"}
+                    continue
+            print(f"{name}...", file=sys.stderr)
+            results[name] = function(context)
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": context.repeat,
+        "trees": context.tree_sizes,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+
+# extension of the generated media files
+MEDIA_EXTENSION = ".mp4"
+
+
+def _touch(path):
+    os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o644))
+
+
+def _fill(folder, count, start, other_every=10):
+    """
+    Create count empty files in a folder, every other_every file is not a
+    media file (scans have to filter them out)
+    @return: number of media files created
+    """
+    media = 0
+    for number in range(start, start + count):
+        if other_every and number % other_every == other_every - 1:
+            _touch(os.path.join(folder, f"cover {number:06d}.jpg"))
+        else:
+            _touch(os.path.join(folder, f"clip {number:06d}{MEDIA_EXTENSION}"))
+            media += 1
+    return media
+
+
+def flat_tree(root, files=100000):
+    """
+    A single folder with many files
+    @return: number of media files
+    """
+    os.makedirs(root, exist_ok=True)
+    return _fill(root, files, 0)
+
+
+def wide_tree(root, folders=1000, files_per_folder=100):
+    """
+    Many sibling folders, one level deep
+    @return: number of media files
+    """
+    media = 0
+    for number in range(folders):
+        folder = os.path.join(root, f"season {number:04d}")
+        os.makedirs(folder, exist_ok=True)
+        media += _fill(folder, files_per_folder, number * files_per_folder)
+    return media
+
+
+def deep_tree(root, depth=64, branches=2, files_per_folder=100):
+    """
+    Nested folders: every level holds branches folders of files and only
+    the first one goes deeper
+    @return: number of media files
+    """
+    media = 0
+    folder = root
+    for level in range(depth):
+        for branch in range(branches):
+            sibling = os.path.join(folder, f"d{branch}")
+            os.makedirs(sibling, exist_ok=True)
+            start = (level * branches + branch) * files_per_folder
+            media += _fill(sibling, files_per_folder, start)
+        folder = os.path.join(folder, "d0")
+    return media
+
+
+TREES = {
+    "flat": flat_tree,
+    "wide": wide_tree,
+    "deep": deep_tree,
+}
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import argparse
+
+from modules.crypto import CHUNK_SIZE
+from modules.ingest import Ingester
+
+
+def thumbnail_size(value):
+    """
+    --thumbnail-size value: WIDTHxHEIGHT (height 0 keeps the aspect ratio)
+    or none
+    """
+    if value.lower() == "none":
+        return None
+    width, _, height = value.lower().partition("x")
+    try:
+        size = (int(width), int(height or 0))
+    except ValueError:
+        size = None
+    if size is None or size[0] <= 0 or size[1] < 0:
+        raise argparse.ArgumentTypeError(
+            f"invalid size {value!r}, expected WIDTHxHEIGHT or none"
+        )
+    return size
+
+
+def main(argv=None):
+    """
+    Encrypt media files into indexed .bin containers for the player
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument("sources", nargs="+", help="media files")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="container file (single source) or folder, next to the sources "
+        "by default",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="encryption processes (default: CPUs)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE // 1024,
+        help="chunk size in KiB (default %(default)s)",
+    )
+    parser.add_argument(
+        "--task-chunks", type=int, default=64, help="chunks encrypted per task"
+    )
+    parser.add_argument(
+        "--thumbnail-size",
+        type=thumbnail_size,
+        default="64x36",
+        help="stored thumbnail WIDTHxHEIGHT, 'none' to skip (default %(default)s)",
+    )
+    parser.add_argument("--timeout", type=int, default=5000, help="parse timeout(ms)")
+    args = parser.parse_args(argv)
+
+    def output_path(source):
+        name = os.path.splitext(os.path.basename(source))[0] + ".bin"
+        if args.output is None:
+            return os.path.join(os.path.dirname(os.path.abspath(source)), name)
+        if len(args.sources) == 1 and not os.path.isdir(args.output):
+            return args.output
+        return os.path.join(args.output, name)
+
+    failed = 0
+    try:
+        with Ingester(
+            workers=args.workers,
+            chunk_size=args.chunk_size * 1024,
+            task_chunks=args.task_chunks,
+            thumbnail_size=args.thumbnail_size,
+            timeout=args.timeout,
+        ) as ingester:
+            for source in args.sources:
+                output = output_path(source)
+                if os.path.abspath(output) == os.path.abspath(source):
+                    print(
+                        f"{source}: output would overwrite the source", file=sys.stderr
+                    )
+                    failed += 1
+                    continue
+
+                started = time.monotonic()
+                try:
+                    header, parse_error = ingester.ingest(source, output)
+                except (OSError, RuntimeError) as error:
+                    print(f"{source}: {error}", file=sys.stderr)
+                    failed += 1
+                    continue
+                if parse_error is not None:
+                    print(
+                        f"{source}: not parsed ({parse_error}), stored without "
+                        "duration, title and thumbnail",
+                        file=sys.stderr,
+                    )
+
+                elapsed = time.monotonic() - started
+                megabytes = header.payload_size / (1024 * 1024)
+                print(
+                    f"{output}: {megabytes:.1f} MiB in {elapsed:.1f}s "
+                    f"({megabytes / max(elapsed, 1e-9):.0f} MiB/s), "
+                    f"{header.chunk_count} chunks, duration {header.duration}ms"
+                    + (", thumbnail" if header.thumbnail_size else ""),
+                    file=sys.stderr,
+                )
+    except LookupError as error:
+        # no media key
+        print(error, file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("interrupted", file=sys.stderr)
+        return 1
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,29 @@
 import sys
 
-# PyQt5 import
-from PyQt5.QtWidgets import QApplication
+# Startup timing, imported first
+from modules.startup import StartupProfiler
 
-# Media player GUI
-from media import MediaPlayer
+if __name__ == "__main__":
 
+    # print a per-phase startup timing report
+    profiler = StartupProfiler(enabled="--profile-startup" in sys.argv)
+    argv = [arg for arg in sys.argv if arg != "--profile-startup"]
 
-if __name__ == "__main__":
+    # PyQt5 import
+    with profiler.phase("import PyQt5"):
+        from PyQt5.QtWidgets import QApplication
 
     # create an app instance
-    app = QApplication(sys.argv)
+    with profiler.phase("QApplication"):
+        app = QApplication(argv)
+
+    # Media player GUI, libvlc is only loaded once the window is shown
+    with profiler.phase("import media"):
+        from media import MediaPlayer
 
     # create a new application window
-    window = MediaPlayer()
+    with profiler.phase("main window"):
+        window = MediaPlayer(profiler=profiler)
 
     # exit window
     sys.exit(app.exec_())
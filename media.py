@@ -1,11 +1,17 @@
 import os
+import logging
 from pathlib import Path
+from functools import partial
+from contextlib import nullcontext
 
-import vlc
-
-from player import Player
 from view.ui import Ui_MainWindow
-from modules.helper import scan_files
+from modules.helper import convert_ms
+from modules.scan_worker import ScanWorker, LibraryWatcher
+from modules.playlist_loader import PlaylistLoader
+from modules.library import LibraryIndex
+from modules.playlist_model import PlaylistModel
+from modules.latency import recorder as latency
+from modules import session
 
 from PyQt5.QtWidgets import (
     QMainWindow,
@@ -13,10 +19,15 @@ from PyQt5.QtWidgets import (
     QAction,
     QMenu,
     QFileDialog,
+    QMessageBox,
     QShortcut,
-    QTreeWidgetItem,
+    QFrame,
+    QVBoxLayout,
 )
 from PyQt5.QtGui import QIcon, QKeySequence
+from PyQt5.QtCore import QPoint, QSize, Qt, QTimer, pyqtSignal
+
+log = logging.getLogger(__name__)
 
 
 class MediaPlayer(QMainWindow, Ui_MainWindow):
@@ -24,24 +35,208 @@ class MediaPlayer(QMainWindow, Ui_MainWindow):
     Media player (GUI)
     """
 
+    # [(path, status)] of a bulk playlist insert, emitted on the GUI thread
+    media_added = pyqtSignal(list, bool)
+
     # defaults
     home_directory = os.environ.get("HOME")
     default_dir = os.path.join(home_directory, "Videos")
 
-    def __init__(self, *args, **kwargs):
+    # media files picked up when scanning folders
+    media_extensions = (".mp4",)
+
+    # watch the scanned folders for added/removed media (linux inotify)
+    watch_library = True
+
+    # delay(ms) between the last keystroke and the playlist search
+    search_delay = 150
+
+    # upcoming playlist items warmed in the background and the I/O cap(bytes/s)
+    prefetch_depth = 1
+    prefetch_rate = 32 * 1024 * 1024
+
+    # number of media parsed in parallel
+    probe_workers = 4
+
+    # save the playlist on exit and restore it (with the position) on start
+    restore_session = True
+
+    # duration shown until the media has been parsed
+    duration_placeholder = "--:--"
+
+    # playlist thumbnails: size, snapshot processes and disk cache budget(bytes)
+    thumbnail_size = (64, 36)
+    thumbnail_workers = 2
+    thumbnail_cache_size = 64 * 1024 * 1024
+
+    # open the next media on a second media player before the current one
+    # ends, with an optional audio crossfade(ms) for media without video
+    gapless = False
+    crossfade = 0
+
+    # playback health sampling interval(ms) and on screen health line
+    health_interval = 1000
+    health_overlay = False
+
+    def __init__(self, *args, profiler=None, **kwargs):
+        """
+        @param profiler: optional StartupProfiler
+        """
         super(MediaPlayer, self).__init__(*args, **kwargs)
         self.setupUi(self)
 
-        # Player Instance
-        self.player = Player()
+        self.profiler = profiler
+
+        # libvlc and the background workers are started once the window is up
+        self.player = None
+        self.events = None
+        self.pending_resume = None
+        self.prefetcher = None
+        self.prober = None
+        self.thumbnails = None
+        self.health = None
+        self.library = None
+        self.scanner = None
+        self.watcher = None
+        self.playlist_loader = None
 
         # Initilise UI
         self.initialise_ui()
 
+        self.show()
+
+        # queued behind the show and paint events of the window
+        QTimer.singleShot(0, self.start_player)
+
+    def _phase(self, name):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.phase(name)
+
+    def start_player(self):
+        """
+        Create the libvlc player and the background workers (deferred)
+        """
+        if self.player is not None:
+            return
+
+        if self.profiler is not None:
+            self.profiler.mark("event loop start")
+
+        with self._phase("import libvlc"):
+            from player import Player
+            from modules.events import EventBridge
+
+        # Player Instance
+        with self._phase("libvlc player"):
+            self.player = Player(
+                gapless=MediaPlayer.gapless, crossfade=MediaPlayer.crossfade
+            )
+
+            # opt-in latency histograms (EVEREST_LATENCY)
+            latency.instrument_object(self.player, "player")
+
+            # Bind vlc Instance to Qt Widget
+            if MediaPlayer.gapless:
+                self.player.set_window(
+                    self.videoFrame.winId(), self.standby_frame().winId()
+                )
+                self.player.media_list_player.swapped.connect(self.show_video_output)
+            else:
+                self.player.set_window(self.videoFrame.winId())
+
+            # Set default media volume
+            self.player.m_instance.audio_set_volume(65)  # 65 dB
+
+            # VLC events, delivered on the GUI thread
+            self.events = EventBridge(self.player, parent=self)
+            self.events.media_changed.connect(self.player.set_title_marquee)
+            self.events.error.connect(self.on_playback_error)
+
+        with self._phase("background workers"):
+            self.start_workers()
+
         # Media player keybaord shortcuts
-        self.keyboard_shortcuts()
+        with self._phase("shortcuts"):
+            self.keyboard_shortcuts()
+
+        # last session: playlist, current media, position and playback mode
+        if MediaPlayer.restore_session and os.path.exists(session.session_path()):
+            with self._phase("restore session"):
+                self.load_playlist(session.session_path(), resume=True)
+
+        # latency report file and debug overlay
+        latency.start()
+        if latency.overlay:
+            self.latency_timer = QTimer(self)
+            self.latency_timer.setInterval(1000)
+            self.latency_timer.timeout.connect(self.show_latency_overlay)
+            self.latency_timer.start()
+
+        if self.profiler is not None:
+            self.profiler.report()
+
+    def start_workers(self):
+        """
+        Start the background workers
+        """
+        from modules.prober import MediaProber
+        from modules.prefetch import Prefetcher
+        from modules.thumbnails import ThumbnailService
+        from modules.health import HealthMonitor
+
+        # Media are inserted into the libvlc playlist off the GUI thread
+        self.media_added.connect(self.on_media_added)
+
+        # Read-ahead of the next playlist items
+        self.prefetcher = Prefetcher(
+            self.player,
+            depth=MediaPlayer.prefetch_depth,
+            rate=MediaPlayer.prefetch_rate,
+        )
 
-        self.show()
+        # Background metadata prober
+        self.prober = MediaProber(
+            max_workers=MediaPlayer.probe_workers, cache=self.player.cache
+        )
+        self.prober.probed.connect(self.update_playlist_duration)
+
+        # Thumbnails of the visible playlist rows
+        self.thumbnails = ThumbnailService(
+            size=MediaPlayer.thumbnail_size,
+            max_workers=MediaPlayer.thumbnail_workers,
+            max_bytes=MediaPlayer.thumbnail_cache_size,
+        )
+        self.thumbnails.ready.connect(self.update_playlist_thumbnail)
+
+        # Playback health, media are reopened with more caching on underruns
+        self.health = HealthMonitor(
+            self.player,
+            interval=MediaPlayer.health_interval,
+            overlay=MediaPlayer.health_overlay,
+            parent=self,
+        )
+        self.events.media_changed.connect(self.health.media_changed)
+        self.health.start()
+
+        # Library index, unchanged folders are not listed again
+        self.library = LibraryIndex()
+
+        # Background folder scanner
+        self.scanner = ScanWorker(MediaPlayer.media_extensions, index=self.library)
+        self.scanner.found.connect(self.add_scanned_media)
+
+        # Keep the playlist in sync with the scanned folders
+        self.watcher = LibraryWatcher(self.library, MediaPlayer.media_extensions)
+        if MediaPlayer.watch_library:
+            self.scanner.finished.connect(self.watcher.watch)
+        self.watcher.changed.connect(self.update_library_media)
+
+        # Playlist files are decoded off the GUI thread
+        self.playlist_loader = PlaylistLoader(parent=self)
+        self.playlist_loader.opened.connect(self.resume_playlist)
+        self.playlist_loader.loaded.connect(self.add_playlist_entries)
+        self.playlist_loader.failed.connect(self.playlist_load_failed)
 
     def initialise_ui(self):
         """
@@ -51,7 +246,37 @@ class MediaPlayer(QMainWindow, Ui_MainWindow):
         self.width = 720
         self.height = 480
 
-        self.playlist_files = []
+        # icon shared by all the playlist rows
+        self.media_icon = QIcon(os.path.join("src", "icons", "film-small.png"))
+
+        # Playlist model
+        self.playlist_model = PlaylistModel(
+            icon=self.media_icon,
+            convert_ms=convert_ms,
+            placeholder=MediaPlayer.duration_placeholder,
+            parent=self,
+        )
+        self.treeView.setModel(self.playlist_model)
+        self.treeView.setIconSize(QSize(*MediaPlayer.thumbnail_size))
+
+        # Thumbnails follow the visible rows, requested once scrolling settles
+        self.thumbnail_timer = QTimer(self)
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.setInterval(100)
+        self.thumbnail_timer.timeout.connect(self.request_thumbnails)
+        # QTimer.start(int) would take the signal arguments as the interval
+        restart = lambda *args: self.thumbnail_timer.start()
+        self.treeView.verticalScrollBar().valueChanged.connect(restart)
+        self.playlist_model.rowsInserted.connect(restart)
+        self.playlist_model.layoutChanged.connect(restart)
+        self.playlist_model.modelReset.connect(restart)
+
+        # Playlist search, debounced while typing
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(MediaPlayer.search_delay)
+        self.search_timer.timeout.connect(self.search_playlist)
+        self.lineEdit.textChanged.connect(self.search_timer.start)
 
         # Get the desktop screen geometry
         self._SCREEN_WIDTH = QApplication.desktop().width()
@@ -70,22 +295,43 @@ class MediaPlayer(QMainWindow, Ui_MainWindow):
         # Application icon
         self.setWindowIcon(QIcon(os.path.join("src", "icons", "icon.png")))
 
-        # Bind vlc Instance to Qt Widget
-        self.player.set_window(self.videoFrame.winId())
-
-        # Set default media volume
-        self.player.m_instance.audio_set_volume(65)  # 65 dB
-
         # Hide playlist widget
         self.mainFrame.hide()
 
-        # VLC Event handler
-        self.player.event_manager_attach_changed(self.player.set_title_marquee)
+    def closeEvent(self, event):
+        """
+        Stop the background workers before closing the window
+        """
+        if self.player is None:
+            # closed before the deferred startup
+            super(MediaPlayer, self).closeEvent(event)
+            return
+
+        if MediaPlayer.restore_session:
+            self.save_playlist(session.session_path())
+
+        self.events.close()
+        if self.player.gapless:
+            self.player.media_list_player.close()
+        self.health.stop()
+        self.playlist_loader.cancel()
+        self.scanner.cancel()
+        self.prefetcher.stop()
+        self.watcher.stop()
+        self.library.save()
+        self.prober.shutdown()
+        self.thumbnails.shutdown()
+        self.player.titles.shutdown()
+        self.player.cache.close()
+        latency.close()
+        super(MediaPlayer, self).closeEvent(event)
 
     def contextMenuEvent(self, event):
         """
         Context menu
         """
+        self.start_player()
+
         context_menu = QMenu(self)
 
         if self.player.is_playing():
@@ -106,37 +352,82 @@ class MediaPlayer(QMainWindow, Ui_MainWindow):
         context_menu.addSeparator()
 
         playlist_button = context_menu.addAction(playlist_text)
+        clear_button = context_menu.addAction("Clear Playlist")
 
         open_menu = QMenu("Open Media", self)
         open_file = QAction("Open File..", self)
         open_dir = QAction("Open Directory..", self)
+        open_playlist = QAction("Open Playlist..", self)
         open_menu.addAction(open_file)
         open_menu.addAction(open_dir)
+        open_menu.addAction(open_playlist)
         sub_menu = context_menu.addMenu(open_menu)
+        save_playlist = context_menu.addAction("Save Playlist..")
 
         context_menu.addSeparator()
         quitAct = context_menu.addAction("Quit")
 
         action = context_menu.exec_(self.mapToGlobal(event.pos()))
-        if action == quitAct:
-            self.close()
-        elif action == play_button:
-            self.player.pause()
-        elif action == stop_button:
-            self.player.stop()
-            self.update()
-        elif action == open_file:
-            self.open_files()
-        elif action == open_dir:
-            self.open_folder()
-        elif action == next_button:
-            self.player.next()
-            print(self.player.get_title())
-        elif action == previous_button:
-            self.player.previous()
-        elif action == playlist_button:
-            self.player.pause()
-            self.toggle_playlist_video_view()
+        if action is None:
+            return
+
+        # time the selected action
+        with latency.timer(f"menu.{action.text()}"):
+            if action == quitAct:
+                self.close()
+            elif action == play_button:
+                self.player.pause()
+            elif action == stop_button:
+                self.player.stop()
+                self.update()
+            elif action == open_file:
+                self.open_files()
+            elif action == open_dir:
+                self.open_folder()
+            elif action == open_playlist:
+                self.open_playlist()
+            elif action == save_playlist:
+                self.save_playlist_as()
+            elif action == next_button:
+                self.player.next()
+                print(self.player.get_title())
+            elif action == previous_button:
+                self.player.previous()
+            elif action == playlist_button:
+                self.player.pause()
+                self.toggle_playlist_video_view()
+            elif action == clear_button:
+                self.clear_playlist()
+
+    def show_latency_overlay(self):
+        """
+        Show the slowest operations on screen (EVEREST_LATENCY=overlay)
+        """
+        events = self.events.stats()
+        text = (
+            f"{latency.summary_text()}\n"
+            f"events dropped={events['dropped']} coalesced={events['coalesced']}"
+        )
+        self.player.osd.show("debug", text, timeout=1500)
+
+    def standby_frame(self):
+        """
+        Video output of the gapless standby media player, a child of the
+        video frame shown over it while the standby player is on screen
+        """
+        self.standbyFrame = QFrame(self.videoFrame)
+        self.standbyFrame.setStyleSheet(self.videoFrame.styleSheet())
+        layout = QVBoxLayout(self.videoFrame)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.standbyFrame)
+        self.standbyFrame.hide()
+        return self.standbyFrame
+
+    def show_video_output(self, slot):
+        """
+        Show the video output of the media player on screen after a gapless swap
+        """
+        self.standbyFrame.setVisible(slot == 1)
 
     def toggle_playlist_video_view(self):
         """
@@ -146,6 +437,7 @@ class MediaPlayer(QMainWindow, Ui_MainWindow):
             self.videoFrame.hide()
             self.mainFrame.show()
             self.update()
+            self.thumbnail_timer.start()
         else:
             self.mainFrame.hide()
             self.videoFrame.show()
@@ -178,40 +470,197 @@ class MediaPlayer(QMainWindow, Ui_MainWindow):
             QFileDialog.DontResolveSymlinks,
         )
 
-        _, files = scan_files(files_found, ".mp4")
+        self.scan_media([files_found])
 
-        # sort files based on created time
-        files.sort(key=os.path.getctime)
+    def scan_media(self, paths):
+        """
+        Scan files and folders in the background, the media found are
+        added to the playlist batch by batch
+        """
+        self.start_player()
+        self.scanner.start(paths)
 
-        self.set_uri(files)
+    def add_scanned_media(self, entries):
+        """
+        Add a batch of scanned media (ScanEntry) to the playlist
+        Media are listed in the order the scan finds them, the playlist
+        columns sort them
+        """
+        self.set_uri([entry.path for entry in entries])
 
-    def add_playlist_items(self):
+    def search_playlist(self):
         """
-        Add items to the playlist list Widget
+        Filter the playlist with the search text
         """
+        self.playlist_model.set_filter(self.lineEdit.text())
 
-        self.items = []
-        self.treeWidget.clear()
+    def update_library_media(self, added, removed):
+        """
+        Apply the media added to or removed from the watched folders
+        """
+        if removed:
+            self.player.remove_media(removed)
+            self.playlist_model.remove(removed)
+        if added:
+            # listed, not played
+            self.set_uri(added, play=False)
+
+    def add_playlist_items(self, mrls, durations=None):
+        """
+        Append items to the playlist model
+        @param durations: optional dict of known durations(ms) by path
+        """
+        # media already parsed in this session or saved with the playlist
+        known = dict(durations or {})
+        for mrl in mrls:
+            if mrl in known:
+                continue
+            duration = self.playlist_model.duration(mrl)
+            if duration != PlaylistModel.UNKNOWN:
+                known[mrl] = duration
 
-        # add items to tree widget
-        for index, basename in enumerate(self.playlist_files):
-            # print(basename)
-            item = QTreeWidgetItem(
-                [
-                    os.path.basename(basename),
-                    str(self.player.get_media_meta(basename)),
-                    basename,
-                ]
+        self.playlist_model.append(mrls, known)
+
+        # parse the new media in the background
+        self.prober.probe([mrl for mrl in dict.fromkeys(mrls) if mrl not in known])
+
+    def update_playlist_duration(self, mrl, duration, title):
+        """
+        Fill in the duration of a playlist item once it has been parsed
+        """
+        self.playlist_model.set_duration(mrl, duration)
+
+        # the marquee title of the media is known from now on
+        self.player.titles.remember(mrl, title)
+
+    def request_thumbnails(self):
+        """
+        Ask for the thumbnails of the playlist rows in view
+        """
+        if self.thumbnails is None:
+            return
+        if not self.mainFrame.isVisible() or not self.playlist_model.rowCount():
+            self.thumbnails.request([])
+            return
+
+        viewport = self.treeView.viewport()
+        first = self.treeView.indexAt(QPoint(0, 0)).row()
+        last = self.treeView.indexAt(QPoint(0, viewport.height() - 1)).row()
+        if first < 0:
+            first = 0
+        if last < 0:
+            last = self.playlist_model.rowCount() - 1
+
+        self.thumbnails.request(
+            [self.playlist_model.path(row) for row in range(first, last + 1)]
+        )
+
+    def update_playlist_thumbnail(self, mrl, thumbnail):
+        """
+        Show the generated thumbnail of a playlist item
+        """
+        self.playlist_model.set_icon(mrl, QIcon(thumbnail))
+
+    def open_playlist(self):
+        """
+        Open a saved playlist (.evpl, .m3u, .m3u8)
+        """
+        file, _ = QFileDialog.getOpenFileName(
+            self,
+            "Open playlist",
+            MediaPlayer.default_dir,
+            "Playlists (*.evpl *.m3u *.m3u8);;All files (*)",
+        )
+        if file:
+            self.load_playlist(file)
+
+    def save_playlist_as(self):
+        """
+        Save the playlist (.evpl, .m3u, .m3u8)
+        """
+        file, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save playlist",
+            os.path.join(MediaPlayer.default_dir, "playlist.m3u8"),
+            "M3U8 playlist (*.m3u8);;M3U playlist (*.m3u);;Everest playlist (*.evpl)",
+        )
+        if file:
+            self.save_playlist(file)
+
+    def load_playlist(self, path, resume=False):
+        """
+        Append the media of a playlist file, read in the background
+        @param resume: restore the current media, position and playback mode
+        saved in the file (.evpl)
+        """
+        self.start_player()
+        self.playlist_loader.load(path, resume)
+
+    def resume_playlist(self, path, state):
+        """
+        Restore the playback state saved in a session file
+        """
+        current, position, mode = state
+        self.player.set_playback_mode(mode)
+        if current >= 0 and not self.player.playlist_count():
+            self.pending_resume = (current, position)
+
+    def add_playlist_entries(self, entries):
+        """
+        Add a batch of playlist file entries (PlaylistEntry) to the playlist
+        """
+        mrls, durations = [], {}
+        for entry in entries:
+            mrls.append(entry.path)
+            if entry.duration != session.UNKNOWN:
+                durations[entry.path] = entry.duration
+            self.player.titles.remember(entry.path, entry.title)
+
+        self.set_uri(mrls, durations)
+
+    def playlist_load_failed(self, path, error):
+        """
+        A playlist file could not be read
+        """
+        self.show_error("Cannot open playlist", f"{path}: {error}")
+
+    def save_playlist(self, path):
+        """
+        Save the playlist, .evpl files also keep the current media, its
+        position and the playback mode
+        """
+        paths = list(self.player.paths)
+        entries = (
+            session.PlaylistEntry(
+                mrl, self.playlist_model.duration(mrl), self.player.titles.known(mrl)
             )
-            item.setIcon(
-                0, QIcon(QIcon(os.path.join("src", "icons", "film-small.png")))
+            for mrl in paths
+        )
+        try:
+            session.write_entries(
+                path,
+                entries,
+                current=self.player.media_list_index_of_item() if paths else -1,
+                position=max(self.player.get_media_current_time(), 0),
+                mode=self.player.mode.value,
             )
-            self.items.append(item)
-            self.treeWidget.insertTopLevelItem(index, item)
+        except OSError as error:
+            self.show_error("Cannot save playlist", f"{path}: {error}")
 
-        self.treeWidget.headerItem().setText(
-            0, f"Title({self.treeWidget.topLevelItemCount()})"
-        )
+    def clear_playlist(self):
+        """
+        Remove all the media from the playlist
+        """
+        # drop the scans, probes and thumbnails of the media no longer listed
+        self.playlist_loader.cancel()
+        self.pending_resume = None
+        self.scanner.cancel()
+        self.watcher.unwatch_all()
+        self.prober.cancel()
+        self.thumbnails.request([])
+
+        self.player.clear_playlist()
+        self.playlist_model.clear()
 
     def dragEnterEvent(self, event):
         """
@@ -226,46 +675,114 @@ class MediaPlayer(QMainWindow, Ui_MainWindow):
         """
         # scan through the url/folders draged
         #  to the mainwindow to play media
-        files = self.convert_qurl_path(event.mimeData().urls())
-        self.set_uri(files)
+        paths = self.convert_qurl_path(event.mimeData().urls())
+        self.scan_media(paths)
 
-    def set_uri(self, mrls):
+    def set_uri(self, mrls, durations=None, play=True):
         """
         Set media uri an play items
+        @param durations: optional dict of known durations(ms) by path
+        @param play: start playing if the player is idle
+        """
+        self.start_player()
+        future = self.player.add_media_bulk(mrls)
+        future.add_done_callback(partial(self.media_bulk_done, mrls, play))
+
+        # playlist items
+        self.add_playlist_items(mrls, durations)
+
+    def media_bulk_done(self, mrls, play, future):
         """
-        self.player.add_media(mrls)
+        Forward the statuses of a bulk insert to the GUI thread
+        Called from the insert worker, an insert that raised reports its
+        error for every media
+        """
+        if future.cancelled():
+            statuses = [(mrl, "cancelled") for mrl in mrls]
+        elif future.exception() is not None:
+            error = future.exception()
+            log.error("adding %d media failed", len(mrls), exc_info=error)
+            statuses = [(mrl, str(error) or type(error).__name__) for mrl in mrls]
+        else:
+            statuses = future.result()
+        self.media_added.emit(statuses, play)
+
+    def on_media_added(self, statuses, play=True):
+        """
+        Start playing once media have been inserted in the libvlc playlist
+        """
+        failed = [
+            (file, status)
+            for file, status in statuses
+            if status not in ("ok", "cancelled")
+        ]
+        for file, status in failed:
+            log.warning("%s: %s", file, status)
+        if failed:
+            self.player.set_marquee(f"{len(failed)} media could not be added")
+        if not play:
+            return
+
+        if self.pending_resume is not None:
+            # restored session: play the saved media from the saved time
+            index, position = self.pending_resume
+            if index >= self.player.playlist_count() and any(
+                status == "ok" for _, status in statuses
+            ):
+                # the saved media is in a later batch of the session file
+                return
+            self.pending_resume = None
+            if 0 <= index < self.player.playlist_count():
+                self.player.play_at(index)
+                self.resume_position(position)
+                return
+
         if not self.player.is_playing():
             self.player.play()
 
-        [self.playlist_files.append(mrl) for mrl in mrls]
+    def on_playback_error(self):
+        """
+        Stop an encrypted media that failed verification instead of playing
+        on past the failed chunk
+        """
+        error = self.player.integrity_error()
+        if error is None:
+            return
+        self.player.stop()
+        self.show_error(
+            "Playback stopped",
+            f"{os.path.basename(error.path)}: {error.reason}",
+        )
 
-        # playlist items
-        self.add_playlist_items()
+    def show_error(self, title, text):
+        """
+        Log an error and show it in a message box, without blocking the
+        event loop
+        """
+        log.error("%s: %s", title, text)
+        box = QMessageBox(QMessageBox.Warning, title, text, QMessageBox.Ok, self)
+        box.setAttribute(Qt.WA_DeleteOnClose)
+        box.show()
+
+    def resume_position(self, position, attempts=50):
+        """
+        Seek to a time(ms) once the current media plays, polled every 100ms
+        """
+        if position <= 0:
+            return
+        if self.player.is_playing() and self.player.m_instance.get_length() > 0:
+            self.player.set_time(position)
+            return
+        if attempts:
+            QTimer.singleShot(100, lambda: self.resume_position(position, attempts - 1))
 
     @staticmethod
     def convert_qurl_path(urls):
         """
         Convert QUrl to Path(linux)
+        The folders are scanned for media by scan_media
         """
-        url_path = []
-        _found_files = []
-
-        # clean urls to paths
-        for url in urls:
-            # Convert QUrl to Path(linux)
-            url_path.append(Path(url.path()))
-
-            # check for folders and files
-        for path in url_path:
-            # Get the files matching the extension from the folder
-            if path.is_dir():
-                _, files = scan_files(path, ".mp4")
-                [_found_files.append(file) for file in files]
-            elif path.is_file():
-                # files.append(os.fspath(path))
-                _found_files.append(os.fspath(path))
-
-        return _found_files
+        return [Path(url.path()) for url in urls]
 
     def mouseDoubleClickEvent(self, *event):
         """
@@ -285,84 +802,124 @@ class MediaPlayer(QMainWindow, Ui_MainWindow):
         """
         # Close application
         self.shortcut_quit = QShortcut(QKeySequence("Ctrl+Q"), self)
-        self.shortcut_quit.activated.connect(self.close)
+        self.shortcut_quit.activated.connect(latency.instrument(self.close, "key.quit"))
 
         # Fullscreen F
         self.shortcut_fullscreen = QShortcut(QKeySequence("F"), self)
-        self.shortcut_fullscreen.activated.connect(self.mouseDoubleClickEvent)
+        self.shortcut_fullscreen.activated.connect(
+            latency.instrument(self.mouseDoubleClickEvent, "key.fullscreen")
+        )
 
         # Open files
         self.shortcut_open = QShortcut(QKeySequence("Ctrl+O"), self)
-        self.shortcut_open.activated.connect(self.open_files)
+        self.shortcut_open.activated.connect(
+            latency.instrument(self.open_files, "key.open")
+        )
 
         # Open folder
         self.shortcut_open_folder = QShortcut(QKeySequence("Ctrl+Shift+O"), self)
-        self.shortcut_open_folder.activated.connect(self.open_folder)
+        self.shortcut_open_folder.activated.connect(
+            latency.instrument(self.open_folder, "key.open_folder")
+        )
 
         # Mute audio
         self.shortcut_mute = QShortcut(QKeySequence("M"), self)
-        self.shortcut_mute.activated.connect(self.player.mute_audio)
+        self.shortcut_mute.activated.connect(
+            latency.instrument(self.player.mute_audio, "key.mute")
+        )
 
         # Pause/resume
         self.shortcut_pause = QShortcut(QKeySequence("Space"), self)
-        self.shortcut_pause.activated.connect(self.player.pause)
+        self.shortcut_pause.activated.connect(
+            latency.instrument(self.player.pause, "key.pause")
+        )
 
         # Stop media
         self.shortcut_stop = QShortcut(QKeySequence("S"), self)
-        self.shortcut_stop.activated.connect(self.player.stop)
+        self.shortcut_stop.activated.connect(
+            latency.instrument(self.player.stop, "key.stop")
+        )
 
         # Next media
         self.shortcut_next = QShortcut(QKeySequence("N"), self)
-        self.shortcut_next.activated.connect(self.player.next)
+        self.shortcut_next.activated.connect(
+            latency.instrument(self.player.next, "key.next")
+        )
 
         # Next media second option
         self.shortcut_next_2 = QShortcut(QKeySequence("0"), self)
-        self.shortcut_next_2.activated.connect(self.player.next)
+        self.shortcut_next_2.activated.connect(
+            latency.instrument(self.player.next, "key.next_2")
+        )
 
         # Previous media
         self.shortcut_previous = QShortcut(QKeySequence("P"), self)
-        self.shortcut_previous.activated.connect(self.player.previous)
+        self.shortcut_previous.activated.connect(
+            latency.instrument(self.player.previous, "key.previous")
+        )
 
         # Previous media second option
         self.shortcut_previous_2 = QShortcut(QKeySequence("."), self)
-        self.shortcut_previous_2.activated.connect(self.player.previous)
+        self.shortcut_previous_2.activated.connect(
+            latency.instrument(self.player.previous, "key.previous_2")
+        )
 
         # # 10 seconds media skip
         self.shortcut_forward = QShortcut(QKeySequence("Right"), self)
-        self.shortcut_forward.activated.connect(self.player.fast_forward)
+        self.shortcut_forward.activated.connect(
+            latency.instrument(self.player.fast_forward, "key.forward")
+        )
 
         # # 10 seconds backward skip
         self.shortcut_backward = QShortcut(QKeySequence("Left"), self)
-        self.shortcut_backward.activated.connect(self.player.back_forward)
+        self.shortcut_backward.activated.connect(
+            latency.instrument(self.player.back_forward, "key.backward")
+        )
 
         # # Volume up by 10dB
         self.shortcut_volume_up = QShortcut(QKeySequence("Up"), self)
-        self.shortcut_volume_up.activated.connect(self.player.volume_up)
+        self.shortcut_volume_up.activated.connect(
+            latency.instrument(self.player.volume_up, "key.volume_up")
+        )
 
         # # Volume down by 10dB
         self.shortcut_volume_down = QShortcut(QKeySequence("Down"), self)
-        self.shortcut_volume_down.activated.connect(self.player.volume_down)
+        self.shortcut_volume_down.activated.connect(
+            latency.instrument(self.player.volume_down, "key.volume_down")
+        )
 
         # # Aspect ratio
         self.shortcut_aspect_ratio = QShortcut(QKeySequence("O"), self)
-        self.shortcut_aspect_ratio.activated.connect(self.player.video_set_scale)
+        self.shortcut_aspect_ratio.activated.connect(
+            latency.instrument(self.player.video_set_scale, "key.aspect_ratio")
+        )
 
         # Show current media timestamp
         self.shortcut_timestamp = QShortcut(QKeySequence("T"), self)
-        self.shortcut_timestamp.activated.connect(self.player.show_media_timestamp)
+        self.shortcut_timestamp.activated.connect(
+            latency.instrument(self.player.show_media_timestamp, "key.timestamp")
+        )
 
         # Show current media title
         self.shortcut_title = QShortcut(QKeySequence("I"), self)
-        self.shortcut_title.activated.connect(self.player.set_title_marquee)
+        self.shortcut_title.activated.connect(
+            latency.instrument(self.player.set_title_marquee, "key.title")
+        )
 
         # Next frame
         self.shortcut_next_frame = QShortcut(QKeySequence("E"), self)
-        self.shortcut_next_frame.activated.connect(self.player.next_frame)
+        self.shortcut_next_frame.activated.connect(
+            latency.instrument(self.player.next_frame, "key.next_frame")
+        )
 
         # Media player playback mode
         self.shortcut_player_mode = QShortcut(QKeySequence("L"), self)
-        self.shortcut_player_mode.activated.connect(self.player.set_playback_mode)
+        self.shortcut_player_mode.activated.connect(
+            latency.instrument(self.player.set_playback_mode, "key.player_mode")
+        )
 
         # Toggle between playlist and video view
         self.shortcut_toggle_view = QShortcut(QKeySequence("A"), self)
-        self.shortcut_toggle_view.activated.connect(self.toggle_playlist_video_view)
+        self.shortcut_toggle_view.activated.connect(
+            latency.instrument(self.toggle_playlist_video_view, "key.toggle_view")
+        )
@@ -0,0 +1,186 @@
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import CancelledError, FIRST_COMPLETED, wait
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import vlc
+
+from modules.cache import MetadataCache
+from modules.metadata import parse_media
+from modules.scanner import scan_media
+
+# libvlc instance and parse timeout(ms) of a worker process
+_instance = None
+_timeout = 5000
+
+
+def _init_worker(timeout):
+    """
+    Process pool initializer, one libvlc instance per process
+    """
+    global _instance, _timeout
+    _instance = vlc.Instance("--quiet", "--no-video", "--no-audio")
+    _timeout = timeout
+
+
+def probe_files(paths):
+    """
+    Parse a shard of media files (worker process)
+    @return: list of result dicts
+    """
+    if _instance is None:
+        _init_worker(_timeout)
+
+    results = []
+    for path in paths:
+        # keyed before the parse, a file modified meanwhile is probed again
+        key = MetadataCache.file_key(path)
+        if key is None:
+            results.append({"path": path, "status": "missing"})
+            continue
+
+        try:
+            meta = parse_media(_instance, path, _timeout)
+        except Exception as error:
+            results.append({"path": path, "status": "error", "error": str(error)})
+            continue
+
+        results.append(
+            {
+                "path": path,
+                "size": key[1],
+                "mtime_ns": key[2],
+                "duration": meta["duration"],
+                "title": meta["title"],
+                "tracks": meta["tracks"],
+                "status": "ok" if meta["duration"] >= 0 else "failed",
+            }
+        )
+    return results
+
+
+def probe_library(
+    paths,
+    ext,
+    workers=None,
+    shard_size=32,
+    timeout=5000,
+    cache=None,
+    force=False,
+    max_depth=None,
+):
+    """
+    Scan files and folders and parse the media on a process pool
+    Shards are sent to the pool while the scan is still running and the
+    results are yielded as soon as a shard is done (unordered). A shard
+    that fails yields "error" results. When a worker crashes (libvlc) the
+    pool is recreated and the files lost with it are parsed again one at a
+    time on a separate process, a file that crashes it alone is reported
+    as an error.
+    @param ext: media file extensions
+    @param workers: number of processes, one per CPU by default
+    @param shard_size: files parsed per task
+    @param timeout: parse timeout in ms
+    @param cache: optional MetadataCache, cached media are not parsed again
+    and the new results are stored
+    @param force: parse the media even if they are cached
+    @return: generator of result dicts (path, size, mtime_ns, duration,
+    title, tracks, status)
+    """
+    workers = workers or os.cpu_count() or 1
+
+    def new_executor(processes):
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(timeout,),
+        )
+
+    executor = new_executor(workers)
+    # bumped every time a crashed pool is replaced
+    generation = 0
+
+    # single process pool parsing the files lost in a crash, one at a time
+    isolation = None
+    suspects = deque()
+
+    # future -> (shard, generation of the pool, None for the isolation pool)
+    pending = {}
+
+    def submit(shard):
+        pending[executor.submit(probe_files, shard)] = (shard, generation)
+
+    def isolate():
+        nonlocal isolation
+        if not suspects or None in (pool for _, pool in pending.values()):
+            return
+        if isolation is None:
+            isolation = new_executor(1)
+        path = suspects.popleft()
+        pending[isolation.submit(probe_files, [path])] = ([path], None)
+
+    def failed(shard, error):
+        return [
+            {"path": path, "status": "error", "error": str(error)} for path in shard
+        ]
+
+    def finished(block):
+        # wait for shards, at most workers * 2 of them are kept in flight
+        nonlocal executor, generation, isolation
+        while pending and (block or len(pending) >= workers * 2):
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                shard, pool = pending.pop(future)
+                try:
+                    results = future.result()
+                except (BrokenProcessPool, CancelledError) as error:
+                    if pool is None:
+                        # alone on its process: this file crashed libvlc
+                        isolation.shutdown(wait=False)
+                        isolation = None
+                        results = failed(shard, error)
+                    else:
+                        if pool == generation:
+                            # the first shard lost with this pool replaces it
+                            executor.shutdown(wait=False, cancel_futures=True)
+                            executor = new_executor(workers)
+                            generation += 1
+                        suspects.extend(shard)
+                        continue
+                except Exception as error:
+                    results = failed(shard, error)
+
+                for result in results:
+                    if cache is not None and result["status"] == "ok":
+                        key = (result["path"], result["size"], result["mtime_ns"])
+                        cache.put(result["path"], result, key=key)
+                    yield result
+            isolate()
+
+    try:
+        shard = []
+        roots = [os.path.abspath(path) for path in paths]
+        for batch in scan_media(roots, ext, max_depth=max_depth):
+            for entry in batch:
+                if cache is not None and not force:
+                    meta = cache.get(entry.path)
+                    if meta is not None:
+                        yield dict(path=entry.path, status="cached", **meta)
+                        continue
+
+                shard.append(entry.path)
+                if len(shard) >= shard_size:
+                    submit(shard)
+                    shard = []
+                    yield from finished(block=False)
+
+        if shard:
+            submit(shard)
+        yield from finished(block=True)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if isolation is not None:
+            isolation.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+
+
+class BlockCache:
+    """
+    Thread-safe LRU cache of decrypted media blocks
+    Blocks are keyed by (file id, block index) and the least recently used
+    blocks are evicted once the memory budget is exceeded
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        @param max_bytes: memory budget of the cached blocks
+        """
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._blocks = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Get a cached block
+        @param key: (file id, block index)
+        @return: bytes or None
+        """
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None:
+                self.misses += 1
+                return None
+            self._blocks.move_to_end(key)
+            self.hits += 1
+            return block
+
+    def put(self, key, block):
+        """
+        Store a block and evict the least recently used above the budget
+        """
+        if len(block) > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._blocks.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+
+            self._blocks[key] = block
+            self._bytes += len(block)
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._blocks.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._blocks
+
+    def invalidate(self, file_id=None):
+        """
+        Drop the blocks of a file, or every block
+        """
+        with self._lock:
+            if file_id is None:
+                self._blocks.clear()
+                self._bytes = 0
+                return
+            for key in [key for key in self._blocks if key[0] == file_id]:
+                self._bytes -= len(self._blocks.pop(key))
+
+    def resize(self, max_bytes):
+        """
+        Change the memory budget
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._blocks.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self):
+        """
+        Cache counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "blocks": len(self._blocks),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
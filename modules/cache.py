@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import urlparse, unquote
+
+
+def data_directory():
+    """
+    User data directory of the application (XDG data home on linux)
+    """
+    base = os.environ.get("XDG_DATA_HOME") or os.path.join(
+        os.path.expanduser("~"), ".local", "share"
+    )
+    return os.path.join(base, "everest")
+
+
+def path_from_mrl(mrl):
+    """
+    Convert a media resource locator (file:///...) to a local path
+    """
+    if mrl and mrl.startswith("file://"):
+        return unquote(urlparse(mrl).path)
+    return mrl
+
+
+class MetadataCache:
+    """
+    Persistent media metadata cache (SQLite)
+    Entries are keyed by (path, size, mtime_ns) so that a modified file is
+    parsed again. Writes are buffered and flushed in batches by a
+    background thread.
+    """
+
+    def __init__(self, db_path=None, max_entries=200000, flush_interval=2.0):
+        """
+        @param db_path: sqlite database file, defaults to the user data dir
+        @param max_entries: least recently used entries above this are evicted
+        @param flush_interval: seconds between write-behind flushes
+        """
+        if db_path is None:
+            db_path = os.path.join(data_directory(), "metadata.sqlite3")
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS media (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                duration INTEGER NOT NULL,
+                title TEXT,
+                tracks TEXT,
+                probed_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """)
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS media_accessed ON media(accessed_at)"
+        )
+        self._db.commit()
+
+        # write-behind buffers: new entries and access time updates
+        self._pending = {}
+        self._touched = {}
+
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="metadata-cache", daemon=True
+        )
+        self._flusher.start()
+
+    @staticmethod
+    def file_key(path):
+        """
+        (path, size, mtime_ns) key of a file, None if it can not be stat'ed
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (os.fspath(path), stat.st_size, stat.st_mtime_ns)
+
+    def get(self, path, key=None):
+        """
+        Get the cached metadata of a file
+        @param key: precomputed (path, size, mtime_ns) key
+        @return: dict(duration, title, tracks, probed_at) or None
+        """
+        key = key or self.file_key(path_from_mrl(path))
+        if key is None:
+            return None
+
+        path, size, mtime_ns = key
+
+        with self._lock:
+            entry = self._pending.get(path)
+            if entry is None:
+                row = self._db.execute(
+                    "SELECT size, mtime_ns, duration, title, tracks, probed_at "
+                    "FROM media WHERE path = ?",
+                    (path,),
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = {
+                    "size": row[0],
+                    "mtime_ns": row[1],
+                    "duration": row[2],
+                    "title": row[3] or "",
+                    "tracks": json.loads(row[4]) if row[4] else {},
+                    "probed_at": row[5],
+                }
+
+            # file changed since it was probed
+            if entry["size"] != size or entry["mtime_ns"] != mtime_ns:
+                return None
+
+            self._touched[path] = time.time()
+
+        return {
+            "duration": entry["duration"],
+            "title": entry["title"],
+            "tracks": entry["tracks"],
+            "probed_at": entry["probed_at"],
+        }
+
+    def put(self, path, meta, key=None):
+        """
+        Store the metadata of a file (written to disk on the next flush)
+        @param meta: dict(duration, title, tracks)
+        """
+        key = key or self.file_key(path_from_mrl(path))
+        if key is None:
+            return
+
+        path, size, mtime_ns = key
+        now = time.time()
+
+        with self._lock:
+            self._pending[path] = {
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "duration": int(meta.get("duration", -1)),
+                "title": meta.get("title") or "",
+                "tracks": meta.get("tracks") or {},
+                "probed_at": meta.get("probed_at", now),
+            }
+            self._touched.pop(path, None)
+
+    def invalidate(self, path=None):
+        """
+        Remove a single file from the cache, or everything when no path is given
+        """
+        with self._lock:
+            if path is None:
+                self._pending.clear()
+                self._touched.clear()
+                self._db.execute("DELETE FROM media")
+            else:
+                path = path_from_mrl(os.fspath(path))
+                self._pending.pop(path, None)
+                self._touched.pop(path, None)
+                self._db.execute("DELETE FROM media WHERE path = ?", (path,))
+            self._db.commit()
+
+    def count(self):
+        """
+        Number of cached files
+        """
+        self.flush()
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+
+    def flush(self):
+        """
+        Write the buffered entries to disk and evict the least recently used
+        """
+        with self._lock:
+            if not self._pending and not self._touched:
+                return
+
+            pending, self._pending = self._pending, {}
+            touched, self._touched = self._touched, {}
+            now = time.time()
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        path,
+                        entry["size"],
+                        entry["mtime_ns"],
+                        entry["duration"],
+                        entry["title"],
+                        json.dumps(entry["tracks"]),
+                        entry["probed_at"],
+                        now,
+                    )
+                    for path, entry in pending.items()
+                ],
+            )
+            self._db.executemany(
+                "UPDATE media SET accessed_at = ? WHERE path = ?",
+                [(accessed, path) for path, accessed in touched.items()],
+            )
+
+            if pending:
+                self._evict()
+
+            self._db.commit()
+
+    def _evict(self):
+        """
+        Drop the least recently used entries above max_entries
+        """
+        count = self._db.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        self._db.execute(
+            "DELETE FROM media WHERE path IN "
+            "(SELECT path FROM media ORDER BY accessed_at LIMIT ?)",
+            (count - self.max_entries,),
+        )
+
+    def close(self):
+        """
+        Flush the buffered entries and close the database
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    def _flush_loop(self):
+        """
+        Background write-behind loop
+        """
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass
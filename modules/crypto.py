@@ -0,0 +1,625 @@
+import os
+import hmac
+import ctypes
+import struct
+import hashlib
+import itertools
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+import vlc
+
+from modules.cache import data_directory
+from modules.blockcache import BlockCache
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # optional dependency, only needed for encrypted media
+    Cipher = None
+
+
+# Encrypted media file layout (.bin):
+#   magic(4) | nonce(16) | AES-256-CTR ciphertext of the media
+MAGIC = b"EVB1"
+NONCE_SIZE = 16
+HEADER_SIZE = len(MAGIC) + NONCE_SIZE
+
+# Indexed container (.bin, written by the ingest tool), little endian:
+#   header | title (TITLE_CAPACITY bytes) | [integrity] | chunk index |
+#   payload | thumbnail
+# The payload is the AES-256-CTR ciphertext of the media, one counter runs
+# over the whole media as in EVB1, chunks are only the unit of the parallel
+# encryption and of the index. The metadata probed at ingest (duration,
+# track counts, title) is stored in clear so that a playlist reads it in one
+# small read. The thumbnail (PNG) is encrypted after the payload, the
+# counter continues from the next chunk boundary.
+MAGIC_V2 = b"EVB2"
+CONTAINER_VERSION = 2
+
+# magic, version, flags, nonce, chunk size, chunk count, payload offset,
+# payload size, duration(ms), audio/video/text tracks, thumbnail width and
+# height, title size, thumbnail offset, thumbnail size
+CONTAINER_HEADER = struct.Struct("<4sHH16sIIQQqHHHHHHQI")
+ContainerHeader = namedtuple(
+    "ContainerHeader",
+    "magic version flags nonce chunk_size chunk_count payload_offset "
+    "payload_size duration audio video text thumbnail_width thumbnail_height "
+    "title_size thumbnail_offset thumbnail_size",
+)
+
+# utf-8 title area, fixed so that the payload offset is known before probing
+TITLE_CAPACITY = 1024
+
+# chunk index entry: file offset, ciphertext size
+CHUNK_ENTRY = struct.Struct("<QI")
+
+# Integrity (FLAG_MAC): every index entry carries the HMAC-SHA256 of the
+# chunk number and ciphertext. The integrity block holds the root of a
+# SHA-256 hash tree over the chunk MACs and the HMAC of the header, title
+# area and root, so the index cannot be swapped or truncated.
+FLAG_MAC = 1
+CHUNK_ENTRY_MAC = struct.Struct("<QI32s")
+INTEGRITY = struct.Struct("<32s32s")
+CHUNK_NUMBER = struct.Struct("<Q")
+
+# AES block size, CTR counters advance once per block
+BLOCK_SIZE = 16
+
+# bytes read from disk and decrypted at once, a multiple of BLOCK_SIZE
+CHUNK_SIZE = 256 * 1024
+
+# decrypted chunks shared by all the encrypted media
+block_cache = BlockCache(64 * 1024 * 1024)
+
+# play EVB1 media and containers written without MACs, opt-in with
+# EVEREST_UNVERIFIED_MEDIA=1: the magic and the flags are not authenticated,
+# so a file rewritten without its MACs is refused by default
+allow_unverified = os.environ.get("EVEREST_UNVERIFIED_MEDIA") == "1"
+
+
+def is_encrypted(path):
+    """
+    Check the magic of a .bin media file
+    """
+    if not os.fspath(path).lower().endswith(".bin"):
+        return False
+    try:
+        with open(path, "rb") as media_file:
+            return media_file.read(len(MAGIC)) in (MAGIC, MAGIC_V2)
+    except OSError:
+        return False
+
+
+class IntegrityError(ValueError):
+    """
+    Chunk (or index, chunk -1) of a container that failed verification, or
+    media that cannot be verified
+    """
+
+    def __init__(self, path, chunk, reason=None):
+        if reason is None:
+            reason = (
+                f"chunk {chunk} failed verification"
+                if chunk >= 0
+                else "chunk index failed verification"
+            )
+        super(IntegrityError, self).__init__(f"{path}: {reason}")
+        self.path = path
+        self.chunk = chunk
+        self.reason = reason
+
+
+def index_offset(header):
+    """
+    File offset of the chunk index of a container
+    """
+    offset = CONTAINER_HEADER.size + TITLE_CAPACITY
+    if header.flags & FLAG_MAC:
+        offset += INTEGRITY.size
+    return offset
+
+
+def mac_key(key):
+    """
+    Chunk MAC key, derived from the media key
+    """
+    return hmac.new(key, b"everest chunk mac", hashlib.sha256).digest()
+
+
+def chunk_mac(mac_key, number, ciphertext):
+    """
+    HMAC-SHA256 of a chunk number and ciphertext
+    """
+    mac = hmac.new(mac_key, CHUNK_NUMBER.pack(number), hashlib.sha256)
+    mac.update(ciphertext)
+    return mac.digest()
+
+
+def merkle_root(macs):
+    """
+    Root of a SHA-256 hash tree over the chunk MACs
+    An odd node is carried to the next level as is.
+    """
+    level = [hashlib.sha256(b"\0" + mac).digest() for mac in macs]
+    if not level:
+        return hashlib.sha256(b"").digest()
+    while len(level) > 1:
+        parents = [
+            hashlib.sha256(b"\1" + level[number] + level[number + 1]).digest()
+            for number in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+    return level[0]
+
+
+def header_mac(mac_key, header_area, root):
+    """
+    HMAC of the header, the title area and the Merkle root
+    """
+    return hmac.new(mac_key, bytes(header_area) + root, hashlib.sha256).digest()
+
+
+class ChunkVerifier:
+    """
+    Lazy per-chunk verification of a container
+    A chunk is verified the first time it is read, verified chunks are kept
+    in a bitmap for the rest of the session.
+    """
+
+    def __init__(self, path, mac_key, macs):
+        self.path = path
+        self.mac_key = mac_key
+        self.macs = macs
+        self._verified = bytearray((len(macs) + 7) // 8)
+        self._failed = set()
+
+    def is_verified(self, number):
+        return bool(self._verified[number >> 3] & (1 << (number & 7)))
+
+    def verified_count(self):
+        return sum(bin(byte).count("1") for byte in self._verified)
+
+    def verify(self, number, ciphertext):
+        """
+        @raise IntegrityError: the chunk does not match its MAC
+        """
+        if 0 <= number < len(self.macs) and self.is_verified(number):
+            return
+        if (
+            number in self._failed
+            or not 0 <= number < len(self.macs)
+            or not hmac.compare_digest(
+                chunk_mac(self.mac_key, number, ciphertext), self.macs[number]
+            )
+        ):
+            self._failed.add(number)
+            raise IntegrityError(self.path, number)
+        # a lost update (two readers) only means verifying the chunk again
+        self._verified[number >> 3] |= 1 << (number & 7)
+
+
+# file id -> ChunkVerifier of the containers opened in this session
+_verifiers = {}
+_verifiers_lock = threading.Lock()
+
+
+def chunk_verifier(media_file, file_id, header, data, key):
+    """
+    Session verifier of a container, the index is checked against the
+    Merkle root and the header MAC on first use
+    @param data: the first bytes of the file (header, title, integrity)
+    @raise IntegrityError: the index or the header was tampered with
+    """
+    with _verifiers_lock:
+        verifier = _verifiers.get(file_id)
+    if verifier is not None:
+        return verifier
+
+    path = file_id[0]
+    area = CONTAINER_HEADER.size + TITLE_CAPACITY
+    if len(data) < area + INTEGRITY.size:
+        raise IntegrityError(path, -1)
+    root, tag = INTEGRITY.unpack_from(data, area)
+
+    media_file.seek(index_offset(header))
+    index = media_file.read(header.chunk_count * CHUNK_ENTRY_MAC.size)
+    if len(index) != header.chunk_count * CHUNK_ENTRY_MAC.size:
+        raise IntegrityError(path, -1)
+    macs = [mac for _, _, mac in CHUNK_ENTRY_MAC.iter_unpack(index)]
+
+    key = mac_key(key)
+    if not hmac.compare_digest(
+        header_mac(key, data[:area], root), tag
+    ) or not hmac.compare_digest(merkle_root(macs), root):
+        raise IntegrityError(path, -1)
+
+    verifier = ChunkVerifier(path, key, macs)
+    with _verifiers_lock:
+        return _verifiers.setdefault(file_id, verifier)
+
+
+def container_header(data):
+    """
+    Parse the header and title of an indexed container
+    @param data: the first bytes of the file (at least the header and title)
+    @return: (ContainerHeader, title), None for another format
+    """
+    if len(data) < CONTAINER_HEADER.size or data[: len(MAGIC_V2)] != MAGIC_V2:
+        return None
+    header = ContainerHeader(*CONTAINER_HEADER.unpack_from(data, 0))
+    if header.version > CONTAINER_VERSION:
+        return None
+    start = CONTAINER_HEADER.size
+    title = bytes(data[start : start + header.title_size]).decode("utf-8", "replace")
+    return header, title
+
+
+def read_container(path):
+    """
+    Header and title of an indexed container, in one small read
+    @return: (ContainerHeader, title), None for another format
+    """
+    if not os.fspath(path).lower().endswith(".bin"):
+        return None
+    try:
+        with open(path, "rb") as media_file:
+            return container_header(
+                media_file.read(CONTAINER_HEADER.size + TITLE_CAPACITY)
+            )
+    except OSError:
+        return None
+
+
+def read_metadata(path):
+    """
+    Metadata stored in the header of an indexed container
+    @return: dict like modules.metadata.parse_media, None if the media has
+    to be parsed (another format, or probing failed at ingest)
+    """
+    container = read_container(path)
+    if container is None or container[0].duration < 0:
+        return None
+    header, title = container
+    return {
+        "duration": header.duration,
+        "title": title,
+        "tracks": {"audio": header.audio, "video": header.video, "text": header.text},
+    }
+
+
+def read_thumbnail(path, size=None, key=None):
+    """
+    Decrypted thumbnail (PNG) of an indexed container
+    @param size: (width, height) wanted, None for any
+    @return: PNG bytes, None if there is no thumbnail of that size
+    """
+    container = read_container(path)
+    if container is None:
+        return None
+    header = container[0]
+    if not header.thumbnail_size:
+        return None
+    if size is not None and tuple(size) != (
+        header.thumbnail_width,
+        header.thumbnail_height,
+    ):
+        return None
+
+    try:
+        with open(path, "rb") as media_file:
+            media_file.seek(header.thumbnail_offset)
+            data = media_file.read(header.thumbnail_size)
+        decryptor, _ = ctr_decryptor(
+            key or load_key(),
+            header.nonce,
+            header.chunk_count * header.chunk_size,
+        )
+    except (OSError, LookupError, RuntimeError):
+        return None
+    return decryptor.update(data)
+
+
+@lru_cache(maxsize=1)
+def load_key():
+    """
+    Media key (32 bytes)
+    Read from the EVEREST_MEDIA_KEY environment variable (hex) or from the
+    media.key file in the user data directory
+    """
+    key = os.environ.get("EVEREST_MEDIA_KEY")
+    if key:
+        return bytes.fromhex(key)
+
+    key_path = os.path.join(data_directory(), "media.key")
+    try:
+        with open(key_path, "rb") as key_file:
+            key = key_file.read().strip()
+    except OSError:
+        raise LookupError(f"No media key found in EVEREST_MEDIA_KEY or {key_path}")
+
+    # hex or raw key file
+    return bytes.fromhex(key.decode()) if len(key) == 64 else key
+
+
+def _ctr_cipher(key, nonce, offset):
+    if Cipher is None:
+        raise RuntimeError("The cryptography package is required for encrypted media")
+
+    block, skip = divmod(offset, BLOCK_SIZE)
+    counter = (int.from_bytes(nonce, "big") + block) % (1 << 128)
+    cipher = Cipher(algorithms.AES(key), modes.CTR(counter.to_bytes(BLOCK_SIZE, "big")))
+    return cipher, skip
+
+
+def ctr_decryptor(key, nonce, offset):
+    """
+    AES-CTR decryptor positioned at a byte offset of the plaintext
+    @return: (decryptor, number of keystream bytes to discard)
+    """
+    cipher, skip = _ctr_cipher(key, nonce, offset)
+    return cipher.decryptor(), skip
+
+
+def ctr_encryptor(key, nonce, offset):
+    """
+    AES-CTR encryptor positioned at a byte offset of the plaintext
+    @return: (encryptor, number of keystream bytes to discard)
+    """
+    cipher, skip = _ctr_cipher(key, nonce, offset)
+    return cipher.encryptor(), skip
+
+
+class DecryptingReader:
+    """
+    Seekable reader of an encrypted media file (EVB1 or indexed container)
+    The file is decrypted in fixed size chunks through a reusable buffer,
+    decrypted chunks are kept in the block cache so that seeking back into
+    a recently played window costs no disk I/O or decryption. Nothing is
+    written to disk.
+    Chunks of containers with MACs are verified before they are decrypted,
+    a chunk that fails raises IntegrityError. Media without MACs raise
+    IntegrityError unless unverified media are allowed.
+    """
+
+    def __init__(self, path, key, chunk_size=CHUNK_SIZE, cache=None, unverified=None):
+        """
+        @param unverified: read EVB1 media and containers without MACs, the
+        module allow_unverified setting by default
+        """
+        if unverified is None:
+            unverified = allow_unverified
+        self.path = path
+        self.key = key
+        self.cache = cache if cache is not None else block_cache
+
+        self._file = open(path, "rb", buffering=0)
+        stat = os.fstat(self._file.fileno())
+        data = self._file.read(CONTAINER_HEADER.size + TITLE_CAPACITY + INTEGRITY.size)
+
+        # indexed container header, None for EVB1
+        self.header = None
+        container = container_header(data)
+        if container is not None:
+            self.header = container[0]
+            self.nonce = self.header.nonce
+            self.offset = self.header.payload_offset
+            self.size = self.header.payload_size
+            # decrypted on the container chunk boundaries
+            chunk_size = self.header.chunk_size
+        elif len(data) >= HEADER_SIZE and data[: len(MAGIC)] == MAGIC:
+            self.nonce = data[len(MAGIC) : HEADER_SIZE]
+            self.offset = HEADER_SIZE
+            self.size = stat.st_size - HEADER_SIZE
+        else:
+            self._file.close()
+            raise ValueError(f"{path} is not an encrypted media file")
+
+        if self.offset + self.size > stat.st_size:
+            self._file.close()
+            raise ValueError(f"{path}: truncated encrypted media file")
+
+        self.chunk_size = chunk_size
+
+        # cache key of the file, a modified file gets new blocks
+        self.file_id = (os.fspath(path), stat.st_mtime_ns)
+
+        # per-chunk MAC verifier, shared by the readers of the file
+        self.verifier = None
+        if self.header is None or not self.header.flags & FLAG_MAC:
+            if not unverified:
+                self._file.close()
+                raise IntegrityError(path, -1, "media without MACs, not verified")
+        else:
+            try:
+                self.verifier = chunk_verifier(
+                    self._file, self.file_id, self.header, data, key
+                )
+            except Exception:
+                self._file.close()
+                raise
+
+        # reusable ciphertext buffer
+        self._cipher_buffer = bytearray(chunk_size)
+
+        self.position = 0
+
+    def seek(self, offset):
+        """
+        Move the read position (plaintext offset)
+        """
+        if offset < 0 or offset > self.size:
+            return False
+        self.position = offset
+        return True
+
+    def read_into(self, buffer, length):
+        """
+        Decrypt up to length bytes at the read position into buffer
+        @param buffer: writable buffer (memoryview, bytearray)
+        @return: number of bytes read, 0 at the end of the media
+        """
+        length = min(length, self.size - self.position)
+        if length <= 0:
+            return 0
+
+        index, start = divmod(self.position, self.chunk_size)
+        chunk = self.chunk(index)
+
+        written = min(length, len(chunk) - start)
+        if written <= 0:
+            return 0
+
+        buffer[:written] = chunk[start : start + written]
+        self.position += written
+        return written
+
+    def chunk(self, index):
+        """
+        Decrypted chunk at a chunk index, from the cache when possible
+        """
+        key = (self.file_id, index)
+        chunk = self.cache.get(key)
+        if chunk is not None:
+            return chunk
+
+        offset = index * self.chunk_size
+        length = min(self.chunk_size, self.size - offset)
+        if length <= 0:
+            return b""
+
+        cipher_view = memoryview(self._cipher_buffer)[:length]
+        self._file.seek(self.offset + offset)
+        read = self._file.readinto(cipher_view)
+
+        if self.verifier is not None:
+            # decrypted chunks in the cache have been verified already
+            self.verifier.verify(index, cipher_view[:read])
+
+        # chunks start on a cipher block boundary, no keystream to skip
+        decryptor, _ = ctr_decryptor(self.key, self.nonce, offset)
+        chunk = decryptor.update(cipher_view[:read])
+
+        self.cache.put(key, chunk)
+        return chunk
+
+    def close(self):
+        self._file.close()
+
+
+# -----------------------------------------------------------------------------------------------
+# libvlc media callbacks
+# -----------------------------------------------------------------------------------------------
+_lock = threading.Lock()
+
+# opaque id -> (path, key) of the callback media, and back, one id per
+# media file so that the table does not grow with every vlc.Media
+_sources = {}
+_source_ids = {}
+
+# open id -> DecryptingReader, one per open: a media can be opened twice at
+# once (gapless standby, background parsing of the playing media)
+_readers = {}
+_open_ids = itertools.count(1)
+
+# callables(IntegrityError) told about the media that failed verification
+# while libvlc reads them, called from the libvlc input threads
+integrity_listeners = []
+
+# open id -> chunks already reported, libvlc may read a failed chunk again
+# while the media is open
+_reported = {}
+
+
+def _report(error, handle=None):
+    if handle is not None:
+        with _lock:
+            chunks = _reported.setdefault(handle, set())
+            if error.chunk in chunks:
+                return
+            chunks.add(error.chunk)
+    for listener in list(integrity_listeners):
+        listener(error)
+
+
+@vlc.CallbackDecorators.MediaOpenCb
+def _media_open(opaque, datap, sizep):
+    try:
+        path, key = _sources[opaque]
+        reader = DecryptingReader(path, key)
+    except IntegrityError as error:
+        _report(error)
+        return -1
+    except Exception:
+        return -1
+
+    # libvlc passes *datap to the read, seek and close callbacks
+    with _lock:
+        handle = next(_open_ids)
+        _readers[handle] = reader
+
+    datap[0] = handle
+    sizep[0] = reader.size
+    return 0
+
+
+@vlc.CallbackDecorators.MediaReadCb
+def _media_read(opaque, buf, length):
+    reader = _readers.get(opaque)
+    if reader is None:
+        return -1
+
+    try:
+        out = (ctypes.c_char * length).from_address(ctypes.addressof(buf.contents))
+        return reader.read_into(memoryview(out).cast("B"), length)
+    except IntegrityError as error:
+        # an error instead of unverified data for the decoders
+        _report(error, opaque)
+        return -1
+    except Exception:
+        return -1
+
+
+@vlc.CallbackDecorators.MediaSeekCb
+def _media_seek(opaque, offset):
+    reader = _readers.get(opaque)
+    if reader is None or not reader.seek(offset):
+        return -1
+    return 0
+
+
+@vlc.CallbackDecorators.MediaCloseCb
+def _media_close(opaque):
+    with _lock:
+        reader = _readers.pop(opaque, None)
+        _reported.pop(opaque, None)
+    if reader is not None:
+        reader.close()
+
+
+def open_media(instance, path, key=None):
+    """
+    Create the vlc.Media of a media path
+    Encrypted media are read through the decrypting callbacks, any other
+    media is opened by libvlc directly
+    """
+    if not is_encrypted(path):
+        return instance.media_new(path)
+
+    source = (os.fspath(path), key or load_key())
+    with _lock:
+        opaque = _source_ids.get(source)
+        if opaque is None:
+            opaque = _source_ids[source] = len(_sources) + 1
+            _sources[opaque] = source
+
+    media = instance.media_new_callbacks(
+        _media_open, _media_read, _media_seek, _media_close, ctypes.c_void_p(opaque)
+    )
+    # the title probed at ingest, the file name for EVB1 or an empty title
+    container = read_container(path)
+    title = container[1] if container is not None else ""
+    media.set_meta(vlc.Meta.Title, title or os.path.basename(path))
+    return media
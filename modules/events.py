@@ -0,0 +1,136 @@
+import threading
+from collections import deque
+
+import vlc
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+
+
+class EventBridge(QObject):
+    """
+    libvlc events re-emitted as Qt signals on the GUI thread
+    The libvlc callback only appends the event to a bounded queue (a deque,
+    appends and pops are atomic) and wakes the GUI thread once per batch.
+    TimeChanged events are not queued, only the latest time is kept.
+    """
+
+    media_changed = pyqtSignal()
+    playing = pyqtSignal()
+    end_reached = pyqtSignal()
+    error = pyqtSignal()
+    # current time in ms, coalesced
+    time_changed = pyqtSignal(int)
+
+    # libvlc thread -> GUI thread wake up
+    _wake = pyqtSignal()
+
+    # events carried through the queue: libvlc event -> signal name
+    QUEUED = {
+        vlc.EventType.MediaPlayerMediaChanged: "media_changed",
+        vlc.EventType.MediaPlayerPlaying: "playing",
+        vlc.EventType.MediaPlayerEndReached: "end_reached",
+        vlc.EventType.MediaPlayerEncounteredError: "error",
+    }
+
+    def __init__(self, player, capacity=256, parent=None):
+        """
+        @param player: Player, the bridge attaches to its media player events
+        @param capacity: queued events kept, the oldest are dropped above
+        """
+        super(EventBridge, self).__init__(parent)
+
+        self.capacity = capacity
+        self._queue = deque(maxlen=capacity)
+        self._signals = {
+            event_type.value: name for event_type, name in self.QUEUED.items()
+        }
+
+        # latest TimeChanged value, a one slot queue
+        self._time = deque(maxlen=1)
+
+        # a wake up is on its way to the GUI thread
+        self._scheduled = threading.Event()
+        self._closed = False
+
+        # counters
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+        self._wake.connect(self._drain, Qt.QueuedConnection)
+
+        for event_type in self.QUEUED:
+            player.event_manager_attach(event_type, self._on_event)
+        player.event_manager_attach(
+            vlc.EventType.MediaPlayerTimeChanged, self._on_time_changed
+        )
+
+    def stats(self):
+        """
+        Event counters
+        """
+        return {
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "queued": len(self._queue),
+            "capacity": self.capacity,
+        }
+
+    def close(self):
+        """
+        Stop forwarding events
+        """
+        self._closed = True
+        self._queue.clear()
+
+    # -------------------------------------------------------------------------
+    # libvlc thread
+    # -------------------------------------------------------------------------
+    def _on_event(self, event):
+        if self._closed:
+            return
+        self.received += 1
+        if len(self._queue) == self.capacity:
+            # the deque drops the oldest event
+            self.dropped += 1
+        self._queue.append(event.type.value)
+        self._schedule()
+
+    def _on_time_changed(self, event):
+        if self._closed:
+            return
+        self.received += 1
+        if self._time:
+            self.coalesced += 1
+        self._time.append(event.u.new_time)
+        self._schedule()
+
+    def _schedule(self):
+        if not self._scheduled.is_set():
+            self._scheduled.set()
+            self._wake.emit()
+
+    # -------------------------------------------------------------------------
+    # GUI thread
+    # -------------------------------------------------------------------------
+    def _drain(self):
+        # cleared first, events queued from now on schedule another drain
+        self._scheduled.clear()
+
+        while not self._closed:
+            try:
+                event_type = self._queue.popleft()
+            except IndexError:
+                break
+            self.delivered += 1
+            getattr(self, self._signals[event_type]).emit()
+
+        try:
+            time = self._time.popleft()
+        except IndexError:
+            return
+        if not self._closed:
+            self.delivered += 1
+            self.time_changed.emit(time)
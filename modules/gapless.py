@@ -0,0 +1,487 @@
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import vlc
+from PyQt5.QtCore import QObject, pyqtSignal
+
+_MEDIA_CHANGED = vlc.EventType.MediaPlayerMediaChanged
+_PLAYING = vlc.EventType.MediaPlayerPlaying
+_PAUSED = vlc.EventType.MediaPlayerPaused
+_TIME_CHANGED = vlc.EventType.MediaPlayerTimeChanged
+_END_REACHED = vlc.EventType.MediaPlayerEndReached
+
+
+def _media_id(media):
+    # python-vlc returns a new wrapper on every call, compare the libvlc media
+    pointer = getattr(media, "_as_parameter_", None)
+    return getattr(pointer, "value", media)
+
+
+class GaplessListPlayer(QObject):
+    """
+    Media list player running two media players on one libvlc instance
+    The next media is opened on the standby player ahead of time, from a copy
+    of the playlist item that starts paused, and stays parked muted on its
+    first frame. At the end of the current media the standby player is
+    resumed and becomes the active one, so its demuxer and decoders are
+    already running. Stands in for the vlc.MediaListPlayer of Player.
+    Every state change runs on a single worker thread, libvlc must not be
+    called back from its own event threads. The GUI thread only waits for
+    the calls returning a status, and at most call_timeout seconds.
+    """
+
+    # seconds a caller waits for a call returning a status
+    call_timeout = 1.0
+
+    # slot (0 or 1) of the media player now on screen, emitted from any thread
+    swapped = pyqtSignal(int)
+
+    def __init__(
+        self, instance=None, preroll=3000, crossfade=0, on_swap=None, parent=None
+    ):
+        """
+        @param instance: vlc.Instance shared by both media players, the
+        default instance if None
+        @param preroll: time(ms) before the end of the current media at which
+        the next one is opened
+        @param crossfade: audio crossfade(ms) between media without video,
+        0 to disable
+        @param on_swap: callable(old, new) with the media players, called on
+        the worker thread when the active player changes
+        """
+        super(GaplessListPlayer, self).__init__(parent)
+
+        self.instance = instance or vlc.get_default_instance()
+        self.players = [
+            self.instance.media_player_new(),
+            self.instance.media_player_new(),
+        ]
+        self.active = 0
+
+        # playlist media of each player and whether the player has a copy of
+        # it (the standby player)
+        self._sources = [None, None]
+        self._copied = [False, False]
+
+        # the next media has to be parked before the crossfade starts
+        self.preroll = max(preroll, crossfade)
+        self.crossfade = crossfade
+        self.on_swap = on_swap
+
+        self.media_list = None
+        self.mode = vlc.PlaybackMode.default
+
+        # playlist index of the active media
+        self.index = -1
+
+        # standby player: playlist index and media it opened, parked on frame 0
+        self._standby_index = -1
+        self._standby_media = None
+        self._parked = False
+
+        # slot of a standby player swapped in before it paused, resumed when
+        # its start-paused pause comes in, -1 if none
+        self._resume_slot = -1
+
+        # bumped to abandon a running crossfade, volume of the faded player
+        self._fade = 0
+        self._fading = False
+        self._fade_volume = None
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gapless")
+
+        # event type -> (callback, args), forwarded from the active player only
+        self._forward = {}
+        self._attached = set()
+        for event_type in (_PAUSED, _TIME_CHANGED, _END_REACHED):
+            self._attach(event_type)
+
+    # -------------------------------------------------------------------------
+    # vlc.MediaListPlayer calls
+    # -------------------------------------------------------------------------
+    def set_media_list(self, media_list):
+        self.media_list = media_list
+
+    def set_playback_mode(self, mode):
+        self._submit(self._set_mode, mode)
+
+    def get_media_player(self):
+        return self.players[self.active]
+
+    def play(self):
+        self._submit(self._play)
+
+    def pause(self):
+        self._submit(self._active_call, "pause")
+
+    def set_pause(self, do_pause):
+        self._submit(self._active_call, "set_pause", do_pause)
+
+    def stop(self):
+        self._submit(self._stop)
+
+    def next(self):
+        return self._call(self._advance)
+
+    def previous(self):
+        return self._call(self._previous)
+
+    def play_item_at_index(self, index):
+        return self._call(self._play_index, index)
+
+    def is_playing(self):
+        return self.players[self.active].is_playing()
+
+    def get_state(self):
+        return self.players[self.active].get_state()
+
+    def current_index(self):
+        """
+        Playlist index of the active media, -1 if there is none
+        The media of the player is a copy of the playlist item after a
+        swap, the media list cannot find it.
+        """
+        if self._count() == 0:
+            return -1
+        return self._current_index()
+
+    def event_attach(self, event_type, callback, *args):
+        """
+        Attach the callback of an event of the active media player
+        One callback per event type, as the libvlc event managers
+        """
+        self._forward[event_type.value] = (callback, args)
+        self._attach(event_type)
+
+    def close(self):
+        """
+        Stop both media players and the worker
+        """
+        self._submit(self._stop)
+        self._executor.shutdown(wait=True)
+
+    # -------------------------------------------------------------------------
+    # libvlc event threads
+    # -------------------------------------------------------------------------
+    def _attach(self, event_type):
+        if event_type.value in self._attached:
+            return
+        self._attached.add(event_type.value)
+        for slot, player in enumerate(self.players):
+            player.event_manager().event_attach(event_type, self._on_event, slot)
+
+    def _on_event(self, event, slot):
+        event_type = event.type.value
+        if event_type == _TIME_CHANGED.value:
+            self._submit(self._time_changed, slot, event.u.new_time)
+        elif event_type == _PAUSED.value:
+            self._submit(self._park, slot)
+        elif event_type == _END_REACHED.value:
+            self._submit(self._end_reached, slot)
+
+        if slot == self.active:
+            self._emit(event)
+
+    def _emit(self, event):
+        forward = self._forward.get(event.type.value)
+        if forward is not None:
+            callback, args = forward
+            callback(event, *args)
+
+    # -------------------------------------------------------------------------
+    # Worker thread
+    # -------------------------------------------------------------------------
+    def _call(self, function, *args):
+        """
+        Run a call returning a status on the worker
+        @return: its status, 0 if it is still queued after call_timeout (the
+        worker may be stopping a media), -1 once closed
+        """
+        try:
+            future = self._executor.submit(function, *args)
+        except RuntimeError:
+            return -1
+        try:
+            return future.result(timeout=self.call_timeout)
+        except TimeoutError:
+            return 0
+
+    def _submit(self, function, *args):
+        try:
+            self._executor.submit(function, *args)
+        except RuntimeError:
+            # closed
+            pass
+
+    def _active_call(self, name, *args):
+        return getattr(self.players[self.active], name)(*args)
+
+    def _count(self):
+        if self.media_list is None:
+            return 0
+        self.media_list.lock()
+        try:
+            return self.media_list.count()
+        finally:
+            self.media_list.unlock()
+
+    def _item(self, index):
+        if self.media_list is None:
+            return None
+        self.media_list.lock()
+        try:
+            if 0 <= index < self.media_list.count():
+                return self.media_list.item_at_index(index)
+            return None
+        finally:
+            self.media_list.unlock()
+
+    def _current_index(self):
+        """
+        Playlist index of the active media, refreshed after playlist edits
+        """
+        media = self._sources[self.active] or self.players[self.active].get_media()
+        if media is not None and self.media_list is not None:
+            self.media_list.lock()
+            try:
+                index = self.media_list.index_of_item(media)
+            finally:
+                self.media_list.unlock()
+            if index >= 0:
+                self.index = index
+        return self.index
+
+    def _next_index(self):
+        """
+        Index played after the active media, -1 at the end of the list
+        """
+        count = self._count()
+        if count == 0:
+            return -1
+        current = self._current_index()
+        if current < 0:
+            return 0
+        if self.mode == vlc.PlaybackMode.repeat:
+            return current if current < count else -1
+        index = current + 1
+        if self.mode == vlc.PlaybackMode.loop:
+            return index % count
+        return index if index < count else -1
+
+    def _set_mode(self, mode):
+        self.mode = mode
+        # the parked media may not be the next one anymore
+        self._cancel_standby()
+
+    def _play(self):
+        player = self.players[self.active]
+        if self.index < 0 or player.get_media() is None:
+            return self._play_index(max(self.index, 0))
+        if self._copied[self.active] and player.get_state() in (
+            vlc.State.Stopped,
+            vlc.State.Ended,
+        ):
+            # the copy would start paused again
+            return self._play_index(self._current_index())
+        return player.play()
+
+    def _play_index(self, index):
+        media = self._item(index)
+        if media is None:
+            return -1
+        self._cancel_standby()
+        self.index = index
+        self._sources[self.active] = media
+        self._copied[self.active] = False
+        self._resume_slot = -1
+        player = self.players[self.active]
+        player.set_media(media)
+        return player.play()
+
+    def _previous(self):
+        count = self._count()
+        if count == 0:
+            return -1
+        current = self._current_index()
+        if self.mode == vlc.PlaybackMode.repeat:
+            index = current
+        elif self.mode == vlc.PlaybackMode.loop:
+            index = (current - 1) % count
+        else:
+            index = current - 1
+        return self._play_index(index)
+
+    def _stop(self):
+        self._cancel_standby()
+        self._resume_slot = -1
+        self.players[self.active].stop()
+        return 0
+
+    def _advance(self):
+        """
+        Play the next media, on the standby player if it has it open
+        """
+        index = self._next_index()
+        if index < 0:
+            self._cancel_standby()
+            return -1
+        if index == self._standby_index and self._standby_media == _media_id(
+            self._item(index)
+        ):
+            self._swap()
+            return 0
+        return self._play_index(index)
+
+    def _end_reached(self, slot):
+        if slot != self.active or self._fading:
+            return
+        self._advance()
+
+    def _time_changed(self, slot, time):
+        if slot != self.active or self._fading:
+            return
+        player = self.players[slot]
+        length = player.get_length()
+        if length <= 0:
+            # live stream, no end to prepare for
+            return
+        remaining = length - time
+
+        if self._standby_index < 0 and remaining <= self.preroll:
+            self._open_standby()
+        elif (
+            self.crossfade
+            and self._parked
+            and remaining <= self.crossfade
+            and not player.has_vout()
+        ):
+            self._start_crossfade(remaining)
+
+    def _open_standby(self):
+        """
+        Open the next media on the standby player, muted
+        The player opens a copy of the playlist item with :start-paused, it
+        prerolls up to its first frame and pauses there without playing
+        ahead. Options cannot be removed from a media, the playlist item
+        keeps none.
+        """
+        index = self._next_index()
+        media = self._item(index)
+        if media is None:
+            return
+        self._standby_index = index
+        self._standby_media = _media_id(media)
+        self._parked = False
+
+        copy = media.duplicate()
+        copy.add_option(":start-paused")
+        self._sources[1 - self.active] = media
+        self._copied[1 - self.active] = True
+
+        standby = self.players[1 - self.active]
+        standby.audio_set_volume(0)
+        standby.set_media(copy)
+        standby.play()
+
+    def _park(self, slot):
+        """
+        The standby player paused on its first frame
+        """
+        if slot == self._resume_slot:
+            # swapped in while it was still opening
+            self._resume_slot = -1
+            self.players[slot].set_pause(0)
+            return
+        if slot == self.active or self._standby_index < 0 or self._parked:
+            return
+        self._parked = True
+
+    def _cancel_standby(self):
+        self._fade += 1
+        if self._fading:
+            self.players[self.active].audio_set_volume(self._fade_volume)
+            self._fading = False
+        if self._standby_index < 0:
+            return
+        self._standby_index = -1
+        self._standby_media = None
+        self._parked = False
+        self._sources[1 - self.active] = None
+        self._copied[1 - self.active] = False
+        self.players[1 - self.active].stop()
+
+    def _swap(self, volume=None):
+        """
+        Make the standby player the active one
+        @param volume: volume already set on the standby player (crossfade),
+        it is resumed with the active player volume otherwise
+        """
+        old = self.players[self.active]
+        new = self.players[1 - self.active]
+
+        if volume is None:
+            new.audio_set_volume(old.audio_get_volume())
+            mute = old.audio_get_mute()
+            if mute in (0, 1):
+                new.audio_set_mute(bool(mute))
+            if self._parked:
+                new.set_pause(0)
+            else:
+                # still opening, resumed once its start-paused pause comes in
+                self._resume_slot = 1 - self.active
+
+        self.active = 1 - self.active
+        self.index = self._standby_index
+        self._standby_index = -1
+        self._standby_media = None
+        self._parked = False
+        self._fading = False
+
+        self.swapped.emit(self.active)
+        if self.on_swap is not None:
+            self.on_swap(old, new)
+        old.stop()
+
+        # the new player sent these while it was on standby
+        for event_type in (_MEDIA_CHANGED, _PLAYING):
+            self._emit(SimpleNamespace(type=event_type, u=None))
+
+    def _start_crossfade(self, remaining):
+        """
+        Resume the standby player silently and fade between both players
+        """
+        self._fading = True
+        fade = self._fade
+        old = self.players[self.active]
+        new = self.players[1 - self.active]
+        volume = self._fade_volume = old.audio_get_volume()
+
+        new.audio_set_volume(0)
+        new.set_pause(0)
+
+        duration = max(min(remaining, self.crossfade), 1)
+        steps = max(duration // 50, 1)
+        self._fade_step(fade, volume, 1, steps, duration / steps / 1000)
+
+    def _fade_step(self, fade, volume, step, steps, interval):
+        if fade != self._fade:
+            # cancelled (stop, new media, playback mode)
+            return
+        old = self.players[self.active]
+        new = self.players[1 - self.active]
+        old.audio_set_volume(int(volume * (steps - step) / steps))
+        new.audio_set_volume(int(volume * step / steps))
+
+        if step >= steps:
+            old.audio_set_volume(volume)
+            self._swap(volume=volume)
+            return
+
+        timer = threading.Timer(
+            interval,
+            self._submit,
+            (self._fade_step, fade, volume, step + 1, steps, interval),
+        )
+        timer.daemon = True
+        timer.start()
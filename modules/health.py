@@ -0,0 +1,244 @@
+import time
+from collections import deque, namedtuple
+
+import vlc
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+# demux/decoder deltas between two samples
+HealthSample = namedtuple(
+    "HealthSample",
+    "time decoded_video lost_pictures lost_abuffers read_bytes demux_bitrate underrun",
+)
+
+# file-caching/network-caching(ms) tried in turn on sustained underruns,
+# libvlc defaults to 1000
+CACHING_PROFILES = (3000, 10000, 30000)
+
+
+class HealthMonitor(QObject):
+    """
+    Playback health of the current media, sampled from the libvlc media
+    statistics into a rolling window
+    A sample is an underrun when frames or audio buffers were lost, or when
+    the playback clock stalled while playing. Sustained underruns reopen the
+    media at the same time with the next, larger caching profile.
+    """
+
+    # path and caching(ms) of a media reopened after sustained underruns
+    reopened = pyqtSignal(str, int)
+
+    def __init__(
+        self,
+        player,
+        interval=1000,
+        window=10,
+        threshold=4,
+        cooldown=5,
+        overlay=False,
+        parent=None,
+    ):
+        """
+        @param player: Player
+        @param interval: time(ms) between two samples
+        @param window: samples kept
+        @param threshold: underruns in the window that trigger a reopen
+        @param cooldown: samples ignored after a reopen, while the cache fills
+        @param overlay: show the health line on screen
+        """
+        super(HealthMonitor, self).__init__(parent)
+
+        self.player = player
+        self.interval = interval
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.overlay = overlay
+
+        self.samples = deque(maxlen=window)
+
+        # cumulative statistics and playback time of the previous sample
+        self._previous = None
+        self._previous_time = None
+        self._skip = 0
+
+        # path -> index of the caching profile in use
+        self._profiles = {}
+
+        # path -> (playlist media, copy with the caching options playing in
+        # its place), options cannot be removed from a media
+        self._reopened = {}
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.sample)
+
+    def start(self):
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def media_changed(self, *event):
+        """
+        Start a new window, the statistics belong to the media
+        The playlist media of a reopened media is put back once another
+        media plays.
+        """
+        self.samples.clear()
+        self._previous = None
+        self._previous_time = None
+
+        current = self.current_path()
+        for path in [path for path in self._reopened if path != current]:
+            original, copy = self._reopened.pop(path)
+            self.player.replace_media(copy, original)
+
+    # -------------------------------------------------------------------------
+    # Sampling
+    # -------------------------------------------------------------------------
+    def sample(self):
+        """
+        Timer: record the statistics of the current media
+        """
+        media = self.player.m_instance.get_media()
+        if media is None or self.player.get_state() != vlc.State.Playing:
+            # paused or stopped, the clock does not run
+            self._previous_time = None
+            return
+
+        stats = vlc.MediaStats()
+        if not media.get_stats(stats):
+            return
+        position = self.player.get_media_current_time()
+
+        previous, previous_time = self._previous, self._previous_time
+        self._previous, self._previous_time = stats, position
+        if previous is None or stats.read_bytes < previous.read_bytes:
+            # first sample, or the counters restarted (media reopened)
+            return
+
+        lost_pictures = stats.lost_pictures - previous.lost_pictures
+        lost_abuffers = stats.lost_abuffers - previous.lost_abuffers
+        # the clock does not move while libvlc waits for data
+        stalled = position == previous_time
+        self.samples.append(
+            HealthSample(
+                time.monotonic(),
+                stats.decoded_video - previous.decoded_video,
+                lost_pictures,
+                lost_abuffers,
+                stats.read_bytes - previous.read_bytes,
+                stats.demux_bitrate,
+                bool(lost_pictures or lost_abuffers or stalled),
+            )
+        )
+
+        if self.overlay:
+            self.player.osd.show("health", self.summary_text(), self.interval * 2)
+
+        if self._skip:
+            self._skip -= 1
+        elif self.underruns() >= self.threshold:
+            self.reopen()
+
+    def underruns(self):
+        return sum(sample.underrun for sample in self.samples)
+
+    def health(self):
+        """
+        Health of the current media over the window
+        @return: dict with status ("idle", "ok" or "degraded"), decoded
+        frames per second, lost pictures and audio buffers, demux bitrate
+        (kbit/s), bytes read per second, underrun samples and the caching
+        profile(ms, None for the libvlc default)
+        """
+        samples = list(self.samples)
+        path = self.current_path()
+        profile = self._profiles.get(path)
+        caching = CACHING_PROFILES[profile] if profile is not None else None
+        if not samples:
+            return {"status": "idle", "caching": caching}
+
+        seconds = len(samples) * self.interval / 1000
+        underruns = sum(sample.underrun for sample in samples)
+        return {
+            "status": "degraded" if underruns >= self.threshold else "ok",
+            "fps": sum(sample.decoded_video for sample in samples) / seconds,
+            "lost_pictures": sum(sample.lost_pictures for sample in samples),
+            "lost_abuffers": sum(sample.lost_abuffers for sample in samples),
+            # libvlc bitrates are in bytes per microsecond * 1000
+            "demux_kbps": samples[-1].demux_bitrate * 8000,
+            "read_rate": sum(sample.read_bytes for sample in samples) / seconds,
+            "underruns": underruns,
+            "samples": len(samples),
+            "caching": caching,
+        }
+
+    def summary_text(self):
+        """
+        Health line (OSD)
+        """
+        health = self.health()
+        if health["status"] == "idle":
+            return ""
+        caching = health["caching"]
+        return (
+            f"{health['status']} {health['fps']:.0f}fps "
+            f"lost {health['lost_pictures']}/{health['lost_abuffers']} "
+            f"{health['demux_kbps']:.0f}kb/s "
+            f"underruns {health['underruns']}/{health['samples']} "
+            f"cache {caching or 'default'}" + ("ms" if caching else "")
+        )
+
+    # -------------------------------------------------------------------------
+    # Adaptive caching
+    # -------------------------------------------------------------------------
+    def current_path(self):
+        return self.player.media_path(self.player.media_list_index_of_item())
+
+    def reopen(self):
+        """
+        Reopen the current media at the same time with the next caching
+        profile
+        @return: caching(ms), or None if the largest profile is in use
+        """
+        index = self.player.media_list_index_of_item()
+        path = self.player.media_path(index)
+        listed = self.player.media_at(index)
+        if path is None or listed is None:
+            return None
+
+        profile = self._profiles.get(path, -1) + 1
+        if profile >= len(CACHING_PROFILES):
+            return None
+        caching = CACHING_PROFILES[profile]
+
+        # a copy of the playlist media with the caching options plays in its
+        # place, the options of earlier reopens are not carried over
+        original = self._reopened.get(path, (listed,))[0]
+        copy = original.duplicate()
+        copy.add_option(f":file-caching={caching}")
+        copy.add_option(f":network-caching={caching}")
+        if not self.player.replace_media(listed, copy):
+            return None
+        self._reopened[path] = (original, copy)
+        self._profiles[path] = profile
+
+        position = self.player.get_media_current_time()
+        self.player.play_at(index)
+
+        self.media_changed()
+        self._skip = self.cooldown
+        self._seek(position)
+        self.reopened.emit(path, caching)
+        self.player.set_marquee(f"Caching {caching}ms")
+        return caching
+
+    def _seek(self, position, attempts=50):
+        # back to the time of the reopen once the media plays
+        if position <= 0:
+            return
+        if self.player.is_playing() and self.player.m_instance.get_length() > 0:
+            self.player.set_time(position)
+            return
+        if attempts:
+            QTimer.singleShot(100, lambda: self._seek(position, attempts - 1))
@@ -1,5 +1,6 @@
 import os
 
+
 # Method to scan folder for files and subfolders
 def scan_files(dir, ext):
     """
@@ -21,3 +22,21 @@ def scan_files(dir, ext):
         files.extend(f)
 
     return (subfolders, files)
+
+
+# Convert millis to format  hr:min:ss format
+def convert_ms(millis: int):
+    """
+    Convert duration(ms) to hr:min:ss format
+    """
+    if millis < 0:
+        return f"{int(0):02d}:{int(0):02d}"
+
+    seconds, millis = divmod(millis, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+
+    if hours:
+        return f"{hours}:{int(minutes):02d}:{int(seconds):02d}"  # hr:min:ss
+    else:
+        return f"{int(minutes):02d}:{int(seconds):02d}"  # min:ss
@@ -0,0 +1,286 @@
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from modules import snapshot
+from modules.crypto import (
+    BLOCK_SIZE,
+    CHUNK_ENTRY_MAC,
+    CHUNK_SIZE,
+    CONTAINER_HEADER,
+    CONTAINER_VERSION,
+    FLAG_MAC,
+    INTEGRITY,
+    MAGIC_V2,
+    NONCE_SIZE,
+    TITLE_CAPACITY,
+    ContainerHeader,
+    chunk_mac,
+    ctr_encryptor,
+    header_mac,
+    load_key,
+    mac_key,
+    merkle_root,
+)
+from modules.metadata import parse_media
+
+
+def encrypt_chunks(
+    source, output, key, nonce, payload_offset, first, count, chunk_size
+):
+    """
+    Encrypt a run of chunks of a media into the container (worker process)
+    Every worker writes its own region of the preallocated output file.
+    @return: (number of plaintext bytes encrypted, MACs of the chunks)
+    """
+    offset = first * chunk_size
+    encryptor, _ = ctr_encryptor(key, nonce, offset)
+    chunk_key = mac_key(key)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    encrypted = 0
+    macs = []
+
+    with open(source, "rb", buffering=0) as plain, open(
+        output, "r+b", buffering=0
+    ) as container:
+        plain.seek(offset)
+        container.seek(payload_offset + offset)
+        for number in range(first, first + count):
+            read = plain.readinto(view)
+            if not read:
+                break
+            ciphertext = encryptor.update(view[:read])
+            container.write(ciphertext)
+            macs.append(chunk_mac(chunk_key, number, ciphertext))
+            encrypted += read
+
+    return encrypted, macs
+
+
+def probe_source(source, thumbnail_size, timeout):
+    """
+    Parse a media and take its thumbnail (snapshot worker process)
+    @return: (metadata dict, PNG bytes or b"")
+    """
+    meta = parse_media(snapshot.worker_instance(), source, timeout)
+
+    thumbnail = b""
+    if thumbnail_size is not None and meta["duration"] >= 0:
+        handle, image = tempfile.mkstemp(suffix=".png")
+        os.close(handle)
+        try:
+            if snapshot.take_snapshot(source, image, thumbnail_size):
+                with open(image, "rb") as image_file:
+                    thumbnail = image_file.read()
+        finally:
+            if os.path.exists(image):
+                os.remove(image)
+
+    return meta, thumbnail
+
+
+def _title_bytes(title):
+    # utf-8, cut to the title area on a character boundary
+    data = (title or "").encode("utf-8", "surrogateescape")[:TITLE_CAPACITY]
+    return data.decode("utf-8", "ignore").encode("utf-8")
+
+
+class Ingester:
+    """
+    Encrypt media into indexed containers on a process pool
+    The media is encrypted in parallel chunk runs while a separate libvlc
+    process probes its duration, tracks and title and takes the thumbnail
+    stored in the container header.
+    """
+
+    def __init__(
+        self,
+        key=None,
+        workers=None,
+        chunk_size=CHUNK_SIZE,
+        task_chunks=64,
+        thumbnail_size=(64, 36),
+        timeout=5000,
+    ):
+        """
+        @param key: media key, the player key (load_key) by default
+        @param workers: encryption processes, one per CPU by default
+        @param chunk_size: bytes per chunk, a multiple of the AES block size
+        @param task_chunks: chunks encrypted per task
+        @param thumbnail_size: (width, height) of the stored thumbnail, the
+        player thumbnail size, None for no thumbnail
+        @param timeout: parse timeout in ms
+        """
+        if chunk_size <= 0 or chunk_size % BLOCK_SIZE:
+            raise ValueError(f"chunk size must be a multiple of {BLOCK_SIZE}")
+
+        self.key = key or load_key()
+        self.chunk_size = chunk_size
+        self.task_chunks = task_chunks
+        self.thumbnail_size = thumbnail_size
+        self.timeout = timeout
+
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = self._new_pool(self.workers)
+        # libvlc runs in its own process, next to the encryption
+        self._probe_pool = self._new_pool(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._probe_pool.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _new_pool(workers):
+        return ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def ingest(self, source, output):
+        """
+        Encrypt a media file into an indexed container, atomically
+        A media that cannot be parsed is stored without its metadata and
+        thumbnail, the player parses it itself.
+        @return: (ContainerHeader of the written container, parse error
+        message or None)
+        """
+        size = os.path.getsize(source)
+        chunk_size = self.chunk_size
+        chunk_count = -(-size // chunk_size)
+        nonce = os.urandom(NONCE_SIZE)
+        payload_offset = (
+            CONTAINER_HEADER.size
+            + TITLE_CAPACITY
+            + INTEGRITY.size
+            + chunk_count * CHUNK_ENTRY_MAC.size
+        )
+
+        directory = os.path.dirname(os.path.abspath(output))
+        os.makedirs(directory, exist_ok=True)
+        partial = f"{output}.part"
+        with open(partial, "wb") as container:
+            container.truncate(payload_offset + size)
+
+        try:
+            probe = self._probe_pool.submit(
+                probe_source, os.path.abspath(source), self.thumbnail_size, self.timeout
+            )
+            tasks = [
+                self._pool.submit(
+                    encrypt_chunks,
+                    source,
+                    partial,
+                    self.key,
+                    nonce,
+                    payload_offset,
+                    first,
+                    min(self.task_chunks, chunk_count - first),
+                    chunk_size,
+                )
+                for first in range(0, chunk_count, self.task_chunks)
+            ]
+            encrypted, macs = 0, []
+            try:
+                for task in tasks:
+                    task_encrypted, task_macs = task.result()
+                    encrypted += task_encrypted
+                    macs.extend(task_macs)
+            except BrokenProcessPool:
+                # a worker died, the next media get new processes
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool(self.workers)
+                raise
+            if encrypted != size:
+                raise OSError(f"{source}: changed while it was encrypted")
+
+            error = None
+            try:
+                meta, thumbnail = probe.result()
+            except Exception as probe_error:
+                # no libvlc or a media libvlc cannot parse
+                error = str(probe_error) or type(probe_error).__name__
+                meta, thumbnail = {"duration": -1, "title": "", "tracks": {}}, b""
+                if isinstance(probe_error, BrokenProcessPool):
+                    # libvlc crashed the probe process
+                    self._probe_pool.shutdown(wait=False, cancel_futures=True)
+                    self._probe_pool = self._new_pool(1)
+
+            header = self._write_header(
+                partial, nonce, chunk_count, payload_offset, size, meta, thumbnail, macs
+            )
+        except BaseException:
+            os.remove(partial)
+            raise
+
+        os.replace(partial, output)
+        return header, error
+
+    def _write_header(
+        self, path, nonce, chunk_count, payload_offset, size, meta, thumbnail, macs
+    ):
+        """
+        Write the header, title, integrity block, chunk index and thumbnail
+        around the payload
+        """
+        chunk_size = self.chunk_size
+        title = _title_bytes(meta["title"])
+        tracks = meta.get("tracks") or {}
+        width, height = self.thumbnail_size if thumbnail else (0, 0)
+
+        # the thumbnail counter starts at the chunk boundary after the media
+        if thumbnail:
+            encryptor, _ = ctr_encryptor(self.key, nonce, chunk_count * chunk_size)
+            thumbnail = encryptor.update(thumbnail)
+
+        header = ContainerHeader(
+            MAGIC_V2,
+            CONTAINER_VERSION,
+            FLAG_MAC,
+            nonce,
+            chunk_size,
+            chunk_count,
+            payload_offset,
+            size,
+            meta["duration"],
+            tracks.get("audio", 0),
+            tracks.get("video", 0),
+            tracks.get("text", 0),
+            width,
+            height,
+            len(title),
+            payload_offset + size,
+            len(thumbnail),
+        )
+
+        index = bytearray()
+        for number, mac in enumerate(macs):
+            offset = number * chunk_size
+            index.extend(
+                CHUNK_ENTRY_MAC.pack(
+                    payload_offset + offset, min(chunk_size, size - offset), mac
+                )
+            )
+
+        header_area = CONTAINER_HEADER.pack(*header) + title.ljust(
+            TITLE_CAPACITY, b"\0"
+        )
+        root = merkle_root(macs)
+
+        with open(path, "r+b") as container:
+            container.write(header_area)
+            container.write(
+                INTEGRITY.pack(root, header_mac(mac_key(self.key), header_area, root))
+            )
+            container.write(index)
+            container.seek(header.thumbnail_offset)
+            container.write(thumbnail)
+        return header
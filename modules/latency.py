@@ -0,0 +1,303 @@
+import os
+import json
+import bisect
+import inspect
+import threading
+import functools
+from time import perf_counter_ns
+from contextlib import nullcontext
+
+# histogram bucket upper bounds in seconds (50us .. 10s, roughly x2.5 steps)
+BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    10.0,
+)
+
+_NULL_TIMER = nullcontext()
+
+
+class LatencyHistogram:
+    """
+    Latency distribution of an operation in fixed buckets
+    """
+
+    def __init__(self):
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, rank):
+        """
+        Upper bound of the bucket holding the rank-th percentile
+        """
+        if not self.count:
+            return 0.0
+        target = rank / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": dict(
+                zip([str(bound) for bound in BUCKETS] + ["+Inf"], self.counts)
+            ),
+        }
+
+
+class _Timer:
+    """
+    Context manager timing a block into a recorder
+    """
+
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.observe(self.name, (perf_counter_ns() - self.start) / 1e9)
+        return False
+
+
+class LatencyRecorder:
+    """
+    Opt-in latency histograms of the player entry points
+    When disabled, instrument() hands the functions back unchanged and
+    timer() returns a shared no-op context manager, so the instrumented
+    code runs at full speed.
+    """
+
+    def __init__(self, enabled=False, path=None, interval=10.0, overlay=False):
+        """
+        @param path: file the histograms are flushed to, Prometheus text
+        format for .prom/.txt files, JSON otherwise
+        @param interval: seconds between two flushes
+        @param overlay: show the slowest operations on screen
+        """
+        self.enabled = enabled
+        self.path = path
+        self.interval = interval
+        self.overlay = overlay
+
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+        self._stopped = threading.Event()
+        self._flusher = None
+
+    @classmethod
+    def from_environment(cls, environ=None):
+        """
+        Configure from EVEREST_LATENCY: a comma separated list of "1",
+        "overlay" and/or the output file path
+        EVEREST_LATENCY_INTERVAL sets the flush interval in seconds
+        """
+        environ = os.environ if environ is None else environ
+        value = environ.get("EVEREST_LATENCY", "").strip()
+        if not value or value == "0":
+            return cls()
+
+        options = [option.strip() for option in value.split(",") if option.strip()]
+        paths = [option for option in options if option not in ("1", "overlay")]
+        return cls(
+            enabled=True,
+            path=paths[0] if paths else None,
+            interval=float(environ.get("EVEREST_LATENCY_INTERVAL", 10)),
+            overlay="overlay" in options,
+        )
+
+    # -------------------------------------------------------------------------
+    # Recording
+    # -------------------------------------------------------------------------
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        """
+        Context manager timing a block as operation name
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def instrument(self, function, name=None):
+        """
+        Wrap a callable to time every call
+        @return: the wrapped callable, or function itself when disabled
+        """
+        if not self.enabled:
+            return function
+        name = name or getattr(function, "__qualname__", repr(function))
+        observe = self.observe
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, (perf_counter_ns() - start) / 1e9)
+
+        return timed
+
+    def instrument_object(self, instance, prefix, names=None):
+        """
+        Time the public methods of an instance (instance attributes shadow
+        the class methods, bind the callbacks after this call)
+        @param names: method names, every public method by default
+        """
+        if not self.enabled:
+            return
+        if names is None:
+            names = [
+                name
+                for name, member in vars(type(instance)).items()
+                if not name.startswith("_") and inspect.isfunction(member)
+            ]
+        for name in names:
+            method = getattr(instance, name)
+            setattr(instance, name, self.instrument(method, f"{prefix}.{name}"))
+
+    # -------------------------------------------------------------------------
+    # Reporting
+    # -------------------------------------------------------------------------
+    def snapshot(self):
+        """
+        Summary of every histogram
+        """
+        with self._lock:
+            return {
+                name: histogram.summary()
+                for name, histogram in sorted(self._histograms.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        metric = "everest_operation_latency_seconds"
+        lines = [
+            f"# HELP {metric} Latency of the player operations.",
+            f"# TYPE {metric} histogram",
+        ]
+        for name, summary in self.snapshot().items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            cumulative = 0
+            for bound, count in summary["buckets"].items():
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket{{operation="{label}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{metric}_sum{{operation="{label}"}} {summary["sum"]}')
+            lines.append(f'{metric}_count{{operation="{label}"}} {summary["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def summary_text(self, limit=6):
+        """
+        Slowest operations by p90, one line each (debug overlay)
+        """
+        rows = sorted(
+            self.snapshot().items(), key=lambda item: item[1]["p90"], reverse=True
+        )
+        return "\n".join(
+            f"{name} p50 {summary['p50'] * 1000:.2f}ms "
+            f"p90 {summary['p90'] * 1000:.2f}ms max {summary['max'] * 1000:.2f}ms "
+            f"n={summary['count']}"
+            for name, summary in rows[:limit]
+        )
+
+    def flush(self, path=None):
+        """
+        Write the histograms to a file, atomically
+        """
+        path = path or self.path
+        if not path:
+            return
+        if os.path.splitext(path)[1] in (".prom", ".txt"):
+            text = self.to_prometheus()
+        else:
+            text = self.to_json()
+
+        partial = f"{path}.part"
+        with open(partial, "w") as output:
+            output.write(text)
+        os.replace(partial, path)
+
+    def start(self):
+        """
+        Start the periodic flush thread (if enabled with a file)
+        """
+        if not self.enabled or not self.path or self._flusher is not None:
+            return
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="latency", daemon=True
+        )
+        self._flusher.start()
+
+    def close(self):
+        """
+        Stop the flush thread and write the final histograms
+        """
+        self._stopped.set()
+        if self.enabled and self.path:
+            try:
+                self.flush()
+            except OSError as error:
+                print(f"latency report: {error}")
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except OSError as error:
+                print(f"latency report: {error}")
+
+
+# process wide recorder, configured from the environment
+recorder = LatencyRecorder.from_environment()
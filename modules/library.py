@@ -0,0 +1,438 @@
+import os
+import sys
+import json
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+
+from modules.cache import data_directory
+from modules.scanner import ScanEntry
+
+
+class LibraryIndex:
+    """
+    Persistent index of the scanned media folders
+    Stores the mtime and the files of every folder so that a rescan only
+    lists the folders that changed since the last scan
+    """
+
+    version = 1
+
+    def __init__(self, index_path=None):
+        """
+        @param index_path: index file, defaults to the user data dir
+        """
+        if index_path is None:
+            index_path = os.path.join(data_directory(), "library.json")
+
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        # folder -> {"mtime_ns", "dirs": [names], "files": [[name, size, mtime, ctime]]}
+        self._folders = {}
+        self.load()
+
+    def load(self):
+        """
+        Load the index from disk
+        """
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") == self.version:
+            self._folders = data.get("folders", {})
+
+    def save(self):
+        """
+        Write the index to disk if it changed
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(
+                {"version": self.version, "folders": self._folders},
+                separators=(",", ":"),
+            )
+            self._dirty = False
+
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            index_file.write(data)
+        os.replace(tmp_path, self.index_path)
+
+    def invalidate(self, folder=None):
+        """
+        Forget a folder (and its sub folders), or the whole index
+        """
+        with self._lock:
+            if folder is None:
+                self._folders = {}
+            else:
+                folder = os.fspath(folder).rstrip(os.sep)
+                prefix = folder + os.sep
+                self._folders = {
+                    path: entry
+                    for path, entry in self._folders.items()
+                    if path != folder and not path.startswith(prefix)
+                }
+            self._dirty = True
+
+    def scan(self, roots, ext, batch_size=256, max_depth=None, cancel=None):
+        """
+        Scan folders for a given file extension(eg .bin , .mp4) using the index
+        Generator yielding lists of ScanEntry like scanner.scan_tree, only
+        the folders whose mtime changed are listed again. Unchanged
+        folders only cost a stat.
+        """
+        if isinstance(roots, (str, os.PathLike)):
+            roots = [roots]
+        if isinstance(ext, str):
+            ext = (ext,)
+        ext = tuple(e.lower() for e in ext)
+
+        # (st_dev, st_ino) of visited folders, protects against symlink loops
+        visited = set()
+        stack = [(os.path.abspath(root), 0) for root in reversed(roots)]
+        batch = []
+
+        while stack:
+            if cancel is not None and cancel.is_set():
+                return
+
+            folder, depth = stack.pop()
+            try:
+                folder_stat = os.stat(folder)
+            except OSError:
+                continue
+
+            key = (folder_stat.st_dev, folder_stat.st_ino)
+            if key in visited:
+                continue
+            visited.add(key)
+
+            entry = self._folders.get(folder)
+            if entry is None or entry["mtime_ns"] != folder_stat.st_mtime_ns:
+                entry = self._list_folder(folder, folder_stat.st_mtime_ns)
+                if entry is None:
+                    continue
+
+            for name, size, mtime, ctime in entry["files"]:
+                if os.path.splitext(name)[1].lower() in ext:
+                    batch.append(
+                        ScanEntry(os.path.join(folder, name), size, mtime, ctime)
+                    )
+
+            if max_depth is None or depth < max_depth:
+                for name in reversed(entry["dirs"]):
+                    stack.append((os.path.join(folder, name), depth + 1))
+
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+
+        if batch:
+            yield batch
+
+    def indexed(self, folder):
+        """
+        True if a folder has been listed in the index
+        """
+        return os.fspath(folder).rstrip(os.sep) in self._folders
+
+    def folder_files(self, folder):
+        """
+        Indexed file names of a folder
+        """
+        entry = self._folders.get(os.fspath(folder))
+        return [] if entry is None else [item[0] for item in entry["files"]]
+
+    def folders_below(self, folder):
+        """
+        Indexed folders below a folder (the folder included)
+        """
+        folder = os.fspath(folder).rstrip(os.sep)
+        prefix = folder + os.sep
+        with self._lock:
+            return [
+                path
+                for path in self._folders
+                if path == folder or path.startswith(prefix)
+            ]
+
+    def files_below(self, folder):
+        """
+        Indexed file paths of a folder and its sub folders
+        """
+        folder = os.fspath(folder).rstrip(os.sep)
+        prefix = folder + os.sep
+        with self._lock:
+            folders = [
+                (path, entry)
+                for path, entry in self._folders.items()
+                if path == folder or path.startswith(prefix)
+            ]
+        return [
+            os.path.join(path, item[0])
+            for path, entry in folders
+            for item in entry["files"]
+        ]
+
+    def _list_folder(self, folder, mtime_ns):
+        """
+        List a folder and store it in the index
+        """
+        dirs, files = [], []
+        try:
+            with os.scandir(folder) as entries:
+                for item in entries:
+                    try:
+                        if item.is_dir():
+                            dirs.append(item.name)
+                        elif item.is_file():
+                            item_stat = item.stat()
+                            files.append(
+                                [
+                                    item.name,
+                                    item_stat.st_size,
+                                    item_stat.st_mtime,
+                                    item_stat.st_ctime,
+                                ]
+                            )
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+
+        return self.store_folder(folder, mtime_ns, dirs, files)
+
+    def store_folder(self, folder, mtime_ns, dirs, files):
+        """
+        Store the listing of a folder, thread safe (scan_tree workers)
+        @param files: [name, size, mtime, ctime] of all the folder files
+        @return: index entry of the folder
+        """
+        entry = {"mtime_ns": mtime_ns, "dirs": sorted(dirs), "files": files}
+        with self._lock:
+            self._folders[folder] = entry
+            self._dirty = True
+        return entry
+
+    def update_folder(self, folder):
+        """
+        Refresh a single folder (used by the inotify watcher)
+        @return: (added, removed) file names
+        """
+        folder = os.fspath(folder)
+        before = set(self.folder_files(folder))
+        try:
+            mtime_ns = os.stat(folder).st_mtime_ns
+        except OSError:
+            self.invalidate(folder)
+            return [], sorted(before)
+
+        entry = self._list_folder(folder, mtime_ns)
+        after = set() if entry is None else {item[0] for item in entry["files"]}
+        return sorted(after - before), sorted(before - after)
+
+
+class InotifyWatcher(threading.Thread):
+    """
+    Linux inotify watcher for the indexed folders
+    Calls on_change(added, removed) with the full paths of the media files
+    created or removed below the watched folders
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_ISDIR = 0x40000000
+    IN_IGNORED = 0x00008000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    MASK = (
+        IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+    )
+
+    def __init__(self, index, ext, on_change, save_delay=5.0):
+        """
+        @param save_delay: quiet time(s) after the last change before the
+        index is written
+        """
+        super(InotifyWatcher, self).__init__(name="inotify", daemon=True)
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.index = index
+        self.ext = tuple(e.lower() for e in ((ext,) if isinstance(ext, str) else ext))
+        self.on_change = on_change
+        self.save_delay = save_delay
+
+        # watch descriptor <-> folder
+        self._watches = {}
+        self._folders = {}
+        self._lock = threading.Lock()
+
+        # pipe used to wake up the thread on stop
+        self._wake_r, self._wake_w = os.pipe()
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def available():
+        """
+        inotify is only available on linux
+        """
+        return sys.platform.startswith("linux")
+
+    def watch(self, folder):
+        """
+        Watch a folder and all its sub folders
+        """
+        folder = os.path.abspath(folder)
+
+        # indexed folders do not need to be walked again
+        folders = self.index.folders_below(folder)
+        if not folders:
+            folders = [path for path, _, _ in os.walk(folder)]
+
+        for path in folders:
+            self._add_watch(path)
+
+    def _add_watch(self, folder):
+        with self._lock:
+            if folder in self._folders:
+                return
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), self.MASK)
+            if wd < 0:
+                return
+            self._watches[wd] = folder
+            self._folders[folder] = wd
+
+    def unwatch_all(self):
+        """
+        Stop watching all the folders, the thread keeps running
+        """
+        with self._lock:
+            for wd in self._watches:
+                self._libc.inotify_rm_watch(self._fd, wd)
+            self._watches = {}
+            self._folders = {}
+
+    def stop(self):
+        """
+        Stop watching and close the inotify descriptor
+        """
+        self._stopped.set()
+        os.write(self._wake_w, b"\0")
+
+    def run(self):
+        header = struct.Struct("iIII")
+
+        # index changed and not written yet
+        unsaved = False
+
+        try:
+            while not self._stopped.is_set():
+                readable, _, _ = select.select(
+                    [self._fd, self._wake_r],
+                    [],
+                    [],
+                    self.save_delay if unsaved else None,
+                )
+                if self._wake_r in readable:
+                    break
+                if not readable:
+                    # quiet since the last burst of events
+                    self.index.save()
+                    unsaved = False
+                    continue
+
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+
+                # folders touched by this burst of events
+                changed, removed_dirs = set(), set()
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, length = header.unpack_from(data, offset)
+                    offset += header.size
+                    name = data[offset : offset + length].rstrip(b"\0")
+                    offset += length
+
+                    folder = self._watches.get(wd)
+                    if folder is None:
+                        continue
+
+                    if mask & self.IN_IGNORED:
+                        with self._lock:
+                            self._watches.pop(wd, None)
+                            self._folders.pop(folder, None)
+                        continue
+
+                    if mask & self.IN_ISDIR:
+                        path = os.path.join(folder, os.fsdecode(name))
+                        if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                            self.watch(path)
+                        elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                            removed_dirs.add(path)
+
+                    changed.add(folder)
+
+                self._dispatch(changed, removed_dirs)
+                unsaved = True
+        finally:
+            if unsaved:
+                self.index.save()
+            os.close(self._fd)
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+
+    def _dispatch(self, folders, removed_dirs):
+        """
+        Refresh the changed folders in the index and report the media files
+        """
+        added, removed = [], []
+
+        for folder in removed_dirs:
+            removed.extend(
+                path
+                for path in self.index.files_below(folder)
+                if os.path.splitext(path)[1].lower() in self.ext
+            )
+            self.index.invalidate(folder)
+
+        for folder in folders:
+            new, gone = self.index.update_folder(folder)
+            added.extend(
+                os.path.join(folder, name)
+                for name in new
+                if os.path.splitext(name)[1].lower() in self.ext
+            )
+            removed.extend(
+                os.path.join(folder, name)
+                for name in gone
+                if os.path.splitext(name)[1].lower() in self.ext
+            )
+
+        if added or removed:
+            self.on_change(added, removed)
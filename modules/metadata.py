@@ -0,0 +1,82 @@
+import threading
+
+import vlc
+
+from modules.crypto import open_media, read_metadata
+
+# Media parsed states that mean libvlc has finished with the media
+PARSE_FINISHED = (
+    vlc.MediaParsedStatus.skipped,
+    vlc.MediaParsedStatus.failed,
+    vlc.MediaParsedStatus.timeout,
+    vlc.MediaParsedStatus.done,
+)
+
+
+def parse_media(instance, mrl, timeout=5000):
+    """
+    Parse a media file asynchronously and wait for the result
+    @param instance: vlc.Instance used to create the media
+    @param mrl: media path
+    @param timeout: parse timeout in ms
+    @return: dict with the duration(ms), title and tracks of the media
+    """
+    # indexed containers carry the metadata probed at ingest, no decryption
+    meta = read_metadata(mrl)
+    if meta is not None:
+        return meta
+
+    media = open_media(instance, mrl)
+    parsed = threading.Event()
+
+    # libvlc notifies the end of the parse through the event manager
+    event_manager = media.event_manager()
+    event_manager.event_attach(
+        vlc.EventType.MediaParsedChanged, lambda *event: parsed.set()
+    )
+
+    media.parse_with_options(vlc.MediaParseFlag.local, timeout)
+
+    # wait a little longer than libvlc's own timeout
+    if media.get_parsed_status() not in PARSE_FINISHED:
+        parsed.wait(timeout / 1000 + 1)
+
+    status = media.get_parsed_status()
+
+    meta = {
+        "duration": (
+            media.get_duration() if status == vlc.MediaParsedStatus.done else -1
+        ),
+        "title": media.get_meta(vlc.Meta.Title) or "",
+        "tracks": media_tracks(media),
+    }
+
+    # stop parsing the media
+    media.parse_stop()
+    event_manager.event_detach(vlc.EventType.MediaParsedChanged)
+    media.release()
+
+    return meta
+
+
+def media_tracks(media):
+    """
+    Count the elementary streams of a parsed media by type
+    """
+    tracks = {"audio": 0, "video": 0, "text": 0}
+    names = {
+        vlc.TrackType.audio: "audio",
+        vlc.TrackType.video: "video",
+        vlc.TrackType.ext: "text",
+    }
+
+    try:
+        for track in media.tracks_get() or []:
+            name = names.get(track.type)
+            if name:
+                tracks[name] += 1
+    except Exception:
+        # tracks are not available for unparsed media
+        pass
+
+    return tracks
@@ -0,0 +1,160 @@
+import time
+import threading
+
+import vlc
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class MarqueeOSD(QObject):
+    """
+    On screen display drawn with the libvlc marquee
+    Debug, health, title, timestamp and status texts live in separate slots that are
+    stacked instead of overwriting each other. Updates are coalesced to at
+    most one per display frame and only the marquee options that changed
+    since the last update are sent to libvlc.
+    """
+
+    # slots from the bottom layer to the top layer
+    SLOTS = ("debug", "health", "title", "timestamp", "status")
+
+    # marquee layout of each slot, the top visible slot sets the layout
+    styles = {
+        "debug": {
+            vlc.VideoMarqueeOption.Size: 16,
+            vlc.VideoMarqueeOption.Position: 5,
+            vlc.VideoMarqueeOption.X: 10,
+            vlc.VideoMarqueeOption.Y: 10,
+        },
+        "health": {
+            vlc.VideoMarqueeOption.Size: 16,
+            vlc.VideoMarqueeOption.Position: 5,
+            vlc.VideoMarqueeOption.X: 10,
+            vlc.VideoMarqueeOption.Y: 10,
+        },
+        "title": {
+            vlc.VideoMarqueeOption.Size: 38,
+            vlc.VideoMarqueeOption.Position: 8,
+            vlc.VideoMarqueeOption.X: 0,
+            vlc.VideoMarqueeOption.Y: 0,
+        },
+        "timestamp": {
+            vlc.VideoMarqueeOption.Size: 24,
+            vlc.VideoMarqueeOption.Position: 6,
+            vlc.VideoMarqueeOption.X: 20,
+            vlc.VideoMarqueeOption.Y: 20,
+        },
+        "status": {
+            vlc.VideoMarqueeOption.Size: 24,
+            vlc.VideoMarqueeOption.Position: 6,
+            vlc.VideoMarqueeOption.X: 20,
+            vlc.VideoMarqueeOption.Y: 20,
+        },
+    }
+
+    # emitted from any thread to schedule a render on the GUI thread
+    _changed = pyqtSignal()
+
+    def __init__(self, media_player, frame_interval=16, parent=None):
+        """
+        @param media_player: vlc.MediaPlayer drawing the marquee
+        @param frame_interval: minimum delay(ms) between two marquee updates
+        """
+        super(MarqueeOSD, self).__init__(parent)
+
+        self.media_player = media_player
+
+        # slot -> (text, expiry time)
+        self._slots = {}
+        self._lock = threading.Lock()
+
+        # marquee options last sent to libvlc
+        self._applied = {}
+
+        # one render per display frame
+        self._frame = QTimer(self)
+        self._frame.setSingleShot(True)
+        self._frame.setInterval(frame_interval)
+        self._frame.timeout.connect(self.render)
+
+        # render again when the next slot expires
+        self._expiry = QTimer(self)
+        self._expiry.setSingleShot(True)
+        self._expiry.timeout.connect(self.render)
+
+        self._changed.connect(self._schedule)
+
+    def show(self, slot, text, timeout=1500):
+        """
+        Show a text in a slot for timeout ms, thread safe
+        """
+        with self._lock:
+            self._slots[slot] = (text, time.monotonic() + timeout / 1000)
+        self._changed.emit()
+
+    def hide(self, slot):
+        """
+        Clear a slot, thread safe
+        """
+        with self._lock:
+            self._slots.pop(slot, None)
+        self._changed.emit()
+
+    def invalidate(self):
+        """
+        Forget the options sent to libvlc (e.g. after a new video output)
+        """
+        self._applied = {}
+        self._schedule()
+
+    def set_media_player(self, media_player):
+        """
+        Draw on another media player (gapless swap), thread safe
+        """
+        self.media_player = media_player
+        self._applied = {}
+        self._changed.emit()
+
+    def _schedule(self):
+        if not self._frame.isActive():
+            self._frame.start()
+
+    def render(self):
+        """
+        Send the stacked slots to the libvlc marquee
+        """
+        now = time.monotonic()
+        with self._lock:
+            for slot, (_, expires) in list(self._slots.items()):
+                if expires <= now:
+                    del self._slots[slot]
+            visible = [slot for slot in reversed(self.SLOTS) if slot in self._slots]
+            texts = [self._slots[slot][0] for slot in visible]
+            expires = min((self._slots[slot][1] for slot in visible), default=None)
+
+        if not visible:
+            self._apply_int(vlc.VideoMarqueeOption.Enable, 0)
+            return
+
+        # the top slot decides the layout, libvlc has a single marquee
+        for option, value in self.styles[visible[0]].items():
+            self._apply_int(option, value)
+
+        # the slots expire on their own, not with the marquee timeout
+        self._apply_int(vlc.VideoMarqueeOption.Timeout, 0)
+        self._apply_text("\n".join(texts))
+        self._apply_int(vlc.VideoMarqueeOption.Enable, 1)
+
+        self._expiry.start(max(int((expires - now) * 1000), 1))
+
+    def _apply_int(self, option, value):
+        if self._applied.get(option) == value:
+            return
+        self.media_player.video_set_marquee_int(option, value)
+        self._applied[option] = value
+
+    def _apply_text(self, text):
+        option = vlc.VideoMarqueeOption.Text
+        if self._applied.get(option) == text:
+            return
+        self.media_player.video_set_marquee_string(option, text)
+        self._applied[option] = text
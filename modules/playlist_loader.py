@@ -0,0 +1,96 @@
+import os
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from modules import session
+
+
+class PlaylistLoader(QObject):
+    """
+    Background playlist reader
+    Decodes a playlist file on a thread and streams its entries to the GUI
+    thread in batches, the first rows show up before the file is read
+    """
+
+    # (path, (current index, position(ms), playback mode)) of a session
+    # file, emitted before its entries
+    opened = pyqtSignal(str, object)
+
+    # list of PlaylistEntry
+    loaded = pyqtSignal(list)
+
+    # (path, error message)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, batch_size=4096, parent=None):
+        super(PlaylistLoader, self).__init__(parent)
+
+        self.batch_size = batch_size
+
+        # cancel events of the running loads
+        self._loads = set()
+        self._lock = threading.Lock()
+
+    def load(self, path, resume=False):
+        """
+        Read a playlist file in the background
+        @param resume: emit the saved current media, position and playback
+        mode (.evpl)
+        """
+        cancel = threading.Event()
+        with self._lock:
+            self._loads.add(cancel)
+
+        thread = threading.Thread(
+            target=self._run, args=(path, resume, cancel), name="playlist", daemon=True
+        )
+        thread.start()
+
+    def cancel(self):
+        """
+        Cancel all the running loads
+        """
+        with self._lock:
+            for cancel in self._loads:
+                cancel.set()
+            self._loads.clear()
+
+    def _run(self, path, resume, cancel):
+        """
+        Worker: stream the playlist entries
+        """
+        try:
+            for batch in self._batches(path, resume):
+                if cancel.is_set():
+                    return
+                self.loaded.emit(batch)
+        except (OSError, ValueError) as error:
+            if not cancel.is_set():
+                self.failed.emit(path, str(error))
+        finally:
+            with self._lock:
+                self._loads.discard(cancel)
+
+    def _batches(self, path, resume):
+        """
+        Entries of a playlist file in lists of batch_size
+        """
+        if os.path.splitext(path)[1].lower() in (".m3u", ".m3u8"):
+            batch = []
+            for entry in session.read_m3u(path):
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            return
+
+        with session.PlaylistFile(path) as playlist:
+            if resume:
+                self.opened.emit(
+                    path, (playlist.current, playlist.position, playlist.mode)
+                )
+            for start in range(0, len(playlist), self.batch_size):
+                yield playlist.entries(start, start + self.batch_size)
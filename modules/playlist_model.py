@@ -0,0 +1,538 @@
+import os
+import sys
+from array import array
+from bisect import bisect_right
+
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt, QTimer
+
+from modules.search import SearchIndex
+
+
+class PlaylistModel(QAbstractItemModel):
+    """
+    Playlist item model
+    Media are kept in a column oriented store (interned paths and integer
+    durations) and the view only asks for the rows it displays
+    """
+
+    TITLE, DURATION, LOCATION = range(3)
+
+    headers = ("Title", "Duration", "Location")
+
+    # duration of a media that has not been parsed yet
+    UNKNOWN = -1
+
+    def __init__(self, icon=None, convert_ms=None, placeholder="--:--", parent=None):
+        """
+        @param icon: icon shared by all the rows
+        @param convert_ms: function formatting a duration(ms) for display
+        @param placeholder: duration text shown until the media is parsed
+        """
+        super(PlaylistModel, self).__init__(parent)
+
+        self.icon = icon
+        self.convert_ms = convert_ms or str
+        self.placeholder = placeholder
+
+        self._paths = []
+        self._durations = array("q")
+
+        # casefolded file names, the title sort keys
+        self._titles = []
+
+        # media path -> thumbnail icon, rows without one use the shared icon
+        self._icons = {}
+
+        # media path -> store indexes (a media can be listed twice)
+        self._index = {}
+
+        # all store indexes in sort order and the rank of each store index,
+        # the ranks are rebuilt on demand (None) after a sorted append
+        self._sorted = array("l")
+        self._rank = array("l")
+
+        # view row -> store index and store index -> view row (-1 if hidden),
+        # the rows from _stale_row on are rebuilt on demand
+        self._order = array("l")
+        self._rows = array("l")
+        self._stale_row = None
+
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+
+        # store indexes whose duration changed while the view is sorted by
+        # duration, moved to their sorted position in batches
+        self._moved = set()
+        self._reposition_timer = QTimer(self)
+        self._reposition_timer.setSingleShot(True)
+        self._reposition_timer.setInterval(200)
+        self._reposition_timer.timeout.connect(self._reposition)
+
+        # Search index and the store indexes matching the current filter
+        self.search = SearchIndex()
+        self._filter_text = ""
+        self._matches = None
+
+    # -------------------------------------------------------------------------
+    # Store
+    # -------------------------------------------------------------------------
+    def append(self, mrls, durations=None):
+        """
+        Append media to the playlist
+        @param durations: optional dict of known durations(ms) by path
+        """
+        if not mrls:
+            return
+        # the merge needs the sort order to be up to date
+        self._reposition()
+
+        first = len(self._paths)
+        sorting = self._sort_column >= 0
+
+        for offset, mrl in enumerate(mrls):
+            item = first + offset
+            path = sys.intern(os.fspath(mrl))
+            duration = self.UNKNOWN
+            if durations is not None:
+                duration = durations.get(path, self.UNKNOWN)
+
+            self._paths.append(path)
+            self._durations.append(duration)
+            self._titles.append(os.path.basename(path).casefold())
+            self._index.setdefault(path, []).append(item)
+            if not sorting:
+                self._rank.append(len(self._sorted))
+                self._sorted.append(item)
+            self._rows.append(-1)
+            self.search.add(item, path)
+
+        new_items = range(first, len(self._paths))
+        if sorting:
+            # merge the batch instead of sorting the whole store again
+            self._sorted, inserted = self._merge(self._sorted, new_items)
+            self._rank = None
+
+        # new rows visible with the current filter
+        if self._matches is not None:
+            matches = self.search.query(self._filter_text)
+            new_items = [item for item in new_items if item in matches]
+            self._matches.update(new_items)
+
+        if new_items:
+            row = len(self._order)
+            self.beginInsertRows(QModelIndex(), row, row + len(new_items) - 1)
+            for item in new_items:
+                self._rows[item] = len(self._order)
+                self._order.append(item)
+            self.endInsertRows()
+
+            # keep the view sorted
+            if sorting:
+                # without a filter the view rows are the sort order
+                self._place(new_items, inserted if self._matches is None else None)
+
+        self.headerDataChanged.emit(Qt.Horizontal, self.TITLE, self.TITLE)
+
+    def clear(self):
+        """
+        Remove all the media
+        """
+        self.beginResetModel()
+        self._paths = []
+        self._durations = array("q")
+        self._titles = []
+        self._icons = {}
+        self._index = {}
+        self._sorted = array("l")
+        self._rank = array("l")
+        self._order = array("l")
+        self._rows = array("l")
+        self._stale_row = None
+        self._moved = set()
+        self._reposition_timer.stop()
+        self.search.clear()
+        if self._matches is not None:
+            self._matches = set()
+        self.endResetModel()
+
+        self.headerDataChanged.emit(Qt.Horizontal, self.TITLE, self.TITLE)
+
+    def remove(self, mrls):
+        """
+        Remove media from the playlist
+        """
+        removed = set()
+        for mrl in mrls:
+            removed.update(self._index.get(mrl, ()))
+        if not removed:
+            return
+        self._reposition()
+        self._ensure_rows()
+
+        # remove the view rows from the bottom up
+        for row in sorted((self._rows[item] for item in removed), reverse=True):
+            if row < 0:
+                continue
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._order[row]
+            self.endRemoveRows()
+
+        # compact the store and remap the store indexes
+        remap = array("l", [-1]) * len(self._paths)
+        paths, durations, titles = [], array("q"), []
+        for item, path in enumerate(self._paths):
+            if item in removed:
+                continue
+            remap[item] = len(paths)
+            paths.append(path)
+            durations.append(self._durations[item])
+            titles.append(self._titles[item])
+
+        self._paths = paths
+        self._durations = durations
+        self._titles = titles
+        self._order = array("l", (remap[item] for item in self._order))
+        self._sorted = array(
+            "l", (remap[item] for item in self._sorted if item not in removed)
+        )
+        if self._matches is not None:
+            self._matches = {
+                remap[item] for item in self._matches if item not in removed
+            }
+
+        self._index = {}
+        self.search.clear()
+        for item, path in enumerate(self._paths):
+            self._index.setdefault(path, []).append(item)
+            self.search.add(item, path)
+        self._icons = {
+            path: icon for path, icon in self._icons.items() if path in self._index
+        }
+
+        self._update_rank()
+        self._update_rows()
+
+        self.headerDataChanged.emit(Qt.Horizontal, self.TITLE, self.TITLE)
+
+    def set_duration(self, mrl, duration):
+        """
+        Set the parsed duration(ms) of a media
+        """
+        self._ensure_rows()
+        for item in self._index.get(mrl, ()):
+            self._durations[item] = duration
+            if self._sort_column == self.DURATION:
+                self._moved.add(item)
+
+            row = self._rows[item]
+            if row >= 0:
+                index = self.createIndex(row, self.DURATION)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+        # move the rows once per batch of parsed media, not once per media
+        if self._moved and not self._reposition_timer.isActive():
+            self._reposition_timer.start()
+
+    def set_icon(self, mrl, icon):
+        """
+        Set the thumbnail icon of a media
+        """
+        items = self._index.get(mrl)
+        if not items:
+            return
+        self._icons[mrl] = icon
+
+        self._ensure_rows()
+        for item in items:
+            row = self._rows[item]
+            if row >= 0:
+                index = self.createIndex(row, self.TITLE)
+                self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def duration(self, mrl):
+        """
+        Duration(ms) of a media, UNKNOWN if it has not been parsed
+        """
+        items = self._index.get(mrl)
+        if not items:
+            return self.UNKNOWN
+        return self._durations[items[0]]
+
+    def path(self, row):
+        """
+        Media path displayed at a view row
+        """
+        return self._paths[self._order[row]]
+
+    def paths(self):
+        """
+        All the media paths in playlist (insertion) order
+        """
+        return list(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    # -------------------------------------------------------------------------
+    # Filter
+    # -------------------------------------------------------------------------
+    def set_filter(self, text):
+        """
+        Only show the media whose title or folder name matches the text
+        """
+        text = text.strip()
+        if text == self._filter_text:
+            return
+
+        self._reposition()
+        self.beginResetModel()
+        self._filter_text = text
+        self._matches = self.search.query(text)
+        self._update_order()
+        self.endResetModel()
+
+    def filter_text(self):
+        """
+        Current filter text
+        """
+        return self._filter_text
+
+    def _update_order(self):
+        """
+        Rebuild the visible rows from the sort order and the filter
+        """
+        if self._matches is None:
+            self._order = array("l", self._sorted)
+        elif len(self._matches) * 8 < len(self._sorted):
+            # few matches: order them by rank instead of scanning every item
+            self._ensure_rank()
+            self._order = array("l", sorted(self._matches, key=self._rank.__getitem__))
+        else:
+            matches = self._matches
+            self._order = array("l", (item for item in self._sorted if item in matches))
+        self._update_rows()
+
+    # -------------------------------------------------------------------------
+    # QAbstractItemModel
+    # -------------------------------------------------------------------------
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        # flat list, no item has a parent
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        item = self._order[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            if column == self.TITLE:
+                return os.path.basename(self._paths[item])
+            if column == self.DURATION:
+                duration = self._durations[item]
+                if duration == self.UNKNOWN:
+                    return self.placeholder
+                return self.convert_ms(duration)
+            if column == self.LOCATION:
+                return self._paths[item]
+        elif role == Qt.DecorationRole and column == self.TITLE:
+            return self._icons.get(self._paths[item], self.icon)
+        elif role == Qt.ToolTipRole:
+            return self._paths[item]
+
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation != Qt.Horizontal or role != Qt.DisplayRole:
+            return None
+        if section == self.TITLE and self._paths:
+            if self._matches is not None:
+                return f"Title({len(self._order)}/{len(self._paths)})"
+            return f"Title({len(self._paths)})"
+        return self.headers[section]
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Sort the view rows, durations sort on their numeric value
+        """
+        self._sort_column = column
+        self._sort_order = order
+        key = self._sort_key()
+
+        # a full sort places the moved media too
+        self._moved = set()
+        self._reposition_timer.stop()
+
+        def update():
+            self._sorted = array(
+                "l",
+                sorted(self._sorted, key=key, reverse=order == Qt.DescendingOrder),
+            )
+
+        self._change_layout(update)
+
+    def _reposition(self):
+        """
+        Move the media whose duration changed to their sorted position
+        """
+        self._reposition_timer.stop()
+        moved = self._moved
+        if not moved:
+            return
+        self._moved = set()
+
+        def update():
+            rest = array("l", (item for item in self._sorted if item not in moved))
+            self._sorted, _ = self._merge(rest, sorted(moved))
+
+        self._change_layout(update)
+
+    def _change_layout(self, update):
+        """
+        Rebuild the view rows after update() changed the sort order, the
+        persistent indexes (selection, current row) follow their media
+        """
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        persistent_items = [self._order[index.row()] for index in persistent]
+
+        update()
+        self._update_rank()
+        self._update_order()
+
+        self.changePersistentIndexList(
+            persistent,
+            [
+                self.createIndex(self._rows[item], index.column())
+                for item, index in zip(persistent_items, persistent)
+            ],
+        )
+        self.layoutChanged.emit()
+
+    def _sort_key(self):
+        """
+        Sort key of a store index for the sort column
+        """
+        if self._sort_column == self.DURATION:
+            return self._durations.__getitem__
+        if self._sort_column == self.TITLE:
+            return self._titles.__getitem__
+        return self._paths.__getitem__
+
+    def _merge(self, sequence, items):
+        """
+        Merge store indexes into a sorted sequence of store indexes
+        Equal keys keep their order, as with a stable sort of the whole store.
+        @return: (merged array, [(position in the sequence, store index)] of
+        the merged items in sort order)
+        """
+        key = self._sort_key()
+        descending = self._sort_order == Qt.DescendingOrder
+
+        merged = array("l")
+        inserted = []
+        low = 0
+        for item in sorted(items, key=key, reverse=descending):
+            value = key(item)
+            # binary search after the items with an equal key, from the
+            # position of the previous item of the batch
+            start, high = low, len(sequence)
+            while low < high:
+                middle = (low + high) // 2
+                other = key(sequence[middle])
+                if (other < value) if descending else (value < other):
+                    high = middle
+                else:
+                    low = middle + 1
+            merged.extend(sequence[start:low])
+            merged.append(item)
+            inserted.append((low, item))
+        merged.extend(sequence[low:])
+        return merged, inserted
+
+    def _place(self, items, inserted=None):
+        """
+        Move the rows of appended items from the bottom of the view to their
+        sorted position
+        @param inserted: merge positions of the items when the view shows the
+        whole sort order
+        """
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        persistent_items = [self._order[index.row()] for index in persistent]
+
+        if inserted is None:
+            self._order, inserted = self._merge(self._order[: -len(items)], items)
+        else:
+            self._order = array("l", self._sorted)
+        self._invalidate_rows(inserted[0][0])
+
+        # an old row moves down by the items merged before it
+        positions = [position for position, _ in inserted]
+        new_rows = {item: position + n for n, (position, item) in enumerate(inserted)}
+        self.changePersistentIndexList(
+            persistent,
+            [
+                self.createIndex(
+                    new_rows.get(
+                        item, index.row() + bisect_right(positions, index.row())
+                    ),
+                    index.column(),
+                )
+                for item, index in zip(persistent_items, persistent)
+            ],
+        )
+        self.layoutChanged.emit()
+
+    def _ensure_rank(self):
+        if self._rank is None:
+            self._update_rank()
+
+    def _invalidate_rows(self, row):
+        if self._stale_row is None or row < self._stale_row:
+            self._stale_row = row
+
+    def _ensure_rows(self):
+        """
+        Bring the store index -> view row lookup up to date
+        """
+        start = self._stale_row
+        if start is None:
+            return
+        rows = self._rows
+        for row, item in enumerate(self._order[start:], start):
+            rows[item] = row
+        self._stale_row = None
+
+    def _update_rank(self):
+        """
+        Rebuild the store index -> sort position lookup
+        """
+        rank = array("l", [0]) * len(self._paths)
+        for position, item in enumerate(self._sorted):
+            rank[item] = position
+        self._rank = rank
+
+    def _update_rows(self):
+        """
+        Rebuild the store index -> view row lookup
+        """
+        rows = array("l", [-1]) * len(self._paths)
+        for row, item in enumerate(self._order):
+            rows[item] = row
+        self._rows = rows
+        self._stale_row = None
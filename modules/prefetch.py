@@ -0,0 +1,172 @@
+import os
+import time
+import threading
+
+import vlc
+
+from modules import crypto
+
+
+class Prefetcher:
+    """
+    Read-ahead of the next playlist items
+    Every time the player changes media, the items that will play next
+    are warmed on a background thread: the header and first bytes of
+    plain media are pulled into the page cache and the first chunks of
+    encrypted media are decrypted into the block cache.
+    """
+
+    def __init__(
+        self, player, depth=1, warm_bytes=8 * 1024 * 1024, rate=32 * 1024 * 1024
+    ):
+        """
+        @param player: Player instance
+        @param depth: number of upcoming items to warm
+        @param warm_bytes: bytes warmed at the start of each item
+        @param rate: I/O bandwidth cap in bytes per second (0: unlimited)
+        """
+        self.player = player
+        self.depth = depth
+        self.warm_bytes = warm_bytes
+        self.rate = rate
+
+        # size of the individual reads, small enough to honour the rate cap
+        self.read_size = 256 * 1024
+
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+        # bumped on every media change, stale warm ups stop early
+        self._generation = 0
+
+        # recently warmed paths, not warmed twice in a row
+        self._warmed = []
+
+        self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+        self._thread.start()
+
+        self.player.event_manager_attach_changed(self.media_changed)
+
+    def media_changed(self, *event):
+        """
+        libvlc event callback, only wakes up the prefetch thread
+        """
+        self._generation += 1
+        self._wake.set()
+
+    def stop(self):
+        """
+        Stop the prefetch thread
+        """
+        self._stopped.set()
+        self._wake.set()
+
+    def next_indexes(self):
+        """
+        Playlist indexes that will play after the current media
+        """
+        count = len(self.player.paths)
+        current = self.player.media_list_index_of_item()
+        if count == 0 or current < 0:
+            return []
+
+        mode = self.player.mode
+        if mode == vlc.PlaybackMode.repeat:
+            # the current media plays again, it is already cached
+            return []
+
+        indexes = []
+        for step in range(1, self.depth + 1):
+            index = current + step
+            if mode == vlc.PlaybackMode.loop:
+                index %= count
+            elif index >= count:
+                break
+            if index != current and index not in indexes:
+                indexes.append(index)
+        return indexes
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+
+            generation = self._generation
+            try:
+                paths = [self.player.media_path(index) for index in self.next_indexes()]
+            except Exception:
+                continue
+
+            for path in paths:
+                if path is None or path in self._warmed:
+                    continue
+                if not self._warm(path, generation):
+                    break
+                self._warmed = (self._warmed + [path])[-max(self.depth * 2, 2) :]
+
+    def _stale(self, generation):
+        return self._stopped.is_set() or generation != self._generation
+
+    def _warm(self, path, generation):
+        """
+        Warm the beginning of a media file
+        @return: False if the warm up was interrupted
+        """
+        try:
+            if crypto.is_encrypted(path):
+                return self._warm_encrypted(path, generation)
+            return self._warm_plain(path, generation)
+        except (OSError, ValueError, LookupError, RuntimeError):
+            return True
+
+    def _warm_plain(self, path, generation):
+        """
+        Page-cache read-ahead of a plain media file
+        """
+        with open(path, "rb", buffering=0) as media_file:
+            fd = media_file.fileno()
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, self.warm_bytes, os.POSIX_FADV_WILLNEED)
+
+            # network mounts ignore the advice, read the data through
+            buffer = bytearray(self.read_size)
+            started = time.monotonic()
+            total = 0
+            while total < self.warm_bytes:
+                if self._stale(generation):
+                    return False
+                read = media_file.readinto(buffer)
+                if not read:
+                    break
+                total += read
+                self._throttle(total, started)
+        return True
+
+    def _warm_encrypted(self, path, generation):
+        """
+        Decrypt the first chunks of an encrypted media into the block cache
+        """
+        reader = crypto.DecryptingReader(path, crypto.load_key())
+        try:
+            chunks = -(-min(self.warm_bytes, reader.size) // reader.chunk_size)
+            started = time.monotonic()
+            for index in range(chunks):
+                if self._stale(generation):
+                    return False
+                reader.chunk(index)
+                self._throttle((index + 1) * reader.chunk_size, started)
+        finally:
+            reader.close()
+        return True
+
+    def _throttle(self, total, started):
+        """
+        Sleep to keep the warm up below the bandwidth cap
+        """
+        if not self.rate:
+            return
+        ahead = total / self.rate - (time.monotonic() - started)
+        if ahead > 0:
+            time.sleep(ahead)
@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import vlc
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from modules.metadata import parse_media
+
+
+class MediaProber(QObject):
+    """
+    Background media metadata prober
+    Parses media on a pool of worker threads and reports the results
+    through a Qt signal delivered on the GUI thread
+    """
+
+    # (mrl, duration in ms, title) emitted once a media has been parsed
+    probed = pyqtSignal(str, int, str)
+
+    def __init__(self, max_workers=4, timeout=5000, cache=None, parent=None):
+        super(MediaProber, self).__init__(parent)
+
+        # parse timeout in ms
+        self.timeout = timeout
+
+        # optional MetadataCache consulted before parsing
+        self.cache = cache
+
+        # Separate libvlc instance, no output modules are needed to parse
+        self.instance = vlc.Instance("--quiet", "--no-video", "--no-audio")
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="prober"
+        )
+        self._lock = threading.Lock()
+        self._pending = {}
+
+        # bumped on cancel so that in flight probes drop their results
+        self._generation = 0
+
+    def probe(self, mrls):
+        """
+        Queue media files to be parsed
+        """
+        with self._lock:
+            for mrl in mrls:
+                if mrl in self._pending:
+                    continue
+                self._pending[mrl] = self._executor.submit(
+                    self._probe, mrl, self._generation
+                )
+
+    def cancel(self):
+        """
+        Cancel all the pending probes
+        """
+        with self._lock:
+            self._generation += 1
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+
+    def shutdown(self):
+        """
+        Cancel pending probes and stop the worker threads
+        """
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def pending_count(self):
+        """
+        Number of media waiting to be parsed
+        """
+        return len(self._pending)
+
+    def _probe(self, mrl, generation):
+        """
+        Worker: parse a single media file
+        """
+        if generation != self._generation:
+            return
+
+        meta = self.cache.get(mrl) if self.cache is not None else None
+
+        if meta is None:
+            try:
+                meta = parse_media(self.instance, mrl, self.timeout)
+            except Exception:
+                meta = {"duration": -1, "title": ""}
+            else:
+                # timed out or failed parses are retried next time
+                if self.cache is not None and meta["duration"] >= 0:
+                    self.cache.put(mrl, meta)
+
+        with self._lock:
+            # playlist was cleared while parsing
+            if generation != self._generation:
+                return
+            self._pending.pop(mrl, None)
+
+        self.probed.emit(mrl, meta["duration"], meta["title"])
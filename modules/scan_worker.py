@@ -0,0 +1,133 @@
+import os
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from modules.scanner import scan_media
+from modules.library import InotifyWatcher
+
+
+class ScanWorker(QObject):
+    """
+    Background media scanner
+    Runs scan_media on a thread and streams the batches of ScanEntry
+    found to the GUI thread through Qt signals
+    """
+
+    # list of ScanEntry
+    found = pyqtSignal(list)
+
+    # emitted with the scanned folders once a scan has walked them all
+    finished = pyqtSignal(list)
+
+    def __init__(self, ext, workers=8, max_depth=None, index=None, parent=None):
+        """
+        @param index: optional LibraryIndex used to skip unchanged folders
+        """
+        super(ScanWorker, self).__init__(parent)
+
+        self.ext = ext
+        self.workers = workers
+        self.max_depth = max_depth
+        self.index = index
+
+        # cancel events of the running scans
+        self._scans = set()
+        self._lock = threading.Lock()
+
+    def start(self, paths):
+        """
+        Scan files and folders in the background
+        """
+        cancel = threading.Event()
+        with self._lock:
+            self._scans.add(cancel)
+
+        thread = threading.Thread(
+            target=self._run, args=(list(paths), cancel), name="scan", daemon=True
+        )
+        thread.start()
+
+    def cancel(self):
+        """
+        Cancel all the running scans
+        """
+        with self._lock:
+            for cancel in self._scans:
+                cancel.set()
+            self._scans.clear()
+
+    def _run(self, paths, cancel):
+        """
+        Worker: stream the scan results
+        """
+        try:
+            for batch in scan_media(
+                paths,
+                self.ext,
+                workers=self.workers,
+                max_depth=self.max_depth,
+                cancel=cancel,
+                index=self.index,
+            ):
+                if cancel.is_set():
+                    return
+                self.found.emit(batch)
+        finally:
+            with self._lock:
+                self._scans.discard(cancel)
+
+        if cancel.is_set():
+            return
+
+        if self.index is not None:
+            self.index.save()
+
+        self.finished.emit([os.fspath(path) for path in paths if os.path.isdir(path)])
+
+
+class LibraryWatcher(QObject):
+    """
+    Qt side of the inotify watcher
+    Re-emits the media files added to or removed from the watched folders
+    on the GUI thread
+    """
+
+    # (added paths, removed paths)
+    changed = pyqtSignal(list, list)
+
+    def __init__(self, index, ext, parent=None):
+        super(LibraryWatcher, self).__init__(parent)
+
+        self._watcher = None
+        if InotifyWatcher.available():
+            try:
+                self._watcher = InotifyWatcher(index, ext, self.changed.emit)
+            except OSError:
+                self._watcher = None
+            else:
+                self._watcher.start()
+
+    def watch(self, folders):
+        """
+        Watch folders and their sub folders for added and removed media
+        """
+        if self._watcher is None:
+            return
+        for folder in folders:
+            self._watcher.watch(folder)
+
+    def unwatch_all(self):
+        """
+        Stop watching the folders watched so far
+        """
+        if self._watcher is not None:
+            self._watcher.unwatch_all()
+
+    def stop(self):
+        """
+        Stop the watcher thread
+        """
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
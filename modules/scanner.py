@@ -0,0 +1,200 @@
+import os
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# File found by the scanner, times are in seconds since the epoch
+ScanEntry = namedtuple("ScanEntry", ["path", "size", "mtime", "ctime"])
+
+# end of a directory scan task
+_DONE = object()
+
+
+def scan_tree(
+    roots,
+    ext,
+    workers=8,
+    batch_size=256,
+    max_depth=None,
+    follow_symlinks=True,
+    cancel=None,
+    on_folder=None,
+):
+    """
+    Scan folders for a given file extension(eg .bin , .mp4) on a thread pool
+    Generator yielding lists of ScanEntry as soon as they are found, the
+    stat results of the directory entries are reused so every file is
+    only stat'ed once.
+
+    @param roots: folder or list of folders to scan
+    @param ext: file extension(s) to match
+    @param workers: number of directories scanned in parallel
+    @param batch_size: maximum number of entries per yielded batch
+    @param max_depth: maximum folder depth below the roots (None: unlimited)
+    @param follow_symlinks: descend into symlinked folders
+    @param cancel: threading.Event stopping the scan once set
+    @param on_folder: optional callable(folder, st_mtime_ns, dir names, files)
+    called from the workers with every folder listed in full, files are
+    [name, size, mtime, ctime] lists of all the files of the folder
+    """
+    if isinstance(roots, (str, os.PathLike)):
+        roots = [roots]
+    if isinstance(ext, str):
+        ext = (ext,)
+    ext = tuple(e.lower() for e in ext)
+
+    cancel = cancel or threading.Event()
+    results = queue.Queue()
+
+    # set once the generator is closed or exhausted
+    stopped = threading.Event()
+
+    def cancelled():
+        return cancel.is_set() or stopped.is_set()
+
+    # (st_dev, st_ino) of visited folders, protects against symlink loops
+    visited = set()
+    visited_lock = threading.Lock()
+
+    def first_visit(stat):
+        key = (stat.st_dev, stat.st_ino)
+        with visited_lock:
+            if key in visited:
+                return False
+            visited.add(key)
+            return True
+
+    def scan_dir(path, depth, mtime_ns):
+        """
+        Worker: scan a single folder and queue its sub folders
+        """
+        found = []
+        dirs, files = [], []
+        try:
+            if cancelled():
+                return
+
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if cancelled():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=follow_symlinks):
+                            dirs.append(entry.name)
+                            if max_depth is not None and depth >= max_depth:
+                                continue
+                            stat = entry.stat()
+                            if first_visit(stat):
+                                submit(entry.path, depth + 1, stat.st_mtime_ns)
+                        elif entry.is_file():
+                            media = os.path.splitext(entry.name)[1].lower() in ext
+                            if not media and on_folder is None:
+                                continue
+                            stat = entry.stat()
+                            if media:
+                                found.append(
+                                    ScanEntry(
+                                        entry.path,
+                                        stat.st_size,
+                                        stat.st_mtime,
+                                        stat.st_ctime,
+                                    )
+                                )
+                            if on_folder is not None:
+                                files.append(
+                                    [
+                                        entry.name,
+                                        stat.st_size,
+                                        stat.st_mtime,
+                                        stat.st_ctime,
+                                    ]
+                                )
+                    except OSError:
+                        # vanished or unreadable entry
+                        continue
+
+            if on_folder is not None:
+                on_folder(path, mtime_ns, dirs, files)
+        except OSError:
+            pass
+        finally:
+            results.put((found, _DONE))
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scanner")
+
+    # number of folders queued and not scanned yet
+    outstanding = [0]
+
+    def submit(path, depth, mtime_ns):
+        with visited_lock:
+            outstanding[0] += 1
+        try:
+            executor.submit(scan_dir, path, depth, mtime_ns)
+        except RuntimeError:
+            # executor shut down (scan cancelled)
+            results.put(([], _DONE))
+
+    try:
+        for root in roots:
+            try:
+                stat = os.stat(root)
+            except OSError:
+                continue
+            if first_visit(stat):
+                submit(os.fspath(root), 0, stat.st_mtime_ns)
+
+        batch = []
+        while outstanding[0] and not cancel.is_set():
+            found, _ = results.get()
+            with visited_lock:
+                outstanding[0] -= 1
+            batch.extend(found)
+
+            # stream what is available instead of waiting for a full batch
+            while len(batch) >= batch_size or (batch and results.empty()):
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+
+        if batch and not cancel.is_set():
+            yield batch
+    finally:
+        # generator closed or exhausted: stop the remaining workers
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scan_media(paths, ext, index=None, **kwargs):
+    """
+    Scan a mix of files and folders
+    The files are yielded first as a single batch, then the folders are
+    scanned with scan_tree, or through the library index when one is given.
+    Folders missing from the index are walked on the scan_tree thread pool
+    and indexed on the way.
+    """
+    files, folders = [], []
+    for path in paths:
+        path = os.fspath(path)
+        if os.path.isdir(path):
+            folders.append(path)
+        elif os.path.isfile(path):
+            stat = os.stat(path)
+            files.append(ScanEntry(path, stat.st_size, stat.st_mtime, stat.st_ctime))
+
+    if files:
+        yield files
+
+    if folders and index is not None:
+        folders = [os.path.abspath(folder) for folder in folders]
+        indexed = [folder for folder in folders if index.indexed(folder)]
+        unindexed = [folder for folder in folders if not index.indexed(folder)]
+
+        if unindexed:
+            yield from scan_tree(unindexed, ext, on_folder=index.store_folder, **kwargs)
+        if indexed:
+            # the index walks the folders on a single thread, only the
+            # changed folders are listed again
+            kwargs.pop("workers", None)
+            yield from index.scan(indexed, ext, **kwargs)
+    elif folders:
+        yield from scan_tree(folders, ext, **kwargs)
@@ -0,0 +1,110 @@
+import os
+import unicodedata
+from array import array
+from functools import partial
+from collections import defaultdict
+
+
+def normalize(text):
+    """
+    Case and accent insensitive form of a string used for matching
+    """
+    if text.isascii():
+        return text.lower()
+
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in text if not unicodedata.combining(char)).casefold()
+
+
+def trigrams(text):
+    """
+    Set of the 3 character substrings of a string
+    """
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """
+    Playlist search index
+    Titles are indexed by trigram and by word prefix (1 and 2 characters)
+    and folder names are matched separately, there are far less folders
+    than media. Posting lists are compact arrays of document ids.
+    """
+
+    # word separators of the media file names
+    separators = " ._-()[]"
+
+    def __init__(self):
+        self._titles = {}
+        self._trigrams = defaultdict(partial(array, "l"))
+        self._prefixes = defaultdict(partial(array, "l"))
+
+        # normalized folder name -> document ids
+        self._folders = defaultdict(partial(array, "l"))
+
+        self._table = str.maketrans(self.separators, " " * len(self.separators))
+
+    def add(self, doc_id, path):
+        """
+        Index the title and folder name of a media path
+        """
+        folder, title = os.path.split(path)
+        title = normalize(title)
+        self._titles[doc_id] = title
+
+        index = self._trigrams
+        for trigram in trigrams(title):
+            index[trigram].append(doc_id)
+
+        index = self._prefixes
+        words = title.translate(self._table).split()
+        for prefix in {word[:1] for word in words} | {word[:2] for word in words}:
+            index[prefix].append(doc_id)
+
+        self._folders[normalize(os.path.basename(folder))].append(doc_id)
+
+    def clear(self):
+        """
+        Remove all the documents
+        """
+        self._titles = {}
+        self._trigrams.clear()
+        self._prefixes.clear()
+        self._folders.clear()
+
+    def __len__(self):
+        return len(self._titles)
+
+    def query(self, text):
+        """
+        Search the media titles and folders
+        @return: set of matching document ids, None for an empty query
+        """
+        text = normalize(text.strip())
+        if not text:
+            return None
+
+        if len(text) < 3:
+            # short queries match the beginning of the title words
+            return set(self._prefixes.get(text, ()))
+        else:
+            # the rarest trigram gives the smallest candidate list
+            postings = []
+            for trigram in trigrams(text):
+                found = self._trigrams.get(trigram)
+                if found is None:
+                    postings = []
+                    break
+                postings.append(found)
+
+            matches = set()
+            if postings:
+                titles = self._titles
+                candidates = min(postings, key=len)
+                matches = {doc_id for doc_id in candidates if text in titles[doc_id]}
+
+        for folder, doc_ids in self._folders.items():
+            if text in folder:
+                matches.update(doc_ids)
+
+        return matches
@@ -0,0 +1,151 @@
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+
+
+class SeekScheduler(QObject):
+    """
+    Seek coalescing for key autorepeat
+    Relative seeks accumulate into a target position, at most one seek is
+    sent to libvlc per interval. While the key is held the seeks are fast
+    (keyframe) seeks, a precise seek to the target is done once the key
+    has been released.
+    """
+
+    def __init__(
+        self,
+        media_player,
+        interval=120,
+        release_delay=300,
+        end_margin=1000,
+        on_seek=None,
+        on_end=None,
+        parent=None,
+    ):
+        """
+        @param media_player: vlc.MediaPlayer
+        @param interval: minimum delay(ms) between two seeks
+        @param release_delay: delay(ms) without seek request meaning the key
+        was released
+        @param end_margin: seeks stop this many ms before the end of the media
+        @param on_seek: called with the target time(ms) of every request
+        @param on_end: called when seeking forward at the end of the media
+        """
+        super(SeekScheduler, self).__init__(parent)
+
+        self.media_player = media_player
+        self.end_margin = end_margin
+        self.on_seek = on_seek
+        self.on_end = on_end
+
+        # target time(ms) of the pending seeks, None when idle
+        self.target = None
+        self._sent = None
+        self._held = False
+
+        # the last seek sent was a precise (set_time) seek
+        self._sent_precise = False
+
+        # media the target belongs to, seeks are dropped on media change
+        self._media = None
+
+        self._last_request = 0.0
+        self.release_delay = release_delay / 1000
+
+        # seek rate limit
+        self._tick = QTimer(self)
+        self._tick.setInterval(interval)
+        self._tick.timeout.connect(self._flush)
+
+    def seek_by(self, delta):
+        """
+        Request a relative seek of delta ms
+        """
+        length = self.media_player.get_length()
+        if length <= 0:
+            return
+
+        now = time.monotonic()
+        if self.target is None:
+            # the player time lags behind pending seeks, only read it when idle
+            self.target = max(self.media_player.get_time(), 0)
+            self._media = self._current_mrl()
+        else:
+            self._held = now - self._last_request < self.release_delay
+        self._last_request = now
+
+        last = max(length - self.end_margin, 0)
+        if delta > 0 and self.target >= last:
+            # already at the end: play the next media
+            self.cancel()
+            if self.on_end is not None:
+                self.on_end()
+            return
+
+        self.target = min(max(self.target + delta, 0), last)
+
+        if self.on_seek is not None:
+            self.on_seek(self.target)
+
+        if not self._tick.isActive():
+            # first request of a burst is sent right away
+            self._send(precise=False)
+            self._tick.start()
+
+    def cancel(self):
+        """
+        Drop the pending seeks
+        """
+        self._tick.stop()
+        self.target = None
+        self._sent = None
+        self._sent_precise = False
+        self._held = False
+        self._media = None
+
+    def _flush(self):
+        """
+        Timer: send the accumulated target, precisely once the key is released
+        """
+        released = time.monotonic() - self._last_request >= self.release_delay
+
+        if not released:
+            if self.target != self._sent:
+                self._send(precise=False)
+            return
+
+        if self.target != self._sent or not self._sent_precise:
+            self._send(precise=True)
+        self.cancel()
+
+    def _send(self, precise):
+        if self.target is None:
+            return
+        if self._current_mrl() != self._media:
+            # the playlist moved on, the target is meaningless
+            self.cancel()
+            return
+
+        self._sent_precise = precise or not self._held
+        if self._sent_precise:
+            self.media_player.set_time(int(self.target))
+        else:
+            self._fast_seek(self.target)
+        self._sent = self.target
+
+    def _current_mrl(self):
+        media = self.media_player.get_media()
+        return media.get_mrl() if media is not None else None
+
+    def _fast_seek(self, target):
+        """
+        Keyframe seek (libvlc 4 fast mode), a plain position seek otherwise
+        """
+        length = self.media_player.get_length()
+        if length <= 0:
+            return
+        position = target / length
+        try:
+            self.media_player.set_position(position, True)
+        except TypeError:
+            self.media_player.set_position(position)
@@ -0,0 +1,388 @@
+import os
+import sys
+import mmap
+import struct
+from collections import namedtuple
+
+from modules.cache import data_directory, path_from_mrl
+
+# Playlist/session file (.evpl), little endian:
+#   header | records | sorted index (optional) | string table
+# Records are fixed width (path and title slices of the string table and
+# the duration), the sorted index lists the record numbers by path.
+MAGIC = b"EVPL"
+VERSION = 1
+
+# magic, version, flags, count, current index, playback mode, position(ms),
+# records offset, index offset, strings offset, strings size
+HEADER = struct.Struct("<4sHHIiIqQQQQ")
+
+# path offset, path size, title offset, title size, duration(ms)
+RECORD = struct.Struct("<IIIIq")
+
+INDEX = struct.Struct("<I")
+
+FLAG_SORTED_INDEX = 1
+
+# duration of a media that has not been parsed
+UNKNOWN = -1
+
+PlaylistEntry = namedtuple("PlaylistEntry", "path duration title")
+
+
+def session_path():
+    """
+    File of the last session
+    """
+    return os.path.join(data_directory(), "session.evpl")
+
+
+def _encode(text):
+    # paths are not always valid utf-8, keep their bytes
+    return os.fsencode(text) if text else b""
+
+
+def _decode(data):
+    return os.fsdecode(bytes(data))
+
+
+def write_playlist(path, entries, current=-1, position=0, mode=0, sorted_index=True):
+    """
+    Write a playlist or session file, atomically
+    @param entries: iterable of PlaylistEntry or (path, duration, title)
+    @param current: index of the current media, -1 if none
+    @param position: time(ms) in the current media
+    @param mode: playback mode value
+    @param sorted_index: add the index used by find()
+    @return: number of entries written
+    """
+    strings = bytearray()
+    records = bytearray()
+    offsets = {}
+    paths = []
+
+    def intern(data):
+        # titles often repeat (e.g. empty), store every string once
+        offset = offsets.get(data)
+        if offset is None:
+            offset = offsets[data] = len(strings)
+            strings.extend(data)
+        return offset
+
+    for entry_path, duration, title in entries:
+        encoded_path = _encode(entry_path)
+        encoded_title = _encode(title)
+        records.extend(
+            RECORD.pack(
+                intern(encoded_path),
+                len(encoded_path),
+                intern(encoded_title),
+                len(encoded_title),
+                UNKNOWN if duration is None else int(duration),
+            )
+        )
+        paths.append(encoded_path)
+
+    count = len(paths)
+    index = bytearray()
+    if sorted_index:
+        for number in sorted(range(count), key=paths.__getitem__):
+            index.extend(INDEX.pack(number))
+
+    records_offset = HEADER.size
+    index_offset = records_offset + len(records)
+    strings_offset = index_offset + len(index)
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        FLAG_SORTED_INDEX if sorted_index else 0,
+        count,
+        current,
+        int(mode),
+        int(position),
+        records_offset,
+        index_offset,
+        strings_offset,
+        len(strings),
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    partial = f"{path}.part"
+    with open(partial, "wb") as output:
+        output.write(header)
+        output.write(records)
+        output.write(index)
+        output.write(strings)
+    os.replace(partial, path)
+    return count
+
+
+class PlaylistFile:
+    """
+    Memory mapped playlist/session file
+    Opening only reads the header, entries are decoded when accessed.
+    """
+
+    def __init__(self, path):
+        self.filename = path
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path}: not a playlist file")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        (
+            magic,
+            version,
+            self.flags,
+            self.count,
+            self.current,
+            self.mode,
+            self.position,
+            self._records,
+            self._index,
+            self._strings,
+            strings_size,
+        ) = HEADER.unpack_from(self._map, 0)
+
+        if magic != MAGIC or version > VERSION:
+            self.close()
+            raise ValueError(f"{path}: unsupported playlist file")
+        if (
+            self._strings + strings_size > size
+            or self._records + self.count * RECORD.size > size
+            or (
+                self.flags & FLAG_SORTED_INDEX
+                and self._index + self.count * INDEX.size > size
+            )
+        ):
+            self.close()
+            raise ValueError(f"{path}: truncated playlist file")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        if not 0 <= number < self.count:
+            raise IndexError(number)
+        return self._entry(number)
+
+    def __iter__(self):
+        for number in range(self.count):
+            yield self._entry(number)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _record(self, number):
+        return RECORD.unpack_from(self._map, self._records + number * RECORD.size)
+
+    def _string(self, offset, size):
+        start = self._strings + offset
+        return _decode(self._map[start : start + size])
+
+    def _entry(self, number):
+        path_offset, path_size, title_offset, title_size, duration = self._record(
+            number
+        )
+        return PlaylistEntry(
+            self._string(path_offset, path_size),
+            duration,
+            self._string(title_offset, title_size),
+        )
+
+    def path(self, number):
+        path_offset, path_size, _, _, _ = self._record(number)
+        return self._string(path_offset, path_size)
+
+    def duration(self, number):
+        return self._record(number)[4]
+
+    def entries(self, start=0, stop=None):
+        """
+        Entries start to stop, decoded in bulk
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return []
+        records = self._map[
+            self._records + start * RECORD.size : self._records + stop * RECORD.size
+        ]
+        strings = memoryview(self._map)[self._strings :]
+        encoding = sys.getfilesystemencoding()
+        try:
+            return [
+                PlaylistEntry(
+                    bytes(strings[path_offset : path_offset + path_size]).decode(
+                        encoding, "surrogateescape"
+                    ),
+                    duration,
+                    bytes(strings[title_offset : title_offset + title_size]).decode(
+                        encoding, "surrogateescape"
+                    ),
+                )
+                for path_offset, path_size, title_offset, title_size, duration in (
+                    RECORD.iter_unpack(records)
+                )
+            ]
+        finally:
+            strings.release()
+
+    def paths(self):
+        """
+        All the paths, in playlist order
+        """
+        end = self._records + self.count * RECORD.size
+        strings = self._map[self._strings :]
+        encoding = sys.getfilesystemencoding()
+        return [
+            strings[offset : offset + size].decode(encoding, "surrogateescape")
+            for offset, size, _, _, _ in RECORD.iter_unpack(
+                self._map[self._records : end]
+            )
+        ]
+
+    def titles(self):
+        """
+        All the titles, in playlist order ("" if unknown)
+        """
+        end = self._records + self.count * RECORD.size
+        strings = self._map[self._strings :]
+        encoding = sys.getfilesystemencoding()
+        return [
+            strings[offset : offset + size].decode(encoding, "surrogateescape")
+            for _, _, offset, size, _ in RECORD.iter_unpack(
+                self._map[self._records : end]
+            )
+        ]
+
+    def durations(self):
+        """
+        All the durations(ms), in playlist order
+        """
+        end = self._records + self.count * RECORD.size
+        return [
+            record[4] for record in RECORD.iter_unpack(self._map[self._records : end])
+        ]
+
+    def find(self, path):
+        """
+        Entry number of a path, -1 if it is not listed
+        Binary search on the sorted index, linear scan without one.
+        """
+        key = _encode(path)
+        if not self.flags & FLAG_SORTED_INDEX:
+            for number in range(self.count):
+                if _encode(self.path(number)) == key:
+                    return number
+            return -1
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            number = INDEX.unpack_from(self._map, self._index + middle * INDEX.size)[0]
+            path_offset, path_size, _, _, _ = self._record(number)
+            start = self._strings + path_offset
+            candidate = self._map[start : start + path_size]
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return number
+        return -1
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+# -----------------------------------------------------------------------------
+# M3U / M3U8
+# -----------------------------------------------------------------------------
+def read_m3u(path):
+    """
+    Stream the entries of an M3U/M3U8 playlist
+    Relative entries are resolved against the playlist folder.
+    @return: generator of PlaylistEntry (duration in ms, UNKNOWN if absent)
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    duration, title = UNKNOWN, ""
+
+    with open(path, encoding="utf-8-sig", errors="surrogateescape") as playlist:
+        for line in playlist:
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.startswith("#EXTINF:"):
+                info, _, title = line[len("#EXTINF:") :].partition(",")
+                try:
+                    seconds = float(info.split()[0])
+                except (ValueError, IndexError):
+                    seconds = -1
+                duration = int(seconds * 1000) if seconds >= 0 else UNKNOWN
+                title = title.strip()
+                continue
+            if line.startswith("#"):
+                continue
+
+            if line.startswith("file://"):
+                line = path_from_mrl(line)
+            elif "://" not in line and not os.path.isabs(line):
+                line = os.path.normpath(os.path.join(folder, line))
+
+            yield PlaylistEntry(line, duration, title)
+            duration, title = UNKNOWN, ""
+
+
+def write_m3u(path, entries):
+    """
+    Stream entries to an extended M3U playlist (utf-8)
+    @param entries: iterable of PlaylistEntry or (path, duration, title)
+    @return: number of entries written
+    """
+    count = 0
+    partial = f"{path}.part"
+    with open(partial, "w", encoding="utf-8", errors="surrogateescape") as playlist:
+        playlist.write("#EXTM3U\n")
+        for entry_path, duration, title in entries:
+            seconds = -1 if duration is None or duration < 0 else duration // 1000
+            title = (title or os.path.basename(entry_path)).replace("\n", " ")
+            playlist.write(f"#EXTINF:{seconds},{title}\n{entry_path}\n")
+            count += 1
+    os.replace(partial, path)
+    return count
+
+
+def read_entries(path):
+    """
+    Entries of a playlist file of any supported format
+    """
+    if os.path.splitext(path)[1].lower() in (".m3u", ".m3u8"):
+        yield from read_m3u(path)
+        return
+    with PlaylistFile(path) as playlist:
+        yield from playlist
+
+
+def write_entries(path, entries, **session):
+    """
+    Write entries in the format matching the file extension
+    @param session: current, position and mode (.evpl only)
+    """
+    if os.path.splitext(path)[1].lower() in (".m3u", ".m3u8"):
+        return write_m3u(path, entries)
+    return write_playlist(path, entries, **session)
@@ -0,0 +1,190 @@
+import os
+import time
+import hashlib
+
+import vlc
+
+from modules.crypto import open_media, read_thumbnail
+
+# bytes hashed at the start and at the end of a media file
+SAMPLE_SIZE = 64 * 1024
+
+# headless libvlc instance of a snapshot worker process
+_instance = None
+
+
+def cache_directory():
+    """
+    User cache directory of the application (XDG cache home on linux)
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "everest")
+
+
+def content_key(path, size):
+    """
+    Thumbnail key of a media file
+    The content hash covers the file size and its first and last bytes,
+    hashing whole video files would cost more than decoding a frame.
+    @param size: (width, height) of the thumbnail
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as media_file:
+        file_size = os.fstat(media_file.fileno()).st_size
+        digest.update(file_size.to_bytes(8, "little"))
+        digest.update(media_file.read(SAMPLE_SIZE))
+        if file_size > SAMPLE_SIZE * 2:
+            media_file.seek(-SAMPLE_SIZE, os.SEEK_END)
+            digest.update(media_file.read(SAMPLE_SIZE))
+    return f"{digest.hexdigest()}-{size[0]}x{size[1]}"
+
+
+class ThumbnailCache:
+    """
+    Thumbnail files keyed by content hash and size
+    The least recently used files are evicted once the directory grows
+    above its size budget.
+    """
+
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024, extension=".png"):
+        """
+        @param directory: cache directory, defaults to the user cache dir
+        @param max_bytes: size budget of the cached thumbnails
+        """
+        if directory is None:
+            directory = os.path.join(cache_directory(), "thumbnails")
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = os.path.normpath(directory)
+        self.max_bytes = max_bytes
+        self.extension = extension
+
+    def path(self, key):
+        """
+        File of a thumbnail, sharded on the first key characters
+        """
+        return os.path.join(self.directory, key[:2], key + self.extension)
+
+    def get(self, key):
+        """
+        Path of a cached thumbnail or None
+        """
+        path = self.path(key)
+        try:
+            # the modification time doubles as the last access time
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def evict(self):
+        """
+        Remove the least recently used thumbnails above the size budget
+        @return: number of removed files
+        """
+        files = []
+        total = 0
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        removed = 0
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+def _init_worker():
+    """
+    Process pool initializer, one headless libvlc instance per process
+    """
+    global _instance
+    _instance = vlc.Instance(
+        "--quiet", "--no-audio", "--vout=dummy", "--no-snapshot-preview"
+    )
+
+
+def worker_instance():
+    """
+    Headless libvlc instance of the worker process
+    """
+    if _instance is None:
+        _init_worker()
+    return _instance
+
+
+def take_snapshot(path, output, size, position=0.1, timeout=10.0):
+    """
+    Decode a frame of a media and save it as an image (worker process)
+    @param output: image file, written atomically
+    @param size: (width, height), a 0 dimension keeps the aspect ratio
+    @param position: relative position of the frame
+    @return: output path or None if no frame could be decoded
+    """
+    # indexed containers carry a thumbnail made at ingest
+    thumbnail = read_thumbnail(path, size)
+    if thumbnail is not None:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        partial = f"{output}.{os.getpid()}.part"
+        with open(partial, "wb") as image:
+            image.write(thumbnail)
+        os.replace(partial, output)
+        return output
+
+    instance = worker_instance()
+    media_player = instance.media_player_new()
+    media = open_media(instance, path)
+    media_player.set_media(media)
+    media_player.audio_set_mute(True)
+
+    try:
+        if media_player.play() < 0:
+            return None
+
+        deadline = time.monotonic() + timeout
+        if not _wait(lambda: media_player.has_vout() > 0, deadline):
+            return None
+
+        media_player.set_position(position)
+        start = media_player.get_time()
+        # wait for a decoded frame past the seek
+        _wait(lambda: media_player.get_time() != start, deadline)
+
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        partial = f"{output}.{os.getpid()}.part{os.path.splitext(output)[1]}"
+        while time.monotonic() < deadline:
+            if media_player.video_take_snapshot(0, partial, size[0], size[1]) == 0:
+                if _wait(lambda: os.path.exists(partial), deadline):
+                    os.replace(partial, output)
+                    return output
+            time.sleep(0.05)
+        return None
+    finally:
+        media_player.stop()
+        media_player.release()
+        media.release()
+
+
+def _wait(condition, deadline, interval=0.02):
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
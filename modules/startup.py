@@ -0,0 +1,75 @@
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """
+    Per-phase timing of the application startup
+    Phases are timed from the process start (first import of this module)
+    and printed as a table once startup is complete.
+    """
+
+    def __init__(self, enabled=False):
+        """
+        @param enabled: print the report (--profile-startup)
+        """
+        self.enabled = enabled
+        self.started = _process_start
+
+        # (phase, start offset, duration) in seconds
+        self.phases = []
+        self._last = self.started
+        self._reported = False
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the enclosed block as a startup phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases.append((name, start - self.started, end - start))
+            self._last = end
+
+    def mark(self, name):
+        """
+        Record the time elapsed since the end of the previous phase
+        (e.g. waiting for the event loop)
+        """
+        now = time.perf_counter()
+        self.phases.append((name, self._last - self.started, now - self._last))
+        self._last = now
+
+    def elapsed(self):
+        """
+        Seconds since the process start
+        """
+        return time.perf_counter() - self.started
+
+    def report(self, stream=None):
+        """
+        Print the timing breakdown, once
+        """
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+
+        stream = stream or sys.stderr
+        width = max((len(name) for name, _, _ in self.phases), default=5)
+        print(f"{'phase':<{width}}  {'start ms':>9}  {'time ms':>9}", file=stream)
+        for name, start, duration in self.phases:
+            print(
+                f"{name:<{width}}  {start * 1000:>9.1f}  {duration * 1000:>9.1f}",
+                file=stream,
+            )
+        print(
+            f"{'total':<{width}}  {'':>9}  {self.elapsed() * 1000:>9.1f}", file=stream
+        )
+
+
+# interpreter start is not available, the first import is close enough
+_process_start = time.perf_counter()
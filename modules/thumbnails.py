@@ -0,0 +1,166 @@
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from modules.snapshot import ThumbnailCache, content_key, take_snapshot, _init_worker
+
+log = logging.getLogger(__name__)
+
+
+class ThumbnailService(QObject):
+    """
+    Background thumbnail generation
+    Frames are decoded by a pool of headless libvlc processes and kept in
+    a disk cache keyed by content hash and size. Only the media that are
+    currently requested (the visible playlist rows) are processed, older
+    requests are dropped before they reach the process pool.
+    """
+
+    # emitted with (media path, thumbnail path) once a thumbnail is available
+    ready = pyqtSignal(str, str)
+
+    def __init__(
+        self, size=(64, 36), max_workers=2, max_bytes=64 * 1024 * 1024, parent=None
+    ):
+        """
+        @param size: (width, height) of the thumbnails
+        @param max_workers: number of snapshot processes
+        @param max_bytes: size budget of the thumbnail cache
+        """
+        super(ThumbnailService, self).__init__(parent)
+
+        self.size = tuple(size)
+        self.cache = ThumbnailCache(max_bytes=max_bytes)
+
+        self._lock = threading.Lock()
+
+        # media path -> thumbnail path (None: no frame could be decoded)
+        self._done = {}
+        # media paths of the latest request and the ones in the process pool
+        self._wanted = set()
+        self._running = {}
+
+        # key hashing and cache lookups, off the GUI thread
+        self._dispatcher = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="thumbnails"
+        )
+
+        # spawned processes, forking would copy the Qt and libvlc threads
+        self._pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        self._generated = 0
+
+        # thumbnails of earlier sessions may exceed the budget
+        self._dispatcher.submit(self.cache.evict)
+
+    def request(self, paths):
+        """
+        Thumbnails wanted for these media, replaces the previous request
+        """
+        with self._lock:
+            self._wanted = set(paths)
+            new = [
+                path
+                for path in paths
+                if path not in self._done and path not in self._running
+            ]
+
+            stale = [
+                future
+                for path, future in self._running.items()
+                if path not in self._wanted
+            ]
+
+        # queued snapshots of media that scrolled out of view
+        for future in stale:
+            future.cancel()
+
+        for path in new:
+            self._dispatcher.submit(self._dispatch, path)
+
+    def thumbnail(self, path):
+        """
+        Thumbnail path of a media if it has already been generated
+        """
+        with self._lock:
+            return self._done.get(path)
+
+    def forget(self):
+        """
+        Drop the known thumbnails (the cached files are kept)
+        """
+        with self._lock:
+            self._done.clear()
+            self._wanted.clear()
+
+    def shutdown(self):
+        with self._lock:
+            self._wanted.clear()
+        self._dispatcher.shutdown(wait=False)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self, path):
+        """
+        Dispatcher thread: serve from the cache or queue a snapshot
+        """
+        with self._lock:
+            if path not in self._wanted or path in self._running:
+                return
+
+        try:
+            key = content_key(path, self.size)
+        except OSError:
+            self._finish(path, None)
+            return
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._finish(path, cached)
+            return
+
+        with self._lock:
+            if path not in self._wanted:
+                return
+            try:
+                future = self._pool.submit(
+                    take_snapshot, path, self.cache.path(key), self.size
+                )
+            except RuntimeError:
+                # pool shut down
+                return
+            self._running[path] = future
+        future.add_done_callback(lambda future: self._generated_done(path, future))
+
+    def _generated_done(self, path, future):
+        with self._lock:
+            self._running.pop(path, None)
+        if future.cancelled():
+            return
+
+        try:
+            thumbnail = future.result()
+        except Exception as error:
+            # remembered as failed, the media is not tried again
+            log.debug("thumbnail %s: %s", path, error)
+            thumbnail = None
+        self._finish(path, thumbnail)
+
+        # keep the cache directory within its budget
+        self._generated += 1
+        if thumbnail is not None and self._generated % 32 == 0:
+            try:
+                self._dispatcher.submit(self.cache.evict)
+            except RuntimeError:
+                pass
+
+    def _finish(self, path, thumbnail):
+        with self._lock:
+            self._done[path] = thumbnail
+        if thumbnail is not None:
+            self.ready.emit(path, thumbnail)
@@ -0,0 +1,135 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import vlc
+
+from modules.cache import path_from_mrl
+from modules.metadata import parse_media
+
+
+class TitleResolver:
+    """
+    Non-blocking media title lookup
+    Titles are served from a memo (seeded with the playlist metadata) or
+    the metadata cache, the file name is used until a background parse
+    has found the real title. Safe to call from libvlc event callbacks.
+    """
+
+    def __init__(self, cache=None, timeout=5000):
+        """
+        @param cache: optional MetadataCache
+        @param timeout: parse timeout in ms
+        """
+        self.cache = cache
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._titles = {}
+        self._pending = set()
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="titles")
+        self._instance = None
+
+    def remember(self, path, title):
+        """
+        Store a known title (from the playlist metadata)
+        """
+        if title:
+            with self._lock:
+                self._titles[path] = title
+
+    def known(self, path):
+        """
+        Memoized or cached title of a path, "" if it has not been resolved,
+        the media is never parsed
+        """
+        with self._lock:
+            title = self._titles.get(path)
+        if title is not None:
+            return title
+
+        meta = self.cache.get(path) if self.cache is not None else None
+        title = meta["title"] if meta is not None else ""
+        self.remember(path, title)
+        return title
+
+    def forget(self):
+        """
+        Drop the memoized titles
+        """
+        with self._lock:
+            self._titles.clear()
+
+    def media_path(self, media):
+        """
+        Local path of a vlc.Media, None for callback and network media
+        """
+        mrl = media.get_mrl() if media is not None else None
+        if not mrl or not mrl.startswith("file://"):
+            return None
+        return path_from_mrl(mrl)
+
+    def resolve(self, media, on_resolved=None):
+        """
+        Title of a media, returned immediately
+        @param on_resolved: called with (path, title) from a worker thread
+        when a better title than the one returned is found
+        """
+        if media is None:
+            return ""
+
+        path = self.media_path(media)
+        if path is None:
+            # callback (encrypted) media carry their title as meta
+            return media.get_meta(vlc.Meta.Title) or ""
+
+        with self._lock:
+            title = self._titles.get(path)
+            if title is not None:
+                return title
+
+            if path not in self._pending:
+                self._pending.add(path)
+                self._executor.submit(self._resolve, path, on_resolved)
+
+        return os.path.basename(path)
+
+    def title(self, path):
+        """
+        Title of a media path, parsing it if needed (blocking)
+        """
+        with self._lock:
+            title = self._titles.get(path)
+        if title is not None:
+            return title
+
+        self._resolve(path, None)
+        with self._lock:
+            return self._titles.get(path, os.path.basename(path))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def _resolve(self, path, on_resolved):
+        """
+        Worker: look the title up in the cache or parse the media
+        """
+        try:
+            meta = self.cache.get(path) if self.cache is not None else None
+            if meta is None or not meta["title"]:
+                if self._instance is None:
+                    self._instance = vlc.Instance("--quiet", "--no-video", "--no-audio")
+                meta = parse_media(self._instance, path, self.timeout)
+                if self.cache is not None and meta["duration"] >= 0:
+                    self.cache.put(path, meta)
+            title = meta["title"] or os.path.basename(path)
+        except Exception:
+            title = os.path.basename(path)
+
+        with self._lock:
+            self._titles[path] = title
+            self._pending.discard(path)
+
+        if on_resolved is not None and title != os.path.basename(path):
+            on_resolved(path, title)
@@ -1,5 +1,18 @@
+import os
 import sys
 import vlc
+from types import SimpleNamespace
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.cache import MetadataCache
+from modules.metadata import parse_media
+from modules.crypto import open_media, integrity_listeners
+from modules.titles import TitleResolver
+from modules.osd import MarqueeOSD
+from modules.seek import SeekScheduler
+from modules.gapless import GaplessListPlayer
+from modules.helper import convert_ms
 
 
 class Player:
@@ -7,14 +20,26 @@ class Player:
     VLC wrapper class
     """
 
-    def __init__(self):
+    def __init__(self, gapless=False, crossfade=0):
         """
         Init class
         Creates a media list player and playlist
+        @param gapless: play the playlist on two media players sharing one
+        libvlc instance, the next media is opened before the current one ends
+        @param crossfade: gapless audio crossfade(ms) for media without video
         """
 
+        # libvlc instance shared by the media players and the media
+        self.instance = vlc.get_default_instance()
+
         # Create media player
-        self.media_list_player = vlc.MediaListPlayer()
+        self.gapless = gapless
+        if gapless:
+            self.media_list_player = GaplessListPlayer(
+                self.instance, crossfade=crossfade, on_swap=self.swap_media_player
+            )
+        else:
+            self.media_list_player = self.instance.media_list_player_new()
 
         # Create a media instace of the player
         self.m_instance = self.media_list_player.get_media_player()
@@ -31,35 +56,274 @@ class Player:
         # Set media playlist
         self.media_list_player.set_media_list(self.playlist)
 
+        # Paths of the playlist media, in media list order
+        self.paths = []
+
+        # Persistent media metadata cache
+        self.cache = MetadataCache()
+
+        # Memoized, non-blocking title lookup
+        self.titles = TitleResolver(self.cache)
+
+        # On screen display (marquee) with title, timestamp and status slots
+        self.osd = MarqueeOSD(self.m_instance)
+
+        # Coalesced relative seeks (fast forward/backward)
+        self.seek_step = 10000
+        self.seek = SeekScheduler(
+            self.m_instance, on_seek=self.show_seek_timestamp, on_end=self.next
+        )
+
+        # event type -> callbacks, libvlc keeps a single callback per event
+        self._event_callbacks = {}
+
+        # Bulk media insertion worker, a single thread keeps the add order
+        self._media_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="media-list"
+        )
+
+        # bumped when the playlist is cleared, pending bulk inserts are dropped
+        self._playlist_generation = 0
+
+        # encrypted media that failed verification while libvlc read them,
+        # matched against the current media on the GUI thread
+        self.integrity_errors = deque(maxlen=16)
+        integrity_listeners.append(self.integrity_failed)
+
     def event_manager(self):
         """
         MediaListPlayer  event manger
         """
         return self.media_list_player.get_media_player().event_manager()
 
+    def event_manager_attach(self, event_type, attach):
+        """
+        Attach a callback to a media player event
+        Several callbacks can be attached to the same event
+        @param event_type: vlc.EventType
+        @param attach: method that is called every time the event is
+        captured by the event manager
+        """
+        callbacks = self._event_callbacks.get(event_type.value)
+        if callbacks is None:
+            callbacks = self._event_callbacks[event_type.value] = []
+            if self.gapless:
+                # events of whichever media player is on screen
+                self.media_list_player.event_attach(
+                    event_type, self._dispatch_event, callbacks
+                )
+            else:
+                event_manager = (
+                    self.media_list_player.get_media_player().event_manager()
+                )
+                event_manager.event_attach(event_type, self._dispatch_event, callbacks)
+        callbacks.append(attach)
+
+    @staticmethod
+    def _dispatch_event(event, callbacks):
+        """
+        Call every callback attached to an event
+        """
+        for callback in list(callbacks):
+            callback(event)
+
     def event_manager_attach_changed(self, attach):
         """
         @param: method that is called every time the event is
         captured by the event manager
         """
-        event_manager = self.media_list_player.get_media_player().event_manager()
-        event_manager.event_attach(vlc.EventType.MediaPlayerMediaChanged, attach)
+        self.event_manager_attach(vlc.EventType.MediaPlayerMediaChanged, attach)
 
     def event_manager_attach_playing(self, attach):
         """
         @param: method that is called every time the event is
         captured by the event manager
         """
-        event_manager = self.media_list_player.get_media_player().event_manager()
-        event_manager.event_attach(vlc.EventType.MediaPlayerPlaying, attach)
+        self.event_manager_attach(vlc.EventType.MediaPlayerPlaying, attach)
+
+    def swap_media_player(self, old, new):
+        """
+        Follow the gapless player swap, called from its worker thread
+        """
+        self.m_instance = new
+        # a pending seek is dropped by the scheduler, the media changed
+        self.seek.media_player = new
+        self.osd.set_media_player(new)
+
+    def integrity_failed(self, error):
+        """
+        An encrypted media failed verification while libvlc read it
+        Called from the libvlc input threads, which also parse media in the
+        background. The read has already failed, the error is queued and
+        delivered as an EncounteredError event of the player, see
+        integrity_error().
+        """
+        self.integrity_errors.append(error)
+        event_type = vlc.EventType.MediaPlayerEncounteredError
+        self._dispatch_event(
+            SimpleNamespace(type=event_type, u=None),
+            self._event_callbacks.get(event_type.value, []),
+        )
+
+    def integrity_error(self):
+        """
+        Verification error of the current media queued since the last call,
+        None if there is none (GUI thread)
+        """
+        errors = []
+        while self.integrity_errors:
+            errors.append(self.integrity_errors.popleft())
+
+        current = self.media_path(self.media_list_index_of_item())
+        if current is None:
+            return None
+        for error in errors:
+            if os.path.abspath(error.path) == os.path.abspath(current):
+                return error
+        # media parsed in the background, not playing
+        return None
 
     def add_media(self, mrls):
         """
         Add media to playlist
+        @return: [(path, status)], status is "ok" or the reason the media
+        was not added
+        """
+        return self.insert_media(self.build_media(mrls))
+
+    def add_media_bulk(self, mrls, chunk_size=512):
+        """
+        Add media to playlist without blocking the caller
+        The vlc.Media objects are built on a worker thread and inserted in
+        chunks, each chunk under a single media list lock
+        @return: concurrent.futures.Future of the [(path, status)] list,
+        status is "ok" or the reason the media was not added
+        """
+        generation = self._playlist_generation
+        return self._media_executor.submit(
+            self._add_media_bulk, list(mrls), chunk_size, generation
+        )
+
+    def _add_media_bulk(self, mrls, chunk_size, generation):
+        """
+        Worker: build and insert the media chunk by chunk
+        """
+        statuses = []
+        for start in range(0, len(mrls), chunk_size):
+            if generation != self._playlist_generation:
+                # playlist cleared in the mean time
+                statuses.extend((file, "cancelled") for file in mrls[start:])
+                break
+            built = self.build_media(mrls[start : start + chunk_size])
+            statuses.extend(self.insert_media(built, generation))
+        return statuses
+
+    @staticmethod
+    def build_media(mrls):
+        """
+        Create the vlc.Media of media paths
+        @return: [(path, vlc.Media or error message)]
+        """
+        instance = vlc.get_default_instance()
+        built = []
+
+        for file in mrls:
+            # encrypted media are decrypted on the fly by libvlc callbacks
+            try:
+                built.append((file, open_media(instance, file)))
+            except (LookupError, RuntimeError, OSError) as error:
+                built.append((file, str(error)))
+
+        return built
+
+    def insert_media(self, built, generation=None):
+        """
+        Insert built media at the end of the playlist under one lock
+        @param built: [(path, vlc.Media or error message)] from build_media
+        @return: [(path, status)]
+        """
+        statuses = []
+
+        self.playlist.lock()
+        try:
+            if generation is not None and generation != self._playlist_generation:
+                return [(file, "cancelled") for file, _ in built]
+
+            for file, media in built:
+                if isinstance(media, str):
+                    statuses.append((file, media))
+                    continue
+                if self.playlist.add_media(media) == 0:
+                    self.paths.append(file)
+                    statuses.append((file, "ok"))
+                else:
+                    statuses.append((file, "media list is read-only"))
+        finally:
+            self.playlist.unlock()
+
+        return statuses
+
+    def media_at(self, index):
+        """
+        vlc.Media at a playlist index, None if the index is out of range
+        """
+        self.playlist.lock()
+        try:
+            if 0 <= index < self.playlist.count():
+                return self.playlist.item_at_index(index)
+            return None
+        finally:
+            self.playlist.unlock()
+
+    def replace_media(self, old, new):
+        """
+        Put a vlc.Media in place of another one of the same path
+        @return: False if old is not in the playlist
+        """
+        self.playlist.lock()
+        try:
+            index = self.playlist.index_of_item(old)
+            if index < 0:
+                return False
+            self.playlist.remove_index(index)
+            self.playlist.insert_media(new, index)
+            return True
+        finally:
+            self.playlist.unlock()
+
+    def remove_media(self, mrls):
+        """
+        Remove media from the playlist
+        """
+        paths = set(mrls)
+
+        self.playlist.lock()
+        for index in reversed(range(len(self.paths))):
+            if self.paths[index] in paths:
+                self.playlist.remove_index(index)
+                del self.paths[index]
+        self.playlist.unlock()
+
+    def media_path(self, index):
         """
-        # for file in mrls:
-        #     self.playlist.add_media(file)
-        [self.playlist.add_media(file) for file in mrls]
+        Path of the media at a playlist index
+        """
+        if 0 <= index < len(self.paths):
+            return self.paths[index]
+        return None
+
+    def clear_playlist(self):
+        """
+        Stop playback and remove all the media from the playlist
+        """
+        self.stop()
+
+        self.playlist.lock()
+        self._playlist_generation += 1
+        for index in reversed(range(self.playlist.count())):
+            self.playlist.remove_index(index)
+        self.paths = []
+        self.playlist.unlock()
 
     def play(self):
         """
@@ -85,6 +349,13 @@ class Player:
         """
         self.media_list_player.set_pause(0)
 
+    def play_at(self, index):
+        """
+        Play the media at a playlist index
+        @return: 0 upon success -1 if the index is out of range
+        """
+        return self.media_list_player.play_item_at_index(index)
+
     def next(self):
         """
         Play next item from media list.
@@ -171,26 +442,25 @@ class Player:
         if media is None:
             return ""
 
-        media.parse_with_options(
-            vlc.MediaParseFlag.local, -1
-        )  # parse the current media
-
-        title = f"{media.get_meta(0)}" or ""
-
-        # stop aprsing the media
-        media.parse_stop()
+        path = self.titles.media_path(media)
+        if path is None:
+            return self.titles.resolve(media)
 
-        return title
+        # memoized or cached title, parsed otherwise
+        return self.titles.title(path)
 
     def get_media_meta(self, mrl):
         """ "
         Get the media duration in a playlist instance
         """
-        media = vlc.Media(mrl)
-        media.parse()
-        duration = media.get_duration()
-        media.parse_stop()
-        return self.convert_ms(duration)
+        meta = self.cache.get(mrl)
+
+        if meta is None:
+            meta = parse_media(vlc.get_default_instance(), mrl)
+            if meta["duration"] >= 0:
+                self.cache.put(mrl, meta)
+
+        return self.convert_ms(meta["duration"])
 
     def get_media_length(self):
         """
@@ -221,32 +491,13 @@ class Player:
         """
         10 seconds fast forward
         """
-        duration = self.media_list_player.get_media_player().get_length()
-        time = int(self.get_media_current_time())
-
-        # check if the media is 1s from ending
-        if (time + 130) > duration:
-            return
-        # play the next media if media has reached end of duration
-        elif (time + 120) >= duration:
-            # self.player.set_time(duration)
-            self.next()
-
-        else:
-            self.set_time(time + 10000)
-            self.show_media_timestamp()
+        self.seek.seek_by(self.seek_step)
 
     def back_forward(self):
         """
         Backward skip media time by 10s
         """
-        time = int(self.get_media_current_time())  # media running time
-
-        if time - 10000 < 0:
-            self.set_time(0)
-        else:
-            self.set_time(abs(time - 10000))
-            self.show_media_timestamp()
+        self.seek.seek_by(-self.seek_step)
 
     def video_set_scale(self):
         """
@@ -258,11 +509,16 @@ class Player:
         else:
             self.m_instance.video_set_scale(0)
 
-    def set_playback_mode(self):
+    def set_playback_mode(self, mode=None):
         """
         Set media playlist playback mode
+        @param mode: vlc.PlaybackMode value to restore, cycles through the
+        modes by default
         """
-        if self.mode == vlc.PlaybackMode.loop:
+        if mode is not None:
+            self.mode = vlc.PlaybackMode(int(mode))
+            self.media_list_player.set_playback_mode(self.mode)
+        elif self.mode == vlc.PlaybackMode.loop:
             self.mode = vlc.PlaybackMode.repeat
             self.media_list_player.set_playback_mode(self.mode)
             self.set_marquee("Loop: One")
@@ -277,18 +533,42 @@ class Player:
 
     def media_list_index_of_item(self, *event):
         """ """
-        media_instance = self.m_instance.get_media()
-        index = self.playlist.index_of_item(media_instance)
+        if self.gapless:
+            # the media player may play a copy of the playlist item
+            return self.media_list_player.current_index()
 
-        if self.playlist.count() > 0:
+        media_instance = self.m_instance.get_media()
+        # media are inserted by the bulk insert worker
+        self.playlist.lock()
+        try:
+            index = self.playlist.index_of_item(media_instance)
+            count = self.playlist.count()
+        finally:
+            self.playlist.unlock()
+
+        if count > 0:
             return index
         else:
             # m_instance.release()
             return -1
 
-    def set_window(self, wm_id):
+    def set_window(self, wm_id, standby_wm_id=None):
         """
         Set an X Window System drawable where the media player should render its video output.
+        @param standby_wm_id: drawable of the gapless standby media player
+        """
+        if self.gapless:
+            first, second = self.media_list_player.players
+            self.set_drawable(first, wm_id)
+            if standby_wm_id is not None:
+                self.set_drawable(second, standby_wm_id)
+            return
+        self.set_drawable(self.m_instance, wm_id)
+
+    @staticmethod
+    def set_drawable(media_player, wm_id):
+        """
+        Render the video of a media player in a native window
         """
         # the media player has to be 'connected' to the QWidget
         # (otherwise a video would be displayed in it's own window)
@@ -296,11 +576,11 @@ class Player:
         # you have to give the id of the QFrame (or similar object) to
         # vlc, different platforms have different functions for this
         if sys.platform.startswith("linux"):  # for Linux using the X Server
-            self.m_instance.set_xwindow(wm_id)
+            media_player.set_xwindow(wm_id)
         elif sys.platform == "win32":  # for Windows
-            self.m_instance.set_hwnd(wm_id)
+            media_player.set_hwnd(wm_id)
         elif sys.platform == "darwin":  # for MacOS
-            self.m_instance.set_nsobject(wm_id)
+            media_player.set_nsobject(wm_id)
 
     def video_set_marquee_int(self, option, value):
         """
@@ -322,24 +602,31 @@ class Player:
         Set marquee string
         @param string
         """
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.Enable, 1)
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.Size, 24)
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.Timeout, 1500)
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.Position, 6)
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.Y, 20)
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.X, 20)
-        self.video_set_marquee_string(m_str)
+        self.osd.show("status", m_str)
 
     def set_title_marquee(self, *event):
         """
         Set video title
+        Called from the libvlc event thread, the title is never parsed here:
+        the file name is shown until the real title has been resolved
+        """
+        title = self.titles.resolve(
+            self.m_instance.get_media(), self.update_title_marquee
+        )
+        self.show_title_marquee(title)
+
+    def update_title_marquee(self, path, title):
+        """
+        Show a title resolved in the background if its media is still playing
         """
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.Enable, 1)
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.Size, 38)
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.Timeout, 1500)
-        self.video_set_marquee_int(vlc.VideoMarqueeOption.Position, 8)
+        if self.titles.media_path(self.m_instance.get_media()) == path:
+            self.show_title_marquee(title)
 
-        self.video_set_marquee_string(self.get_title())
+    def show_title_marquee(self, title):
+        """
+        Show a title marquee
+        """
+        self.osd.show("title", title)
 
     def show_media_timestamp(self, *event):
         """
@@ -349,22 +636,14 @@ class Player:
         duration = self.get_media_length()  # media duration
 
         marquee_str = f"{self.convert_ms(time)}/{duration}"
-        self.set_marquee(marquee_str)
+        self.osd.show("timestamp", marquee_str)
 
-    @staticmethod
-    # Convert millis to format  hr:min:ss format
-    def convert_ms(millis: int):
+    def show_seek_timestamp(self, time_ms):
         """
-        Convert duration(ms) to hr:min:ss format
+        Show the target timestamp of a pending seek
         """
-        if millis < 0:
-            return f"{int(0):02d}:{int(0):02d}"
+        marquee_str = f"{self.convert_ms(int(time_ms))}/{self.get_media_length()}"
+        self.osd.show("timestamp", marquee_str)
 
-        seconds, millis = divmod(millis, 1000)
-        minutes, seconds = divmod(seconds, 60)
-        hours, minutes = divmod(minutes, 60)
-
-        if hours:
-            return f"{hours}:{int(minutes):02d}:{int(seconds):02d}"  # hr:min:ss
-        else:
-            return f"{int(minutes):02d}:{int(seconds):02d}"  # min:ss
+    # Convert millis to format  hr:min:ss format
+    convert_ms = staticmethod(convert_ms)
@@ -0,0 +1,89 @@
+import sys
+import json
+import time
+import argparse
+
+from modules.batch import probe_library
+from modules.cache import MetadataCache
+
+# media extensions of the player library scans (MediaPlayer.media_extensions)
+MEDIA_EXTENSIONS = (".mp4",)
+
+
+def main(argv=None):
+    """
+    Headless batch prober: parse the durations and titles of a library and
+    print one JSON line per media
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="media files and folders")
+    parser.add_argument(
+        "--ext",
+        action="append",
+        help=f"media file extension, repeatable (default {' '.join(MEDIA_EXTENSIONS)})",
+    )
+    parser.add_argument("--workers", type=int, help="parse processes (default: CPUs)")
+    parser.add_argument("--shard-size", type=int, default=32, help="files per task")
+    parser.add_argument("--timeout", type=int, default=5000, help="parse timeout(ms)")
+    parser.add_argument("--max-depth", type=int, help="folder scan depth")
+    parser.add_argument(
+        "--seed-cache",
+        action="store_true",
+        help="store the results in the player metadata cache",
+    )
+    parser.add_argument("--cache-db", help="metadata cache database (--seed-cache)")
+    parser.add_argument(
+        "--force", action="store_true", help="parse media that are already cached"
+    )
+    parser.add_argument("--output", help="write the JSON lines to a file")
+    args = parser.parse_args(argv)
+
+    extensions = tuple(
+        ext.lower() if ext.startswith(".") else f".{ext.lower()}"
+        for ext in args.ext or MEDIA_EXTENSIONS
+    )
+
+    cache = None
+    if args.seed_cache or args.cache_db:
+        cache = MetadataCache(args.cache_db)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    counts = {}
+    started = time.monotonic()
+    try:
+        for result in probe_library(
+            args.paths,
+            extensions,
+            workers=args.workers,
+            shard_size=args.shard_size,
+            timeout=args.timeout,
+            cache=cache,
+            force=args.force,
+            max_depth=args.max_depth,
+        ):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+    except KeyboardInterrupt:
+        print("interrupted", file=sys.stderr)
+    except BrokenPipeError:
+        # output closed early (e.g. piped to head)
+        sys.stdout = None
+    finally:
+        if cache is not None:
+            cache.close()
+        if args.output:
+            output.close()
+
+    elapsed = time.monotonic() - started
+    total = sum(counts.values())
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(
+        f"{total} media in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f}/s)"
+        + (f": {summary}" if summary else ""),
+        file=sys.stderr,
+    )
+    return 0 if not counts.get("error") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
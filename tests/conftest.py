@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# the tests never open a window
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """
+    Qt application shared by the tests of Qt objects
+    """
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    app = QtWidgets.QApplication.instance()
+    return app or QtWidgets.QApplication([])
@@ -0,0 +1,57 @@
+from modules.blockcache import BlockCache
+
+
+def test_get_and_stats():
+    cache = BlockCache(max_bytes=100)
+    assert cache.get(("a", 0)) is None
+    cache.put(("a", 0), b"x" * 10)
+
+    assert cache.get(("a", 0)) == b"x" * 10
+    assert ("a", 0) in cache
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["blocks"] == 1 and stats["bytes"] == 10
+    assert stats["hit_rate"] == 0.5
+
+
+def test_least_recently_used_is_evicted():
+    cache = BlockCache(max_bytes=30)
+    for block in range(3):
+        cache.put(("a", block), bytes(10))
+    # block 0 becomes the most recently used
+    cache.get(("a", 0))
+    cache.put(("a", 3), bytes(10))
+
+    assert ("a", 1) not in cache
+    assert all(("a", block) in cache for block in (0, 2, 3))
+    assert cache.stats()["bytes"] == 30
+
+
+def test_replacing_a_block_keeps_the_size_right():
+    cache = BlockCache(max_bytes=100)
+    cache.put(("a", 0), bytes(40))
+    cache.put(("a", 0), bytes(10))
+    assert cache.stats()["bytes"] == 10
+
+
+def test_block_larger_than_the_budget_is_not_cached():
+    cache = BlockCache(max_bytes=10)
+    cache.put(("a", 0), bytes(11))
+    assert ("a", 0) not in cache
+
+
+def test_invalidate_and_resize():
+    cache = BlockCache(max_bytes=100)
+    for block in range(4):
+        cache.put(("a", block), bytes(10))
+        cache.put(("b", block), bytes(10))
+
+    cache.invalidate("a")
+    assert not any(("a", block) in cache for block in range(4))
+    assert cache.stats()["bytes"] == 40
+
+    cache.resize(20)
+    assert [("b", block) in cache for block in range(4)] == [False, False, True, True]
+
+    cache.invalidate()
+    assert cache.stats()["blocks"] == 0
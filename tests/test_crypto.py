@@ -0,0 +1,185 @@
+import os
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+try:
+    import vlc  # noqa: F401
+except ImportError:
+    # the reader does not need libvlc, only the module import does
+    from bench import fakevlc
+
+    fakevlc.install()
+
+from modules import crypto
+from modules.blockcache import BlockCache
+from modules.ingest import Ingester, encrypt_chunks
+
+KEY = bytes(range(32))
+CHUNK = 64
+
+
+def media(size):
+    return bytes(number * 7 % 251 for number in range(size))
+
+
+def write_container(tmp_path, data, name="media.bin"):
+    """
+    Container written in this process, as the ingest tool would
+    """
+    source = tmp_path / "source.mp4"
+    source.write_bytes(data)
+    output = tmp_path / name
+    chunk_count = -(-len(data) // CHUNK)
+    payload_offset = (
+        crypto.CONTAINER_HEADER.size
+        + crypto.TITLE_CAPACITY
+        + crypto.INTEGRITY.size
+        + chunk_count * crypto.CHUNK_ENTRY_MAC.size
+    )
+    nonce = os.urandom(crypto.NONCE_SIZE)
+    output.write_bytes(bytes(payload_offset + len(data)))
+
+    _, macs = encrypt_chunks(
+        source, output, KEY, nonce, payload_offset, 0, chunk_count, CHUNK
+    )
+    meta = {"duration": 1000, "title": "Title", "tracks": {"video": 1}}
+    ingester = Ingester(key=KEY, workers=1, chunk_size=CHUNK, thumbnail_size=None)
+    try:
+        ingester._write_header(
+            output, nonce, chunk_count, payload_offset, len(data), meta, b"", macs
+        )
+    finally:
+        ingester.close()
+    return output
+
+
+def write_evb1(tmp_path, data):
+    nonce = os.urandom(crypto.NONCE_SIZE)
+    encryptor, _ = crypto.ctr_encryptor(KEY, nonce, 0)
+    path = tmp_path / "media.bin"
+    path.write_bytes(crypto.MAGIC + nonce + encryptor.update(data))
+    return path
+
+
+def tamper(path, offset):
+    with open(path, "r+b") as media_file:
+        media_file.seek(offset)
+        byte = media_file.read(1)
+        media_file.seek(offset)
+        media_file.write(bytes([byte[0] ^ 1]))
+
+
+def read_all(reader, length=25):
+    data = bytearray()
+    buffer = bytearray(length)
+    while True:
+        read = reader.read_into(buffer, length)
+        if not read:
+            return bytes(data)
+        data += buffer[:read]
+
+
+def open_reader(path, **kwargs):
+    return crypto.DecryptingReader(path, KEY, cache=BlockCache(1 << 20), **kwargs)
+
+
+def test_container_round_trip(tmp_path):
+    data = media(CHUNK * 4 + 10)
+    path = write_container(tmp_path, data)
+    assert crypto.read_metadata(path)["title"] == "Title"
+
+    reader = open_reader(path)
+    try:
+        assert reader.size == len(data) and reader.chunk_size == CHUNK
+        assert read_all(reader) == data
+
+        assert reader.seek(CHUNK + 3)
+        assert read_all(reader) == data[CHUNK + 3 :]
+        assert not reader.seek(len(data) + 1)
+        assert reader.verifier.verified_count() == 5
+    finally:
+        reader.close()
+
+
+def test_tampered_chunk_fails_when_read(tmp_path):
+    data = media(CHUNK * 3)
+    path = write_container(tmp_path, data)
+    header = crypto.read_container(path)[0]
+    tamper(path, header.payload_offset + CHUNK + 5)
+
+    reader = open_reader(path)
+    try:
+        assert reader.chunk(0) == data[:CHUNK]
+        with pytest.raises(crypto.IntegrityError) as error:
+            reader.chunk(1)
+        assert error.value.chunk == 1
+        assert reader.chunk(2) == data[2 * CHUNK :]
+    finally:
+        reader.close()
+
+
+def test_tampered_header_is_refused(tmp_path):
+    path = write_container(tmp_path, media(CHUNK * 2))
+    # the title area is covered by the header MAC
+    tamper(path, crypto.CONTAINER_HEADER.size)
+
+    with pytest.raises(crypto.IntegrityError) as error:
+        open_reader(path)
+    assert error.value.chunk == -1
+
+
+def test_evb1_needs_the_unverified_opt_in(tmp_path):
+    data = media(CHUNK * 2 + 1)
+    path = write_evb1(tmp_path, data)
+
+    with pytest.raises(crypto.IntegrityError):
+        open_reader(path, unverified=False)
+
+    reader = open_reader(path, unverified=True, chunk_size=CHUNK)
+    try:
+        assert reader.verifier is None
+        assert read_all(reader) == data
+    finally:
+        reader.close()
+
+
+def test_decrypted_chunks_come_from_the_cache(tmp_path):
+    data = media(CHUNK * 2)
+    path = write_container(tmp_path, data)
+    cache = BlockCache(1 << 20)
+
+    first = crypto.DecryptingReader(path, KEY, cache=cache)
+    read_all(first)
+    first.close()
+    second = crypto.DecryptingReader(path, KEY, cache=cache)
+    try:
+        assert read_all(second) == data
+    finally:
+        second.close()
+    # only the first reader decrypted the chunks
+    assert cache.stats()["misses"] == 2
+
+
+def test_chunk_verifier():
+    mac_key = crypto.mac_key(KEY)
+    chunks = [b"first", b"second"]
+    macs = [
+        crypto.chunk_mac(mac_key, number, chunk) for number, chunk in enumerate(chunks)
+    ]
+    verifier = crypto.ChunkVerifier("media.bin", mac_key, macs)
+
+    verifier.verify(0, chunks[0])
+    assert verifier.is_verified(0) and not verifier.is_verified(1)
+    assert verifier.verified_count() == 1
+
+    # a chunk verified under another number does not match its MAC
+    with pytest.raises(crypto.IntegrityError):
+        verifier.verify(1, chunks[0])
+    # a failed chunk stays failed
+    with pytest.raises(crypto.IntegrityError):
+        verifier.verify(1, chunks[1])
+    with pytest.raises(crypto.IntegrityError):
+        verifier.verify(2, b"")
+    assert verifier.verified_count() == 1
@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+from modules.library import LibraryIndex
+from modules.scanner import scan_media
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name in ("a.mp4", "notes.txt", "sub/b.mp4"):
+        path = tmp_path / "media" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+    return tmp_path / "media"
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LibraryIndex(os.fspath(tmp_path / "data" / "library.json"))
+
+
+@pytest.fixture
+def listed(index, monkeypatch):
+    """
+    Folders listed by the index
+    """
+    folders = []
+    list_folder = index._list_folder
+
+    def counting(folder, mtime_ns):
+        folders.append(os.path.basename(folder))
+        return list_folder(folder, mtime_ns)
+
+    monkeypatch.setattr(index, "_list_folder", counting)
+    return folders
+
+
+def names(batches):
+    return sorted(os.path.basename(entry.path) for batch in batches for entry in batch)
+
+
+def touch(folder):
+    # a later mtime than the indexed one, whatever the file system resolution
+    stat = os.stat(folder)
+    os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_unchanged_folders_are_not_listed_again(tree, index, listed):
+    assert names(index.scan(tree, ".mp4")) == ["a.mp4", "b.mp4"]
+    assert sorted(listed) == ["media", "sub"]
+
+    listed.clear()
+    assert names(index.scan(tree, ".mp4")) == ["a.mp4", "b.mp4"]
+    assert listed == []
+
+
+def test_changed_folder_is_listed_again(tree, index, listed):
+    list(index.scan(tree, ".mp4"))
+    listed.clear()
+
+    (tree / "sub" / "c.mp4").write_bytes(b"x")
+    touch(tree / "sub")
+
+    assert names(index.scan(tree, ".mp4")) == ["a.mp4", "b.mp4", "c.mp4"]
+    assert listed == ["sub"]
+
+
+def test_save_and_load(tree, index):
+    list(index.scan(tree, ".mp4"))
+    index.save()
+
+    loaded = LibraryIndex(index.index_path)
+    assert loaded.indexed(tree)
+    assert sorted(loaded.folder_files(os.fspath(tree))) == ["a.mp4", "notes.txt"]
+    assert sorted(map(os.path.basename, loaded.files_below(tree))) == [
+        "a.mp4",
+        "b.mp4",
+        "notes.txt",
+    ]
+
+
+def test_invalidate_below_a_folder(tree, index):
+    list(index.scan(tree, ".mp4"))
+    index.invalidate(tree / "sub")
+
+    assert index.folders_below(tree) == [os.fspath(tree)]
+
+
+def test_update_folder(tree, index):
+    list(index.scan(tree, ".mp4"))
+    (tree / "c.mp4").write_bytes(b"x")
+    os.remove(tree / "a.mp4")
+
+    assert index.update_folder(tree) == (["c.mp4"], ["a.mp4"])
+
+
+def test_scan_media_indexes_new_folders(tree, index, listed):
+    assert names(scan_media([tree], ".mp4", index=index)) == ["a.mp4", "b.mp4"]
+    # walked by scan_tree and stored on the way
+    assert listed == []
+    assert index.indexed(tree) and index.indexed(tree / "sub")
+
+    assert names(scan_media([tree], ".mp4", index=index)) == ["a.mp4", "b.mp4"]
+    assert listed == []
@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+QtCore = pytest.importorskip("PyQt5.QtCore")
+Qt = QtCore.Qt
+
+from modules.playlist_model import PlaylistModel
+
+
+@pytest.fixture
+def model(qapp):
+    return PlaylistModel()
+
+
+def rows(model, column=PlaylistModel.LOCATION):
+    return [model.data(model.index(row, column)) for row in range(model.rowCount())]
+
+
+def durations(model):
+    return [model.duration(path) for path in rows(model)]
+
+
+def test_append_keeps_the_title_order(model):
+    model.sort(PlaylistModel.TITLE)
+    names = [f"/media/{n:03}.mp4" for n in range(300)]
+    random.Random(1).shuffle(names)
+    for start in range(0, len(names), 32):
+        model.append(names[start : start + 32])
+
+    assert rows(model) == sorted(names)
+
+
+def test_append_descending_is_stable(model):
+    model.sort(PlaylistModel.TITLE, Qt.DescendingOrder)
+    model.append(["/a/b.mp4", "/c/a.mp4"])
+    model.append(["/b/b.mp4", "/d/c.mp4", "/e/a.mp4"])
+
+    assert rows(model) == ["/d/c.mp4", "/a/b.mp4", "/b/b.mp4", "/c/a.mp4", "/e/a.mp4"]
+
+
+def test_set_duration_moves_the_row(model):
+    model.sort(PlaylistModel.DURATION)
+    model.append([f"/media/{n}.mp4" for n in range(5)])
+    model.set_duration("/media/3.mp4", 100)
+    model.set_duration("/media/1.mp4", 50)
+    model._reposition_timer.timeout.emit()
+
+    assert durations(model) == [-1, -1, -1, 50, 100]
+
+
+def test_append_after_set_duration(model):
+    model.sort(PlaylistModel.DURATION)
+    model.append([f"/media/{n}.mp4" for n in range(4)])
+    for n in range(4):
+        model.set_duration(f"/media/{n}.mp4", 40 - n * 10)
+
+    # appending sorts the pending rows before merging the batch
+    model.append(["/media/x.mp4", "/media/y.mp4"], {"/media/x.mp4": 25})
+
+    assert durations(model) == [-1, 10, 20, 25, 30, 40]
+
+
+def test_persistent_index_follows_its_media(model):
+    model.sort(PlaylistModel.DURATION)
+    model.append(["/media/a.mp4", "/media/b.mp4"])
+    current = QtCore.QPersistentModelIndex(model.index(0, 0))
+    model.set_duration("/media/a.mp4", 1000)
+    model._reposition()
+
+    assert model.path(current.row()) == "/media/a.mp4"
+
+
+def test_filter_and_remove(model):
+    model.append(["/music/song.mp3", "/video/movie.mp4", "/video/song.mp4"])
+    model.set_filter("song")
+    assert sorted(rows(model)) == ["/music/song.mp3", "/video/song.mp4"]
+
+    model.remove(["/music/song.mp3"])
+    assert rows(model) == ["/video/song.mp4"]
+    assert model.paths() == ["/video/movie.mp4", "/video/song.mp4"]
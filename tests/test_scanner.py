@@ -0,0 +1,87 @@
+import os
+import threading
+
+import pytest
+
+from modules.scanner import scan_media, scan_tree
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """
+    root/a.mp4 root/b.MP4 root/notes.txt root/sub/c.mp4 root/sub/deep/d.mp4
+    """
+    for name in ("a.mp4", "b.MP4", "notes.txt", "sub/c.mp4", "sub/deep/d.mp4"):
+        path = tmp_path / "root" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * len(name))
+    return tmp_path / "root"
+
+
+def relative(tree, batches):
+    return sorted(
+        os.path.relpath(entry.path, tree) for batch in batches for entry in batch
+    )
+
+
+def test_scan_tree_finds_the_media(tree):
+    batches = list(scan_tree(tree, ".mp4", workers=4))
+
+    assert relative(tree, batches) == [
+        "a.mp4",
+        "b.MP4",
+        os.path.join("sub", "c.mp4"),
+        os.path.join("sub", "deep", "d.mp4"),
+    ]
+    entry = next(entry for batch in batches for entry in batch)
+    assert entry.size == os.path.getsize(entry.path)
+
+
+def test_scan_tree_batches(tree):
+    batches = list(scan_tree(tree, (".mp4",), batch_size=1))
+    assert all(len(batch) == 1 for batch in batches)
+    assert len(batches) == 4
+
+
+def test_scan_tree_max_depth(tree):
+    batches = scan_tree(tree, ".mp4", max_depth=1)
+    assert relative(tree, batches) == ["a.mp4", "b.MP4", os.path.join("sub", "c.mp4")]
+
+
+def test_scan_tree_symlink_loop(tree):
+    os.symlink(tree, tree / "sub" / "loop")
+    assert len(relative(tree, scan_tree(tree, ".mp4"))) == 4
+
+
+def test_scan_tree_cancelled(tree):
+    cancel = threading.Event()
+    cancel.set()
+    assert list(scan_tree(tree, ".mp4", cancel=cancel)) == []
+
+
+def test_scan_tree_on_folder(tree):
+    folders = {}
+
+    def on_folder(folder, mtime_ns, dirs, files):
+        folders[os.path.relpath(folder, tree)] = (
+            mtime_ns,
+            sorted(dirs),
+            sorted(name for name, _, _, _ in files),
+        )
+
+    list(scan_tree(tree, ".mp4", on_folder=on_folder))
+
+    # every file is listed, not only the media
+    assert folders["."][1:] == (["sub"], ["a.mp4", "b.MP4", "notes.txt"])
+    assert folders["sub"][1:] == (["deep"], ["c.mp4"])
+    assert folders["."][0] == os.stat(tree).st_mtime_ns
+
+
+def test_scan_media_files_first(tree):
+    batches = list(scan_media([tree / "sub", tree / "a.mp4", tree / "missing"], ".mp4"))
+
+    assert [os.path.relpath(entry.path, tree) for entry in batches[0]] == ["a.mp4"]
+    assert relative(tree, batches[1:]) == [
+        os.path.join("sub", "c.mp4"),
+        os.path.join("sub", "deep", "d.mp4"),
+    ]
@@ -0,0 +1,64 @@
+from modules.search import SearchIndex, normalize, trigrams
+
+
+def build(paths):
+    index = SearchIndex()
+    for doc_id, path in enumerate(paths):
+        index.add(doc_id, path)
+    return index
+
+
+PATHS = [
+    "/videos/holidays/Beach Day.mp4",
+    "/videos/holidays/mountain_trip.mp4",
+    "/videos/Concerts/Café Live (2019).mp4",
+    "/music/beach-boys.mp4",
+]
+
+
+def test_normalize():
+    assert normalize("Beach DAY") == "beach day"
+    assert normalize("Café Ñandú") == "cafe nandu"
+
+
+def test_trigrams():
+    assert trigrams("abcd") == {"abc", "bcd"}
+    assert trigrams("ab") == set()
+
+
+def test_empty_query_matches_everything():
+    assert build(PATHS).query("  ") is None
+
+
+def test_substring_query():
+    index = build(PATHS)
+    assert index.query("beach") == {0, 3}
+    assert index.query("ountai") == {1}
+    assert index.query("xyz") == set()
+
+
+def test_query_is_case_and_accent_insensitive():
+    index = build(PATHS)
+    assert index.query("CAFE") == {2}
+    assert index.query("café live") == {2}
+
+
+def test_short_query_matches_word_prefixes():
+    index = build(PATHS)
+    # "d" starts "Day", not the "d" in the middle of "holidays"
+    assert index.query("d") == {0}
+    assert index.query("tr") == {1}
+    assert index.query("bo") == {3}
+
+
+def test_folder_names_match():
+    index = build(PATHS)
+    assert index.query("holiday") == {0, 1}
+    assert index.query("concerts") == {2}
+
+
+def test_clear():
+    index = build(PATHS)
+    index.clear()
+    assert len(index) == 0
+    assert index.query("beach") == set()
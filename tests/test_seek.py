@@ -0,0 +1,111 @@
+import pytest
+
+pytest.importorskip("PyQt5.QtCore")
+
+from modules.seek import SeekScheduler
+
+
+class Media:
+    def __init__(self, mrl):
+        self.mrl = mrl
+
+    def get_mrl(self):
+        return self.mrl
+
+
+class MediaPlayer:
+    """
+    Records the seeks sent by the scheduler
+    """
+
+    def __init__(self, time=0, length=60000):
+        self.time = time
+        self.length = length
+        self.media = Media("file:///a.mp4")
+        self.seeks = []
+
+    def get_length(self):
+        return self.length
+
+    def get_time(self):
+        return self.time
+
+    def get_media(self):
+        return self.media
+
+    def set_time(self, time):
+        self.seeks.append(("precise", time))
+
+    def set_position(self, position, fast=False):
+        self.seeks.append(("fast", round(position * self.length)))
+
+
+@pytest.fixture
+def player(qapp):
+    return MediaPlayer(time=30000)
+
+
+def release(scheduler):
+    # the key was released long ago
+    scheduler._last_request -= scheduler.release_delay
+    scheduler._flush()
+
+
+def test_single_tap_sends_one_precise_seek(player):
+    scheduler = SeekScheduler(player)
+    scheduler.seek_by(10000)
+    release(scheduler)
+
+    assert player.seeks == [("precise", 40000)]
+    assert scheduler.target is None
+
+
+def test_held_key_coalesces_fast_seeks(player):
+    scheduler = SeekScheduler(player)
+    for _ in range(5):
+        scheduler.seek_by(5000)
+    scheduler._flush()
+    release(scheduler)
+
+    # the first request goes out right away, then one fast seek per tick and
+    # a precise seek to the target on release
+    assert player.seeks == [("precise", 35000), ("fast", 55000), ("precise", 55000)]
+
+
+def test_target_is_clamped(player):
+    scheduler = SeekScheduler(player)
+    scheduler.seek_by(-100000)
+    assert scheduler.target == 0
+
+    scheduler.seek_by(100000)
+    assert scheduler.target == player.length - scheduler.end_margin
+
+
+def test_seek_forward_at_the_end_plays_the_next_media(player):
+    ended = []
+    player.time = player.length - 500
+    scheduler = SeekScheduler(player, on_end=lambda: ended.append(True))
+    scheduler.seek_by(10000)
+
+    assert ended == [True]
+    assert player.seeks == []
+    assert scheduler.target is None
+
+
+def test_media_change_drops_the_pending_seek(player):
+    scheduler = SeekScheduler(player)
+    scheduler.seek_by(10000)
+    player.media = Media("file:///b.mp4")
+    scheduler.seek_by(10000)
+    release(scheduler)
+
+    assert player.seeks == [("precise", 40000)]
+
+
+def test_unknown_length_is_ignored(player):
+    player.length = -1
+    scheduler = SeekScheduler(player)
+    scheduler.seek_by(10000)
+
+    assert scheduler.target is None
+    assert player.seeks == []
@@ -0,0 +1,131 @@
+import os
+import threading
+
+import pytest
+
+from modules import session
+from modules.session import PlaylistEntry, PlaylistFile
+
+ENTRIES = [
+    PlaylistEntry("/videos/b.mp4", 1000, "Bee"),
+    PlaylistEntry("/videos/a.mp4", session.UNKNOWN, ""),
+    PlaylistEntry("/videos/caf\udce9.mp4", 42, "Café"),
+    PlaylistEntry("/music/a.mp4", 7, "Bee"),
+]
+
+
+@pytest.fixture
+def evpl(tmp_path):
+    path = os.fspath(tmp_path / "playlist.evpl")
+    session.write_playlist(path, ENTRIES, current=2, position=1500, mode=1)
+    return path
+
+
+def test_evpl_round_trip(evpl):
+    with PlaylistFile(evpl) as playlist:
+        assert len(playlist) == len(ENTRIES)
+        assert list(playlist) == ENTRIES
+        assert (playlist.current, playlist.position, playlist.mode) == (2, 1500, 1)
+        assert playlist.paths() == [entry.path for entry in ENTRIES]
+        assert playlist.durations() == [entry.duration for entry in ENTRIES]
+        assert playlist.titles() == [entry.title for entry in ENTRIES]
+        assert playlist[3] == ENTRIES[3]
+
+
+def test_evpl_entries_in_batches(evpl):
+    with PlaylistFile(evpl) as playlist:
+        assert playlist.entries(1, 3) == ENTRIES[1:3]
+        assert playlist.entries(3, 100) == ENTRIES[3:]
+        assert playlist.entries(4) == []
+        assert playlist.entries() == ENTRIES
+
+
+@pytest.mark.parametrize("sorted_index", [True, False])
+def test_evpl_find(tmp_path, sorted_index):
+    path = os.fspath(tmp_path / "playlist.evpl")
+    session.write_playlist(path, ENTRIES, sorted_index=sorted_index)
+    with PlaylistFile(path) as playlist:
+        for number, entry in enumerate(ENTRIES):
+            assert playlist.find(entry.path) == number
+        assert playlist.find("/videos/missing.mp4") == -1
+
+
+def test_evpl_truncated(evpl):
+    size = os.path.getsize(evpl)
+    for keep in (session.HEADER.size - 1, session.HEADER.size + 10, size - 1):
+        with open(evpl, "r+b") as playlist:
+            playlist.truncate(keep)
+        with pytest.raises(ValueError):
+            PlaylistFile(evpl)
+
+
+def test_evpl_sorted_index_out_of_bounds(evpl):
+    # the records and strings are intact, the index is past the end of file
+    with open(evpl, "r+b") as playlist:
+        header = list(session.HEADER.unpack(playlist.read(session.HEADER.size)))
+        header[8] = os.path.getsize(evpl)
+        playlist.seek(0)
+        playlist.write(session.HEADER.pack(*header))
+
+    with pytest.raises(ValueError, match="truncated"):
+        PlaylistFile(evpl)
+
+
+def test_not_a_playlist(tmp_path):
+    path = tmp_path / "playlist.evpl"
+    path.write_bytes(b"NOPE" + bytes(session.HEADER.size))
+    with pytest.raises(ValueError):
+        PlaylistFile(os.fspath(path))
+
+
+def test_m3u_parsing(tmp_path):
+    path = tmp_path / "list.m3u8"
+    path.write_text(
+        "﻿#EXTM3U\n"
+        "#EXTINF:12,First title\n"
+        "first.mp4\n"
+        "\n"
+        "# a comment\n"
+        "file:///videos/second%20one.mp4\n"
+        "#EXTINF:-1,\n"
+        "http://example.com/stream\n"
+        "#EXTINF:abc,Bad duration\n"
+        "/abs/third.mp4\n",
+        encoding="utf-8",
+    )
+
+    assert list(session.read_m3u(os.fspath(path))) == [
+        PlaylistEntry(os.fspath(tmp_path / "first.mp4"), 12000, "First title"),
+        PlaylistEntry("/videos/second one.mp4", session.UNKNOWN, ""),
+        PlaylistEntry("http://example.com/stream", session.UNKNOWN, ""),
+        PlaylistEntry("/abs/third.mp4", session.UNKNOWN, "Bad duration"),
+    ]
+
+
+def test_m3u_round_trip(tmp_path):
+    path = os.fspath(tmp_path / "list.m3u")
+    entries = [("/videos/a.mp4", 61500, "A"), ("/videos/b.mp4", None, "")]
+    assert session.write_entries(path, entries) == 2
+
+    assert list(session.read_entries(path)) == [
+        PlaylistEntry("/videos/a.mp4", 61000, "A"),
+        PlaylistEntry("/videos/b.mp4", session.UNKNOWN, "b.mp4"),
+    ]
+
+
+def test_loader_streams_batches(qapp, evpl):
+    from modules.playlist_loader import PlaylistLoader
+
+    loader = PlaylistLoader(batch_size=3)
+    opened, batches, failed = [], [], []
+    loader.opened.connect(lambda path, state: opened.append(state))
+    loader.loaded.connect(batches.append)
+    loader.failed.connect(lambda path, error: failed.append(error))
+
+    # on the calling thread, the signals are delivered directly
+    loader._run(evpl, True, threading.Event())
+    loader._run(evpl + ".missing", False, threading.Event())
+
+    assert opened == [(2, 1500, 1)]
+    assert batches == [ENTRIES[:3], ENTRIES[3:]]
+    assert len(failed) == 1
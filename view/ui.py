@@ -57,13 +57,15 @@ class Ui_MainWindow(object):
         self.lineEdit.setObjectName("lineEdit")
         self.gridLayout.addWidget(self.lineEdit, 0, 1, 1, 1)
         self.gridLayout_2.addWidget(self.searchFrame, 0, 0, 1, 1)
-        self.treeWidget = QtWidgets.QTreeWidget(self.mainFrame)
-        self.treeWidget.setAcceptDrops(True)
-        self.treeWidget.setAlternatingRowColors(True)
-        self.treeWidget.setUniformRowHeights(True)
-        self.treeWidget.setAllColumnsShowFocus(True)
-        self.treeWidget.setObjectName("treeWidget")
-        self.gridLayout_2.addWidget(self.treeWidget, 1, 0, 1, 1)
+        self.treeView = QtWidgets.QTreeView(self.mainFrame)
+        self.treeView.setAcceptDrops(True)
+        self.treeView.setAlternatingRowColors(True)
+        self.treeView.setRootIsDecorated(False)
+        self.treeView.setUniformRowHeights(True)
+        self.treeView.setSortingEnabled(True)
+        self.treeView.setAllColumnsShowFocus(True)
+        self.treeView.setObjectName("treeView")
+        self.gridLayout_2.addWidget(self.treeView, 1, 0, 1, 1)
         self.gridLayout_3.addWidget(self.mainFrame, 0, 0, 1, 1)
         self.videoFrame = QtWidgets.QFrame(self.centralwidget)
         self.videoFrame.setStyleSheet("background-color: rgb(46, 52, 54);")
@@ -81,10 +83,6 @@ class Ui_MainWindow(object):
         MainWindow.setWindowTitle(_translate("MainWindow", "MainWindow"))
         self.label.setText(_translate("MainWindow", "Playlist"))
         self.lineEdit.setPlaceholderText(_translate("MainWindow", "Search"))
-        self.treeWidget.setSortingEnabled(True)
-        self.treeWidget.headerItem().setText(0, _translate("MainWindow", "Title"))
-        self.treeWidget.headerItem().setText(1, _translate("MainWindow", "Duration"))
-        self.treeWidget.headerItem().setText(2, _translate("MainWindow", "Location"))
 
 
 if __name__ == "__main__":